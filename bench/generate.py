@@ -0,0 +1,154 @@
+"""Génère un data.json synthétique et reproductible pour les benchmarks.
+
+    python bench/generate.py --users 1000 --out /tmp/bench/data.json
+
+Tous les comptes s'appellent `bench<id>` avec le mot de passe `bench`. Les
+films sont tirés parmi `--movies` identifiants servis par `tmdb_stub.py`
+(à partir de `FIRST_MOVIE_ID`). Même graine et même jour, même document :
+les dates sont relatives à minuit (UTC) pour qu'une partie des locations
+soit en cours.
+"""
+
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from werkzeug.security import generate_password_hash
+
+from tmdb_stub import FIRST_MOVIE_ID, MOVIES
+
+PASSWORD = "bench"
+
+# Par utilisateur, en moyenne.
+OWNS_PER_USER = 8
+RENTALS_PER_USER = 12
+REVIEWS_PER_USER = 4
+FAVORITES_PER_USER = 6
+
+
+def username(user_id):
+    return f"bench{user_id}"
+
+
+def generate(users, movies=MOVIES, seed=1, now=None):
+    rng = random.Random(seed)
+    now = now or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    movie_ids = range(FIRST_MOVIE_ID, FIRST_MOVIE_ID + movies)
+    # Un seul hachage : scrypt coûte cher et tous les comptes partagent le
+    # même mot de passe.
+    password_hash = generate_password_hash(PASSWORD)
+
+    doc = {
+        "users": [],
+        "user_owns": [],
+        "rentals": [],
+        "reviews": [],
+        "library": {},
+        "favorites": {},
+        "review_stats": {},
+        "catalog": [],
+        "deleted_films": [],
+        "film_overrides": {},
+        "sequences": {},
+    }
+
+    for user_id in range(1, users + 1):
+        doc["users"].append(
+            {
+                "id": user_id,
+                "username": username(user_id),
+                "email": f"{username(user_id)}@example.com",
+                "password_hash": password_hash,
+            }
+        )
+        owned = rng.sample(movie_ids, rng.randint(0, 2 * OWNS_PER_USER))
+        for movie_id in owned:
+            has_bluray = rng.random() < 0.5
+            has_digital = not has_bluray or rng.random() < 0.5
+            doc["user_owns"].append(
+                {
+                    "user_id": user_id,
+                    "movie_id": movie_id,
+                    "has_bluray": has_bluray,
+                    "has_digital": has_digital,
+                    "bluray_price": round(rng.uniform(1, 5), 2) if has_bluray else None,
+                    "digital_price": round(rng.uniform(1, 5), 2) if has_digital else None,
+                    "bluray_max_days": rng.choice([None, 7, 14]) if has_bluray else None,
+                    "digital_max_days": rng.choice([None, 2, 7]) if has_digital else None,
+                    "is_public": rng.random() < 0.7,
+                }
+            )
+        doc["library"][str(user_id)] = owned
+        doc["favorites"][str(user_id)] = rng.sample(movie_ids, rng.randint(0, 2 * FAVORITES_PER_USER))
+
+    public = [o for o in doc["user_owns"] if o["is_public"]]
+    for rental_id in range(1, users * RENTALS_PER_USER + 1):
+        own = rng.choice(public)
+        fmt = "bluray" if own["has_bluray"] and (not own["has_digital"] or rng.random() < 0.5) else "digital"
+        # Surtout de l'historique, environ 5 % en cours.
+        rented_at = now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+        days = rng.randint(1, 7)
+        if rng.random() < 0.05:
+            rented_at = now - timedelta(hours=rng.randint(0, 24))
+        renter = rng.randint(1, users)
+        price = own[f"{fmt}_price"] or 0
+        doc["rentals"].append(
+            {
+                "id": rental_id,
+                "user_id": renter,
+                "owner_id": own["user_id"],
+                "movie_id": own["movie_id"],
+                "format": fmt,
+                "rented_at": rented_at.isoformat(timespec="seconds"),
+                "expires_at": (rented_at + timedelta(days=days)).isoformat(timespec="seconds"),
+                "price_cents": int(round(price * 100)),
+            }
+        )
+
+    seen = set()
+    for _ in range(users * REVIEWS_PER_USER):
+        key = (rng.randint(1, users), rng.choice(movie_ids))
+        if key in seen:
+            continue
+        seen.add(key)
+        rating = rng.randint(1, 5)
+        doc["reviews"].append(
+            {
+                "id": len(doc["reviews"]) + 1,
+                "user_id": key[0],
+                "movie_id": key[1],
+                "rating": rating,
+                "comment": f"Avis {len(doc['reviews']) + 1}",
+                "created_at": (now - timedelta(minutes=rng.randint(0, 10**6))).isoformat(timespec="seconds"),
+            }
+        )
+        stats = doc["review_stats"].setdefault(str(key[1]), {"count": 0, "sum": 0, "hist": [0] * 5})
+        stats["count"] += 1
+        stats["sum"] += rating
+        stats["hist"][rating - 1] += 1
+
+    doc["sequences"]["rentals"] = len(doc["rentals"])
+    return doc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--movies", type=int, default=MOVIES)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", type=Path, required=True)
+    args = parser.parse_args()
+
+    doc = generate(args.users, args.movies, args.seed)
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(doc), encoding="utf-8")
+    print(
+        f"{args.out}: {len(doc['users'])} utilisateurs, {len(doc['user_owns'])} exemplaires, "
+        f"{len(doc['rentals'])} locations, {len(doc['reviews'])} avis"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""Benchmarks des pages du site, entièrement hors ligne.
+
+    python bench/run.py --sizes 100,1000,10000 --requests 200 --concurrency 8
+
+Pour chaque taille (nombre d'utilisateurs) : génère un data.json
+(`generate.py`), démarre le faux TMDb (`tmdb_stub.py`), l'API et le site sur
+des ports libres, puis rejoue chaque scénario et affiche, par route, les
+percentiles de latence (ms) et le débit (requêtes/s). Les premières
+requêtes de chaque scénario (`--warmup`) remplissent les caches et ne sont
+pas comptées.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from generate import PASSWORD, generate, username
+
+BENCH = Path(__file__).resolve().parent
+ROOT = BENCH.parent
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} : le processus s'est arrêté ({process.returncode})")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} : pas de réponse après {timeout} s")
+
+
+class Stack:
+    """Faux TMDb, API et site lancés dans des processus séparés."""
+
+    def __init__(self, workdir, latency, jitter, quiet=True):
+        self.workdir = workdir
+        self.latency = latency
+        self.jitter = jitter
+        self.output = subprocess.DEVNULL if quiet else None
+        self.processes = []
+
+    def _start(self, args, cwd, env, ready_url):
+        process = subprocess.Popen(
+            args,
+            cwd=cwd,
+            env={**os.environ, **env},
+            stdout=self.output,
+            stderr=self.output,
+        )
+        self.processes.append(process)
+        wait_ready(ready_url, process)
+
+    def __enter__(self):
+        tmdb_port, api_port, web_port = free_port(), free_port(), free_port()
+        tmdb_url = f"http://127.0.0.1:{tmdb_port}"
+        api_url = f"http://127.0.0.1:{api_port}"
+        self.web_url = f"http://127.0.0.1:{web_port}"
+        self._start(
+            [sys.executable, "tmdb_stub.py", "--port", str(tmdb_port),
+             "--latency", str(self.latency), "--jitter", str(self.jitter)],
+            BENCH,
+            {},
+            f"{tmdb_url}/genre/movie/list",
+        )
+        self._start(
+            [sys.executable, "-m", "flask", "--app", "app", "run",
+             "--host", "127.0.0.1", "--port", str(api_port), "--with-threads"],
+            ROOT / "popcornhub-api",
+            {
+                "DATA_PATH": str(self.workdir / "data.json"),
+                "ARCHIVE_DIR": str(self.workdir / "archive"),
+                "ARCHIVE_INTERVAL": "0",
+            },
+            f"{api_url}/health",
+        )
+        self._start(
+            [sys.executable, "-m", "flask", "--app", "app", "run",
+             "--host", "127.0.0.1", "--port", str(web_port), "--with-threads"],
+            ROOT / "popcornhub-web",
+            {"API_URL": api_url, "TMDB_BASE_URL": tmdb_url, "TMDB_CACHE_PATH": ""},
+            f"{self.web_url}/login",
+        )
+        return self
+
+    def __exit__(self, *exc):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def login(base_url, user_id):
+    session = requests.Session()
+    r = session.post(
+        f"{base_url}/login",
+        data={"username": username(user_id), "password": PASSWORD},
+        allow_redirects=False,
+    )
+    if r.status_code != 302:
+        raise RuntimeError(f"connexion de {username(user_id)} refusée ({r.status_code})")
+    return session
+
+
+def scenarios(doc, rng):
+    """`{nom: fonction(session, url du site) -> réponse}` ; chaque appel tire
+    ses paramètres au hasard dans le document généré."""
+    public = [o for o in doc["user_owns"] if o["is_public"]]
+    owned_movies = sorted({o["movie_id"] for o in public})
+    # Pour louer, chaque requête vise un exemplaire différent.
+    copies = [
+        (o["movie_id"], o["user_id"], fmt)
+        for o in public
+        for fmt in ("bluray", "digital")
+        if o[f"has_{fmt}"]
+    ]
+    rng.shuffle(copies)
+    remaining = list(copies)
+    copies_lock = threading.Lock()
+
+    def rent(session, base_url):
+        # Une fois tous les exemplaires loués, l'API refuse (409 -> redirection).
+        with copies_lock:
+            movie_id, owner_id, fmt = remaining.pop() if remaining else rng.choice(copies)
+        return session.post(
+            f"{base_url}/films/{movie_id}/rent-from-owner/{owner_id}",
+            data={"format": fmt},
+            allow_redirects=False,
+        )
+
+    return {
+        "index": lambda s, url: s.get(f"{url}/?page={rng.randint(1, 5)}"),
+        "film_detail": lambda s, url: s.get(f"{url}/films/{rng.choice(owned_movies)}"),
+        "film_availability": lambda s, url: s.get(
+            f"{url}/films/{rng.choice(owned_movies)}/availability"
+        ),
+        "actor_films": lambda s, url: s.get(f"{url}/actors/Acteur {rng.randint(1, 200)}"),
+        "profile": lambda s, url: s.get(f"{url}/profile"),
+        "rent_from_owner": rent,
+    }
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return float("nan")
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def measure(call, sessions, base_url, requests_count, concurrency, warmup):
+    for i in range(warmup):
+        call(sessions[i % len(sessions)], base_url)
+
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            status = call(sessions[i % len(sessions)], base_url).status_code
+        except requests.RequestException:
+            status = None
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if status is None or status >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests_count)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests_count,
+        "errors": errors,
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1] if latencies else float("nan"),
+        "rps": requests_count / wall if wall else float("nan"),
+    }
+
+
+def run_size(users, args):
+    rng = random.Random(args.seed)
+    workdir = Path(tempfile.mkdtemp(prefix=f"popcornhub-bench-{users}-"))
+    try:
+        doc = generate(users, seed=args.seed)
+        (workdir / "data.json").write_text(json.dumps(doc), encoding="utf-8")
+        with Stack(workdir, args.latency, args.jitter, quiet=not args.verbose) as stack:
+            sessions = [
+                login(stack.web_url, rng.randint(1, users))
+                for _ in range(args.concurrency)
+            ]
+            results = {}
+            for name, call in scenarios(doc, rng).items():
+                if args.only and name not in args.only:
+                    continue
+                results[name] = measure(
+                    call, sessions, stack.web_url, args.requests, args.concurrency, args.warmup
+                )
+                print_row(users, name, results[name])
+            return results
+    finally:
+        if args.keep:
+            print(f"données conservées dans {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+HEADER = f"{'users':>7}  {'route':<18} {'req':>5} {'err':>4} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'req/s':>8}"
+
+
+def print_row(users, name, r):
+    print(
+        f"{users:>7}  {name:<18} {r['requests']:>5} {r['errors']:>4} "
+        f"{r['p50']:>8.1f} {r['p90']:>8.1f} {r['p99']:>8.1f} {r['max']:>8.1f} {r['rps']:>8.1f}",
+        flush=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000", help="nombres d'utilisateurs, séparés par des virgules")
+    parser.add_argument("--requests", type=int, default=200, help="requêtes mesurées par scénario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=50, help="latence du faux TMDb (ms)")
+    parser.add_argument("--jitter", type=float, default=20, help="variation de la latence (ms)")
+    parser.add_argument("--only", nargs="*", help="scénarios à lancer (tous par défaut)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", type=Path, help="fichier où écrire les résultats")
+    parser.add_argument("--keep", action="store_true", help="conserver les données générées")
+    parser.add_argument("--verbose", action="store_true", help="afficher les journaux des serveurs")
+    args = parser.parse_args()
+
+    print(HEADER)
+    report = {}
+    for size in (int(s) for s in args.sizes.split(",")):
+        report[size] = run_size(size, args)
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Faux TMDb local pour les benchmarks (aucun accès réseau).
+
+    python bench/tmdb_stub.py --port 5100 --latency 80 --jitter 40
+
+Répond aux chemins utilisés par le site (`/movie/{id}`, vidéos et crédits,
+`/movie/popular`, `/discover/movie`, `/search/movie`, `/search/person`,
+`/person/{id}`, `/person/{id}/movie_credits`, `/genre/movie/list`) avec des
+réponses de la forme de celles de TMDb, dérivées de l'identifiant demandé :
+un même chemin renvoie toujours le même contenu. Chaque réponse est retardée
+de `latency` ± `jitter` millisecondes pour simuler l'aller-retour.
+"""
+
+import argparse
+import hashlib
+import random
+import time
+
+from flask import Flask, jsonify, request
+
+GENRES = [
+    {"id": 28, "name": "Action"},
+    {"id": 35, "name": "Comédie"},
+    {"id": 18, "name": "Drame"},
+    {"id": 27, "name": "Horreur"},
+    {"id": 878, "name": "Science-Fiction"},
+    {"id": 53, "name": "Thriller"},
+]
+
+FIRST_MOVIE_ID = 1000
+MOVIES = 2000
+FIRST_PERSON_ID = 500000
+PAGE_SIZE = 20
+
+
+def _rng(*key):
+    seed = hashlib.blake2b(repr(key).encode(), digest_size=8).digest()
+    return random.Random(int.from_bytes(seed, "big"))
+
+
+def movie(movie_id):
+    rng = _rng("movie", movie_id)
+    return {
+        "id": movie_id,
+        "title": f"Film {movie_id}",
+        "original_title": f"Film {movie_id}",
+        "overview": " ".join(f"mot{rng.randint(0, 999)}" for _ in range(60)),
+        "release_date": f"{rng.randint(1960, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "poster_path": f"/poster{movie_id}.jpg",
+        "backdrop_path": f"/backdrop{movie_id}.jpg",
+        "genres": rng.sample(GENRES, 2),
+        "genre_ids": [],
+        "runtime": rng.randint(80, 180),
+        "vote_average": round(rng.uniform(4, 9), 1),
+        "vote_count": rng.randint(10, 20000),
+        "popularity": round(rng.uniform(1, 500), 3),
+    }
+
+
+def summary(movie_id):
+    """Entrée de liste (résultats de recherche, populaires...)."""
+    full = movie(movie_id)
+    full["genre_ids"] = [g["id"] for g in full.pop("genres")]
+    return full
+
+
+def credits(movie_id):
+    rng = _rng("credits", movie_id)
+    cast = [
+        {
+            "id": person_id,
+            "name": f"Acteur {person_id}",
+            "character": f"Rôle {order}",
+            "order": order,
+            "profile_path": f"/person{person_id}.jpg",
+        }
+        for order, person_id in enumerate(rng.sample(range(FIRST_PERSON_ID, FIRST_PERSON_ID + 5000), 15))
+    ]
+    crew = [{"id": FIRST_PERSON_ID + movie_id % 5000, "name": f"Réalisateur {movie_id}", "job": "Director"}]
+    return {"id": movie_id, "cast": cast, "crew": crew}
+
+
+def videos(movie_id):
+    return {
+        "id": movie_id,
+        "results": [
+            {"iso_639_1": "fr", "site": "YouTube", "type": "Trailer", "key": f"bench{movie_id}", "name": "Bande-annonce"}
+        ],
+    }
+
+
+def images(movie_id):
+    return {
+        "id": movie_id,
+        "posters": [{"file_path": f"/poster{movie_id}.jpg", "width": 500, "height": 750}],
+        "backdrops": [{"file_path": f"/backdrop{movie_id}.jpg", "width": 1280, "height": 720}],
+    }
+
+
+def person(person_id):
+    return {
+        "id": person_id,
+        "name": f"Acteur {person_id}",
+        "biography": "Biographie de test.",
+        "profile_path": f"/person{person_id}.jpg",
+        "known_for_department": "Acting",
+    }
+
+
+def _page(ids, page):
+    start = (page - 1) * PAGE_SIZE
+    return {
+        "page": page,
+        "results": [summary(i) for i in ids[start:start + PAGE_SIZE]],
+        "total_results": len(ids),
+        "total_pages": max(1, -(-len(ids) // PAGE_SIZE)),
+    }
+
+
+def create_app(latency_ms=0, jitter_ms=0, movies=MOVIES):
+    app = Flask("tmdb_stub")
+    movie_ids = list(range(FIRST_MOVIE_ID, FIRST_MOVIE_ID + movies))
+    genres_of = {i: {g["id"] for g in movie(i)["genres"]} for i in movie_ids}
+
+    @app.before_request
+    def simulate_latency():
+        delay = latency_ms + random.uniform(-jitter_ms, jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def page_arg():
+        return max(1, request.args.get("page", 1, type=int))
+
+    @app.get("/movie/<int:movie_id>")
+    def movie_details(movie_id):
+        if movie_id not in genres_of:
+            return jsonify({"status_code": 34, "status_message": "Not found"}), 404
+        body = movie(movie_id)
+        extra = request.args.get("append_to_response", "")
+        for name, build in (("credits", credits), ("videos", videos), ("images", images)):
+            if name in extra.split(","):
+                body[name] = build(movie_id)
+        return jsonify(body)
+
+    @app.get("/movie/<int:movie_id>/videos")
+    def movie_videos(movie_id):
+        return jsonify(videos(movie_id))
+
+    @app.get("/movie/<int:movie_id>/credits")
+    def movie_credits(movie_id):
+        return jsonify(credits(movie_id))
+
+    @app.get("/movie/popular")
+    def popular():
+        return jsonify(_page(movie_ids, page_arg()))
+
+    @app.get("/discover/movie")
+    def discover():
+        genre = request.args.get("with_genres", type=int)
+        ids = [i for i in movie_ids if genre is None or genre in genres_of[i]]
+        return jsonify(_page(ids, page_arg()))
+
+    @app.get("/search/movie")
+    def search_movie():
+        query = request.args.get("query", "")
+        ids = [i for i in movie_ids if query.strip().lower() in f"film {i}"]
+        return jsonify(_page(ids, page_arg()))
+
+    @app.get("/search/person")
+    def search_person():
+        query = request.args.get("query", "")
+        person_id = FIRST_PERSON_ID + int(hashlib.md5(query.encode()).hexdigest(), 16) % 5000
+        found = person(person_id)
+        found["name"] = query
+        return jsonify({"page": 1, "results": [found], "total_results": 1, "total_pages": 1})
+
+    @app.get("/person/<int:person_id>")
+    def person_details(person_id):
+        return jsonify(person(person_id))
+
+    @app.get("/person/<int:person_id>/movie_credits")
+    def person_credits(person_id):
+        rng = _rng("person", person_id)
+        cast = [summary(i) for i in rng.sample(movie_ids, min(30, len(movie_ids)))]
+        return jsonify({"id": person_id, "cast": cast, "crew": []})
+
+    @app.get("/genre/movie/list")
+    def genre_list():
+        return jsonify({"genres": GENRES})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--latency", type=float, default=0, help="millisecondes")
+    parser.add_argument("--jitter", type=float, default=0, help="millisecondes")
+    parser.add_argument("--movies", type=int, default=MOVIES)
+    args = parser.parse_args()
+    create_app(args.latency, args.jitter, args.movies).run(
+        host=args.host, port=args.port, threaded=True
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,319 @@
-from flask import Flask, jsonify, request, abort
+from flask import Flask, jsonify, request, abort, Response
 from pathlib import Path
-import json
+import os
 from werkzeug.security import generate_password_hash
 
+import codec
+from archive import RentalArchive, start_sweeper, sweep
+from json_patch import PatchError
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, instrument, registry
+from query import QueryEngine, QueryError
+from rentals import RentalDesk, RentalRefused
+from store import open_store, VersionConflict
+
 app = Flask(__name__)
 
-DATA_PATH = Path("/data/data.json")
-
-def load_data():
-    if not DATA_PATH.exists():
-        data = {
-                "users": [],
-                "library": {},
-                "favorites": {},
-                "reviews": [],
-                "rentals": [],
-                "user_owns": [],
-                "deleted_films": [],
-                "film_overrides": {},
-                "catalog": []
-                }
-        save_data(data)
-        return data
-
-    with DATA_PATH.open("r", encoding="utf-8") as f:
-        return json.load(f)
-
-
-def save_data(data):
-    DATA_PATH.parent.mkdir(parents=True, exist_ok=True)
-    tmp = DATA_PATH.with_suffix(".tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    tmp.replace(DATA_PATH)
+DATA_PATH = Path(os.environ.get("DATA_PATH", "/data/data.json"))
+
+# "file" : réécriture complète de data.json à chaque écriture (historique)
+# "journal" : journal append-only + snapshots périodiques
+STORAGE_MODE = os.environ.get("STORAGE_MODE", "file")
+JOURNAL_COMPACT_BYTES = int(os.environ.get("JOURNAL_COMPACT_BYTES", 4 * 1024 * 1024))
+# Mode "file" : DATA_PRETTY=0 écrit data.json en JSON compact (GET /export
+# fournit toujours une version indentée).
+DATA_PRETTY = os.environ.get("DATA_PRETTY", "1") not in ("0", "false")
+
+store = open_store(
+    DATA_PATH,
+    mode=STORAGE_MODE,
+    compact_bytes=JOURNAL_COMPACT_BYTES,
+    pretty=DATA_PRETTY,
+)
+
+# Locations terminées déplacées vers des segments gzip mensuels.
+# ARCHIVE_INTERVAL=0 désactive le balayage automatique.
+ARCHIVE_DIR = Path(os.environ.get("ARCHIVE_DIR", DATA_PATH.parent / "archive"))
+ARCHIVE_INTERVAL = float(os.environ.get("ARCHIVE_INTERVAL", 300))
+ARCHIVE_GRACE = float(os.environ.get("ARCHIVE_GRACE", 0))
+
+archive = RentalArchive(ARCHIVE_DIR)
+rental_desk = RentalDesk(store)
+queries = QueryEngine(store)
+if ARCHIVE_INTERVAL > 0:
+    start_sweeper(store, archive, ARCHIVE_INTERVAL, grace=ARCHIVE_GRACE)
+
+instrument(
+    app,
+    registry.histogram(
+        "popcornhub_api_request_seconds",
+        "Durée de traitement des requêtes HTTP.",
+        ("endpoint", "method", "status"),
+    ),
+)
+registry.gauge(
+    "popcornhub_api_document_bytes",
+    "Taille du document sur disque (snapshot, plus le journal en mode journal).",
+    lambda: {(): store.stored_bytes()},
+)
+registry.gauge(
+    "popcornhub_api_collection_rows",
+    "Nombre de lignes (ou de clés) par collection.",
+    lambda: store.read(
+        lambda doc: {(name,): len(v) for name, v in doc.items() if isinstance(v, (list, dict))}
+    ),
+    ("collection",),
+)
+registry.gauge("popcornhub_api_data_version", "Version du document.", lambda: {(): store.version})
+
+
+def _escape(key):
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+def _etag(version):
+    return f'"{version}"'
+
+
+def _json_body(dump):
+    """Réponse avec ETag, au format et à la compression négociés
+    (`Accept`, `Accept-Encoding`) ; `304 Not Modified` sans corps si le
+    client possède déjà cette version (If-None-Match).
+
+    `dump(content_type, encoding)` renvoie `(corps, version)`.
+    """
+    content_type = codec.negotiate_format(request.accept_mimetypes)
+    body, version = dump(content_type, None)
+    if request.if_none_match.contains(str(version)):
+        resp = Response(status=304)
+    else:
+        encoding = None
+        if len(body) >= codec.COMPRESS_MIN_BYTES:
+            encoding = codec.negotiate_encoding(request.headers.get("Accept-Encoding"))
+        if encoding:
+            body, version = dump(content_type, encoding)
+        resp = Response(body, status=200, mimetype=content_type)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+    resp.headers["ETag"] = _etag(version)
+    resp.headers["X-Data-Version"] = str(store.version)
+    resp.headers["Vary"] = "Accept, Accept-Encoding"
+    return resp
+
+
+def _request_value():
+    """Corps de la requête décodé (JSON ou MessagePack, éventuellement
+    compressé selon `Content-Encoding`)."""
+    content_type = codec.MSGPACK if request.mimetype == codec.MSGPACK else codec.JSON
+    try:
+        raw = codec.decompress(request.get_data(), request.headers.get("Content-Encoding"))
+        return codec.decode(raw, content_type)
+    except codec.CodecError as e:
+        abort(400, description=f"Invalid body: {e}")
+
+
+def _if_match():
+    """Version attendue d'après l'en-tête If-Match (None si absent)."""
+    raw = request.headers.get("If-Match")
+    if not raw or raw.strip() == "*":
+        return None
+    try:
+        return int(raw.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        abort(400, description="Invalid If-Match header")
+
+
+def _base_versions():
+    """Ensemble lu par le client : `X-Base-Versions: users=3,rentals=17`."""
+    raw = request.headers.get("X-Base-Versions")
+    if not raw:
+        return None
+    expect = {}
+    try:
+        for item in raw.split(","):
+            name, _, version = item.strip().partition("=")
+            expect[name] = int(version)
+    except ValueError:
+        abort(400, description="Invalid X-Base-Versions header")
+    return expect
+
+
+def _apply(ops, if_version=None, expect=None):
+    try:
+        version = store.apply(ops, if_version=if_version, expect=expect)
+    except PatchError as e:
+        abort(409, description=str(e))
+    except VersionConflict as e:
+        resp = jsonify({"error": "version conflict", "collection": e.args[0]})
+        resp.status_code = 412
+        resp.headers["X-Data-Version"] = str(store.version)
+        abort(resp)
+    resp = Response(status=204)
+    resp.headers["X-Data-Version"] = str(version)
+    return resp
+
 
 @app.get("/data")
 def get_data():
-    return jsonify(load_data()), 200
+    return _json_body(lambda fmt, enc: store.dump(None, fmt, enc))
 
 
 @app.put("/data")
 def put_data():
-    if not request.is_json:
-        abort(400, description="Body must be JSON")
-    data = request.get_json()
+    data = _request_value()
     if not isinstance(data, dict):
         abort(400, description="Root JSON must be an object")
-    save_data(data)
-    return "", 204
+    return _apply(
+        [{"op": "replace", "path": "", "value": data}], if_version=_if_match()
+    )
+
+
+def _patch_ops():
+    ops = _request_value()
+    if not isinstance(ops, list):
+        abort(400, description="Body must be a JSON Patch array")
+    return ops
+
+
+@app.patch("/data")
+def patch_data():
+    """Applique un JSON Patch sur tout le document (atomique, multi-collections).
+
+    Préconditions acceptées : `If-Match` (version globale) et/ou
+    `X-Base-Versions` (versions des collections lues par le client).
+    """
+    return _apply(_patch_ops(), if_version=_if_match(), expect=_base_versions())
+
+
+@app.get("/data/<name>")
+def get_collection(name):
+    if not store.has(name):
+        abort(404)
+    return _json_body(lambda fmt, enc: store.dump(name, fmt, enc))
+
+
+@app.put("/data/<name>")
+def put_collection(name):
+    ops = [{"op": "add", "path": f"/{_escape(name)}", "value": _request_value()}]
+    expected = _if_match()
+    return _apply(ops, expect=None if expected is None else {name: expected})
+
+
+@app.patch("/data/<name>")
+def patch_collection(name):
+    """JSON Patch dont les chemins sont relatifs à la collection `name`."""
+    ops = _patch_ops()
+    if not store.has(name):
+        abort(404)
+    prefix = f"/{_escape(name)}"
+    scoped = []
+    for op in ops:
+        if not isinstance(op, dict) or not isinstance(op.get("path"), str):
+            abort(400, description="Invalid JSON Patch operation")
+        scoped.append({**op, "path": prefix + op["path"]})
+    expected = _if_match()
+    return _apply(scoped, expect=None if expected is None else {name: expected})
+
+
+@app.get("/query/<name>")
+def query_collection(name):
+    """Lignes de `name` correspondant aux filtres (voir `query.py`) :
+    `{"items", "total"}` (+ `page`, `page_size` si paginé)."""
+    try:
+        result, version = queries.run(name, request.args)
+    except KeyError:
+        abort(404)
+    except QueryError as e:
+        abort(400, description=str(e))
+    return _json_body(
+        lambda fmt, enc: (codec.compress(codec.encode(result, fmt), enc), version)
+    )
+
+
+@app.post("/rentals")
+def create_rental():
+    """Crée une location de façon atomique pour l'exemplaire demandé.
+
+    Corps : `{"user_id", "owner_id", "movie_id", "format", "duration_days"}`.
+    `201` avec la location créée, `409` `{"error", "busy_until"}` si
+    l'exemplaire (ou le locataire) a déjà une location en cours.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        abort(400, description="Body must be a JSON object")
+    try:
+        ids = [int(body[key]) for key in ("user_id", "owner_id", "movie_id")]
+    except (KeyError, TypeError, ValueError):
+        abort(400, description="user_id, owner_id and movie_id are required")
+    try:
+        rental, version = rental_desk.rent(
+            *ids, body.get("format"), body.get("duration_days")
+        )
+    except RentalRefused as e:
+        busy_until = e.busy_until and e.busy_until.isoformat(timespec="seconds")
+        resp = jsonify({"error": e.reason, "busy_until": busy_until})
+        resp.status_code = e.status
+        return resp
+    except VersionConflict:
+        abort(503, description="Too many concurrent updates, retry later")
+    resp = jsonify(rental)
+    resp.status_code = 201
+    resp.headers["X-Data-Version"] = str(version)
+    return resp
+
+
+@app.get("/availability/<int:movie_id>")
+def availability(movie_id):
+    """Exemplaires du film loués en ce moment, lus dans l'index des locations
+    en cours : `{"busy": [{"owner_id", "format", "until"}]}`."""
+    busy = rental_desk.busy_copies(movie_id)
+    return jsonify({
+        "busy": [
+            {"owner_id": owner_id, "format": fmt, "until": until.isoformat(timespec="seconds")}
+            for (owner_id, fmt), until in sorted(busy.items(), key=lambda item: str(item[0]))
+        ]
+    })
+
+
+@app.get("/archive/rentals")
+def archived_rentals():
+    """Locations archivées, filtrables par `user_id`, `owner_id`, `movie_id`."""
+    filters = {}
+    for key in ("user_id", "owner_id", "movie_id"):
+        value = request.args.get(key)
+        if value is not None:
+            try:
+                filters[key] = int(value)
+            except ValueError:
+                abort(400, description=f"Invalid {key}")
+    return jsonify(archive.query(**filters))
+
+
+@app.post("/archive/rentals/sweep")
+def sweep_rentals():
+    """Lance un balayage immédiat (sinon toutes les ARCHIVE_INTERVAL s)."""
+    return jsonify({"archived": sweep(store, archive, grace=ARCHIVE_GRACE)})
+
+
+@app.get("/export")
+def export_data():
+    """Document entier en JSON indenté, à télécharger."""
+    body, version = store.export()
+    resp = Response(body, mimetype="application/json")
+    resp.headers["Content-Disposition"] = f'attachment; filename="popcornhub-{version}.json"'
+    resp.headers["ETag"] = _etag(version)
+    return resp
+
+
+@app.get("/versions")
+def collection_versions():
+    """Version courante des collections demandées (`?name=reviews&name=...`),
+    0 pour une collection absente : de quoi savoir si un cache est à jour."""
+    return jsonify({name: store.collection_version(name) for name in request.args.getlist("name")})
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(registry.render(), content_type=METRICS_CONTENT_TYPE)
 
 
 @app.get("/health")
@@ -56,4 +322,4 @@ def health():
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,228 @@
+"""Archive froide des locations terminées.
+
+Les locations expirées (ou rendues) quittent le document pour des segments
+mensuels `rentals-AAAA-MM.jsonl.gz` (mois de fin de location). Chaque
+balayage ajoute un membre gzip au segment : les fichiers ne sont jamais
+réécrits, seulement complétés.
+
+Chaque segment a un index en mémoire (position des membres, ids archivés,
+membres contenant chaque `user_id`, `owner_id` et `movie_id`), complété à
+chaque ajout : une requête ne décompresse que les membres qui peuvent
+contenir des lignes cherchées, et aucune ligne n'est gardée en mémoire.
+
+L'archive est écrite *avant* le retrait du document : après un arrêt brutal
+ou une écriture concurrente, une location peut figurer à la fois dans
+l'archive et dans le document, jamais disparaître. Une location déjà dans son
+segment n'y est pas ajoutée une seconde fois.
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+from store import VersionConflict, _dumps, _fsync_dir
+
+log = logging.getLogger(__name__)
+
+# Champs indexés dans chaque segment (filtres de GET /archive/rentals).
+KEYS = ("user_id", "owner_id", "movie_id")
+
+
+def _expires(rental):
+    try:
+        return datetime.fromisoformat(rental["expires_at"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _decode(body):
+    return [json.loads(line) for line in body.decode("utf-8").splitlines() if line.strip()]
+
+
+class _SegmentIndex:
+    def __init__(self):
+        self.size = 0  # octets indexés (membres complets)
+        self.members = []  # [(début, longueur)]
+        self.ids = set()
+        self.keys = {key: {} for key in KEYS}  # {champ: {valeur: {membre}}}
+
+    def add(self, start, length, rows):
+        member = len(self.members)
+        self.members.append((start, length))
+        self.size = start + length
+        for row in rows:
+            self.ids.add(row.get("id"))
+            for key, members in self.keys.items():
+                members.setdefault(row.get(key), set()).add(member)
+
+    def candidates(self, filters):
+        """Membres pouvant contenir des lignes qui vérifient `filters`."""
+        found = None
+        for key, value in filters.items():
+            if key in self.keys:
+                members = self.keys[key].get(value, set())
+                found = members if found is None else found & members
+        return sorted(found) if found is not None else range(len(self.members))
+
+
+class RentalArchive:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        # {segment: _SegmentIndex}
+        self._indexes = {}
+
+    def _segment(self, month):
+        return self.directory / f"rentals-{month}.jsonl.gz"
+
+    def segments(self):
+        return sorted(self.directory.glob("rentals-*.jsonl.gz"))
+
+    def _index(self, segment):
+        """Index de `segment`, complété par les membres ajoutés depuis (appelé
+        sous le verrou)."""
+        try:
+            size = segment.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        index = self._indexes.get(segment)
+        if index is None or size < index.size:
+            index = self._indexes[segment] = _SegmentIndex()
+        if size == index.size:
+            return index
+
+        with segment.open("rb") as f:
+            f.seek(index.size)
+            data = f.read()
+        start = index.size
+        while data:
+            member = zlib.decompressobj(wbits=31)
+            try:
+                body = member.decompress(data)
+            except zlib.error:
+                member = None
+            if member is None or not member.eof:
+                # Fin tronquée (arrêt pendant un ajout) : ignorée.
+                log.warning("%s : membre incomplet à l'octet %d", segment.name, start)
+                break
+            length = len(data) - len(member.unused_data)
+            index.add(start, length, _decode(body))
+            start += length
+            data = member.unused_data
+        return index
+
+    def append(self, rentals):
+        """Ajoute à leurs segments mensuels (synchronisés sur disque) les
+        locations de `rentals` qui n'y sont pas déjà ; renvoie leur nombre."""
+        by_month = {}
+        for rental in rentals:
+            by_month.setdefault(_expires(rental).strftime("%Y-%m"), []).append(rental)
+
+        added = 0
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            for month, rows in sorted(by_month.items()):
+                segment = self._segment(month)
+                index = self._index(segment)
+                seen = set(index.ids)
+                fresh = []
+                for row in rows:
+                    if row.get("id") not in seen:
+                        seen.add(row.get("id"))
+                        fresh.append(row)
+                if not fresh:
+                    continue
+                body = "".join(_dumps(r) + "\n" for r in fresh).encode("utf-8")
+                member = gzip.compress(body)
+                with segment.open("ab") as f:
+                    # Écrase un éventuel membre incomplet laissé par un arrêt.
+                    f.truncate(index.size)
+                    f.write(member)
+                    f.flush()
+                    os.fsync(f.fileno())
+                index.add(index.size, len(member), fresh)
+                added += len(fresh)
+            _fsync_dir(self.directory)
+        return added
+
+    def query(self, **filters):
+        """Locations archivées dont chaque champ de `filters` (user_id,
+        owner_id, movie_id...) vaut la valeur donnée, par id croissant."""
+        found = {}
+        with self._lock:
+            for segment in self.segments():
+                index = self._index(segment)
+                members = index.candidates(filters)
+                if not members:
+                    continue
+                with segment.open("rb") as f:
+                    for member in members:
+                        start, length = index.members[member]
+                        f.seek(start)
+                        for row in _decode(gzip.decompress(f.read(length))):
+                            if all(row.get(k) == v for k, v in filters.items()):
+                                found[row.get("id")] = row
+        return sorted(found.values(), key=lambda r: r.get("id") or 0)
+
+
+def sweep(store, archive, grace=0):
+    """Archive les locations terminées depuis plus de `grace` secondes puis
+    les retire du document. Renvoie le nombre de locations archivées."""
+    body, rentals_version = store.dump("rentals")
+    rentals = json.loads(body)
+    now = datetime.utcnow().timestamp() - grace
+
+    expired = []
+    for pos, rental in enumerate(rentals):
+        expires = _expires(rental)
+        if expires is not None and expires.timestamp() <= now:
+            expired.append(pos)
+    if not expired:
+        return 0
+
+    archive.append([rentals[pos] for pos in expired])
+
+    # La séquence garde trace des ids archivés pour qu'ils ne soient pas
+    # réattribués une fois sortis du document.
+    sequences = json.loads(store.dump("sequences")[0]) if store.has("sequences") else {}
+    sequences_version = store.collection_version("sequences")
+    last_id = max((r.get("id") or 0 for r in rentals), default=0)
+    sequences["rentals"] = max(sequences.get("rentals", 0), last_id)
+
+    ops = [{"op": "remove", "path": f"/rentals/{pos}"} for pos in reversed(expired)]
+    ops.append({"op": "add", "path": "/sequences", "value": sequences})
+    try:
+        store.apply(
+            ops,
+            expect={"rentals": rentals_version, "sequences": sequences_version},
+        )
+    except VersionConflict:
+        # Écriture concurrente : le prochain balayage retentera, sans
+        # réarchiver les lignes déjà présentes dans leur segment.
+        return 0
+    return len(expired)
+
+
+def start_sweeper(store, archive, interval, grace=0):
+    """Balayage périodique en tâche de fond (`interval` en secondes)."""
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                count = sweep(store, archive, grace)
+            except Exception:
+                log.exception("archivage des locations impossible")
+                continue
+            if count:
+                log.info("%d locations archivées", count)
+
+    thread = threading.Thread(target=run, name="rental-archiver", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,107 @@
+"""Encodages des échanges avec le site.
+
+- format : JSON compact (par défaut) ou MessagePack si le client l'accepte
+  (`Accept: application/msgpack`) et que `msgpack` est installé ;
+- compression : zstd (si `zstandard` est installé) ou gzip, selon
+  `Accept-Encoding`, pour les corps d'au moins `COMPRESS_MIN_BYTES`.
+
+Les corps reçus (`PUT` / `PATCH`) peuvent utiliser les mêmes encodages,
+indiqués par `Content-Type` et `Content-Encoding`.
+"""
+
+import gzip
+import json
+
+from metrics import registry
+
+try:
+    import msgpack
+except ImportError:  # optionnel
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optionnel
+    zstandard = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+COMPRESS_MIN_BYTES = 1024
+
+CODEC_SECONDS = registry.histogram(
+    "popcornhub_api_codec_seconds",
+    "Durée de sérialisation, d'analyse et de (dé)compression des corps.",
+    ("op", "format"),
+)
+
+
+class CodecError(ValueError):
+    """Corps illisible (encodage inconnu ou données corrompues)."""
+
+
+def formats():
+    return [JSON, MSGPACK] if msgpack is not None else [JSON]
+
+
+def encodings():
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def negotiate_format(accept):
+    """Type de contenu à renvoyer d'après `Accept` (MIMEAccept Werkzeug)."""
+    return accept.best_match(formats(), default=JSON) or JSON
+
+
+def negotiate_encoding(accept_encoding):
+    """Compression à appliquer d'après `Accept-Encoding` (None = aucune)."""
+    offered = {
+        part.split(";")[0].strip().lower()
+        for part in (accept_encoding or "").split(",")
+    }
+    for encoding in encodings():
+        if encoding in offered:
+            return encoding
+    return None
+
+
+def encode(value, content_type=JSON):
+    with CODEC_SECONDS.time("encode", content_type):
+        if content_type == MSGPACK:
+            return msgpack.packb(value, use_bin_type=True)
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode(body, content_type=JSON):
+    if content_type == MSGPACK and msgpack is None:
+        raise CodecError("MessagePack is not supported")
+    try:
+        with CODEC_SECONDS.time("decode", content_type):
+            if content_type == MSGPACK:
+                return msgpack.unpackb(body, raw=False)
+            return json.loads(body)
+    except Exception as e:
+        raise CodecError(str(e))
+
+
+def compress(body, encoding):
+    if encoding not in ("zstd", "gzip"):
+        return body
+    with CODEC_SECONDS.time("compress", encoding):
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=3).compress(body)
+        return gzip.compress(body, compresslevel=5, mtime=0)
+
+
+def decompress(body, encoding):
+    encoding = (encoding or "identity").lower()
+    if encoding == "identity":
+        return body
+    if encoding not in encodings():
+        raise CodecError(f"Unsupported Content-Encoding: {encoding}")
+    try:
+        if encoding == "zstd":
+            return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+        return gzip.decompress(body)
+    except Exception as e:
+        raise CodecError(str(e))
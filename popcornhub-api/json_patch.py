@@ -0,0 +1,133 @@
+"""Application d'opérations JSON Patch (RFC 6902) sur le document."""
+
+
+class PatchError(ValueError):
+    pass
+
+
+def parse_pointer(path):
+    """Découpe un JSON Pointer ("/rentals/3") en liste de segments."""
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise PatchError(f"Chemin invalide : {path!r}")
+    return [
+        part.replace("~1", "/").replace("~0", "~")
+        for part in path[1:].split("/")
+    ]
+
+
+def _child(container, key, path):
+    if isinstance(container, dict):
+        if key not in container:
+            raise PatchError(f"Chemin introuvable : {path}")
+        return container[key]
+    if isinstance(container, list):
+        try:
+            return container[int(key)]
+        except (ValueError, IndexError):
+            raise PatchError(f"Chemin introuvable : {path}")
+    raise PatchError(f"Chemin introuvable : {path}")
+
+
+def _list_index(container, key, path, allow_end=False):
+    if allow_end and key == "-":
+        return len(container)
+    try:
+        index = int(key)
+    except ValueError:
+        raise PatchError(f"Index invalide : {path}")
+    upper = len(container) if allow_end else len(container) - 1
+    if index < 0 or index > upper:
+        raise PatchError(f"Index hors limites : {path}")
+    return index
+
+
+def _parent_path(path):
+    return path.rsplit("/", 1)[0]
+
+
+def _apply_one(doc, op, undo):
+    if (
+        not isinstance(op, dict)
+        or "op" not in op
+        or not isinstance(op.get("path"), str)
+    ):
+        raise PatchError("Opération invalide")
+
+    kind = op["op"]
+    path = op["path"]
+    parts = parse_pointer(path)
+
+    if kind == "test":
+        current = doc
+        for key in parts:
+            current = _child(current, key, path)
+        if current != op.get("value"):
+            raise PatchError(f"Test échoué : {path}")
+        return doc
+
+    if kind not in ("add", "remove", "replace"):
+        raise PatchError(f"Opération non supportée : {kind}")
+
+    if not parts:
+        if kind == "remove":
+            raise PatchError("Impossible de supprimer la racine")
+        undo.append({"op": "replace", "path": "", "value": doc})
+        return op.get("value")
+
+    parent = doc
+    for key in parts[:-1]:
+        parent = _child(parent, key, path)
+    last = parts[-1]
+
+    if isinstance(parent, dict):
+        if kind != "add" and last not in parent:
+            raise PatchError(f"Chemin introuvable : {path}")
+        if last in parent:
+            inverse = "add" if kind == "remove" else "replace"
+            undo.append({"op": inverse, "path": path, "value": parent[last]})
+        else:
+            undo.append({"op": "remove", "path": path})
+        if kind == "remove":
+            del parent[last]
+        else:
+            parent[last] = op.get("value")
+    elif isinstance(parent, list):
+        if kind == "add":
+            index = _list_index(parent, last, path, allow_end=True)
+            parent.insert(index, op.get("value"))
+            undo.append({"op": "remove", "path": f"{_parent_path(path)}/{index}"})
+        elif kind == "remove":
+            index = _list_index(parent, last, path)
+            undo.append({"op": "add", "path": path, "value": parent[index]})
+            del parent[index]
+        else:
+            index = _list_index(parent, last, path)
+            undo.append({"op": "replace", "path": path, "value": parent[index]})
+            parent[index] = op.get("value")
+    else:
+        raise PatchError(f"Chemin introuvable : {path}")
+    return doc
+
+
+def apply_patch(doc, ops, atomic=False):
+    """Applique `ops` à `doc` et renvoie le document résultant.
+
+    Les conteneurs sont modifiés sur place ; seul le remplacement de la racine
+    (chemin "") produit un nouvel objet. Avec `atomic=True`, une opération en
+    échec annule les précédentes avant de lever `PatchError`.
+    """
+    if not isinstance(ops, list):
+        raise PatchError("Le patch doit être une liste d'opérations")
+
+    undo = []
+    try:
+        for op in ops:
+            doc = _apply_one(doc, op, undo)
+    except PatchError:
+        if atomic:
+            for inverse in reversed(undo):
+                doc = _apply_one(doc, inverse, [])
+        raise
+    return doc
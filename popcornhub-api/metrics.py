@@ -0,0 +1,171 @@
+"""Métriques au format texte Prometheus (`GET /metrics`).
+
+Compteurs et histogrammes en mémoire, un verrou par métrique : une mesure
+coûte un `perf_counter()`, une recherche dichotomique et une addition. Les
+jauges sont calculées à la lecture par une fonction.
+
+Copie volontaire de `popcornhub-web/services/metrics.py` : l'API et le site
+sont construits en images Docker séparées, sans code partagé. Une correction
+faite ici doit être reportée là-bas.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request
+
+# Secondes : de 0,5 ms à 10 s.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, doc, labels=()):
+        self.name, self.doc, self.label_names = name, doc, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _labels(self.label_names, labels), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.doc, self.label_names = name, doc, tuple(labels)
+        self.buckets = tuple(buckets)
+        # {labels: [compteurs par tranche (+Inf en dernier), somme]}
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        names = self.label_names + ("le",)
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", _labels(names, labels + (_number(bound),)), cumulative
+            yield f"{self.name}_sum", _labels(self.label_names, labels), total
+            yield f"{self.name}_count", _labels(self.label_names, labels), cumulative
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Gauge:
+    """Valeurs calculées à chaque lecture : `fn()` renvoie `{labels: valeur}`
+    (tuple de valeurs d'étiquettes, `()` sans étiquette)."""
+
+    kind = "gauge"
+
+    def __init__(self, name, doc, fn, labels=()):
+        self.name, self.doc, self.label_names = name, doc, tuple(labels)
+        self.fn = fn
+
+    def samples(self):
+        for labels, value in self.fn().items():
+            yield self.name, _labels(self.label_names, labels), value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, doc, labels=()):
+        return self.register(Counter(name, doc, labels))
+
+    def histogram(self, name, doc, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, doc, labels, buckets))
+
+    def gauge(self, name, doc, fn, labels=()):
+        return self.register(Gauge(name, doc, fn, labels))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.doc}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def instrument(app, histogram):
+    """Mesure la durée de chaque requête Flask dans `histogram`
+    (étiquettes : endpoint, méthode, statut)."""
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            histogram.observe(
+                time.perf_counter() - start,
+                request.endpoint or "unknown",
+                request.method,
+                response.status_code,
+            )
+        return response
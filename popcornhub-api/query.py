@@ -0,0 +1,185 @@
+"""Requêtes filtrées sur les collections du document.
+
+`GET /query/<collection>?champ=valeur&...` ne renvoie que les lignes
+correspondantes au lieu de la collection entière :
+
+- `champ=v1&champ=v2` : égalité (plusieurs valeurs = l'une d'elles) ; les champs
+  de `INDEXES` passent par un index de hachage construit une fois par
+  version de collection, les autres sont vérifiés sur les candidats ;
+- `active=1` : locations dont `expires_at` n'est pas dépassé ;
+- `sort=champ,-autre` (`-` = décroissant), `page` et `page_size` ;
+- `key=k1&key=k2` pour les collections objets (`library`, `favorites`...).
+"""
+
+import json
+from datetime import datetime
+
+from store import _dumps
+
+INDEXES = {
+    "users": {"id", "username", "email"},
+    "user_owns": {"user_id", "movie_id"},
+    "rentals": {"user_id", "owner_id", "movie_id"},
+    "reviews": {"user_id", "movie_id"},
+    "catalog": {"id"},
+}
+
+# Comparaisons insensibles à la casse (identifiants de connexion).
+CASEFOLD = {("users", "username"), ("users", "email")}
+
+RESERVED = {"active", "sort", "page", "page_size", "key"}
+MAX_PAGE_SIZE = 500
+
+
+class QueryError(ValueError):
+    """Paramètres de requête invalides."""
+
+
+def parse_value(raw):
+    if raw in ("true", "false"):
+        return raw == "true"
+    try:
+        return int(raw)
+    except ValueError:
+        return raw
+
+
+def _normalize(name, field, value):
+    if (name, field) in CASEFOLD and value is not None:
+        return str(value).casefold()
+    return value
+
+
+def _sort_key(value):
+    """Clé comparable quel que soit le type : absents d'abord, puis booléens,
+    nombres, textes, et enfin les autres valeurs (en JSON)."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, _dumps(value))
+
+
+def _is_active(row, now):
+    try:
+        return datetime.fromisoformat(row["expires_at"]) > now
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+class QueryEngine:
+    def __init__(self, store):
+        self.store = store
+        # {(collection, champ): (version, {valeur: [positions]}, longueur)}
+        self._built = {}
+
+    def _index(self, name, field, rows):
+        # Appelé sous le verrou du store : la collection ne bouge pas.
+        version = self.store.collection_version(name)
+        built = self._built.get((name, field))
+        if built and built[0] == version and built[2] == len(rows):
+            return built[1]
+        positions = {}
+        for pos, row in enumerate(rows):
+            if isinstance(row, dict) and field in row:
+                key = _normalize(name, field, row[field])
+                positions.setdefault(key, []).append(pos)
+        self._built[(name, field)] = (version, positions, len(rows))
+        return positions
+
+    def _select(self, doc, name, filters, active, keys):
+        if name not in doc:
+            raise KeyError(name)
+        value = doc[name]
+
+        if isinstance(value, dict):
+            if keys is None:
+                raise QueryError("key is required for object collections")
+            items = json.loads(_dumps({k: value[k] for k in keys if k in value}))
+            return items, len(items), self.store.collection_version(name)
+
+        if not isinstance(value, list):
+            raise QueryError(f"{name} is not a collection")
+
+        indexed = [f for f in filters if f in INDEXES.get(name, ())]
+        if indexed:
+            field = indexed[0]
+            index = self._index(name, field, value)
+            positions = sorted(
+                {
+                    pos
+                    for wanted in filters[field]
+                    for pos in index.get(_normalize(name, field, wanted), ())
+                }
+            )
+            candidates = [value[pos] for pos in positions]
+        else:
+            candidates = value
+
+        wanted = {
+            f: {_normalize(name, f, v) for v in values} for f, values in filters.items()
+        }
+        now = datetime.utcnow()
+        rows = []
+        for row in candidates:
+            if not isinstance(row, dict):
+                continue
+            if active and not _is_active(row, now):
+                continue
+            if all(_normalize(name, f, row.get(f)) in v for f, v in wanted.items()):
+                rows.append(row)
+        return rows, len(rows), self.store.collection_version(name)
+
+    def _page(self, doc, name, filters, active, keys, sort, page, page_size):
+        # Sous le verrou du store : tri et découpage sur les lignes du
+        # document, seule la page renvoyée est copiée.
+        items, total, version = self._select(doc, name, filters, active, keys)
+        if not isinstance(items, list):
+            return items, total, version
+        if sort:
+            # Tri stable, du dernier critère au premier.
+            for key in reversed(sort.split(",")):
+                field = key.lstrip("-")
+                items.sort(key=lambda row: _sort_key(row.get(field)), reverse=key.startswith("-"))
+        if page is not None:
+            start = (page - 1) * page_size
+            items = items[start:start + page_size]
+        # Copie profonde via JSON : les lignes du document peuvent changer
+        # dès que le verrou est relâché.
+        return json.loads(_dumps(items)), total, version
+
+    def run(self, name, args):
+        """Exécute la requête décrite par les paramètres `args` (MultiDict).
+
+        Renvoie `(résultat, version de la collection)`.
+        """
+        filters = {}
+        for field in args:
+            if field in RESERVED:
+                continue
+            filters[field] = [parse_value(v) for v in args.getlist(field)]
+
+        active = args.get("active") in ("1", "true")
+        keys = args.getlist("key") if "key" in args else None
+        try:
+            page = int(args["page"]) if "page" in args else None
+            page_size = min(int(args.get("page_size", 20)), MAX_PAGE_SIZE)
+        except ValueError:
+            raise QueryError("page and page_size must be integers")
+        if (page is not None and page < 1) or page_size < 1:
+            raise QueryError("page and page_size must be positive")
+
+        sort = args.get("sort")
+        items, total, version = self.store.read(
+            lambda doc: self._page(doc, name, filters, active, keys, sort, page, page_size)
+        )
+
+        body = {"items": items, "total": total}
+        if page is not None:
+            body["page"] = page
+            body["page_size"] = page_size
+        return body, version
@@ -0,0 +1,303 @@
+"""Création de location côté API, atomique pour chaque exemplaire.
+
+Les vérifications (exemplaire public, format proposé, exemplaire libre,
+pas de location en cours du même film par le locataire) et l'insertion se
+font sous un verrou propre à l'exemplaire `(owner_id, movie_id, format)` et
+au couple locataire/film : deux demandes sur le même exemplaire passent
+l'une après l'autre, les locations sans rapport avancent en parallèle.
+
+Ces vérifications passent par un `RentalIndex` tenu à jour à chaque écriture
+du store : aucune ne parcourt les collections.
+"""
+
+import heapq
+import itertools
+import threading
+from datetime import datetime, timedelta
+
+from store import VersionConflict, _touched
+
+# Tentatives si la vidéothèque change entre la vérification et l'insertion.
+MAX_RETRIES = 5
+
+
+class RentalRefused(Exception):
+    """Location impossible : `reason` (code stable), `status` HTTP et, le
+    cas échéant, `busy_until` (datetime)."""
+
+    def __init__(self, reason, status=409, busy_until=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+        self.busy_until = busy_until
+
+
+class KeyedLocks:
+    """Un verrou par clé, libéré de la table dès qu'il n'est plus utilisé."""
+
+    def __init__(self):
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+
+    def release(self, key):
+        with self._lock:
+            entry = self._locks[key]
+            entry[0].release()
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+
+def _expires(rental):
+    try:
+        return datetime.fromisoformat(rental["expires_at"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _as_id(value):
+    """Id entier (`7` ou `"7"`), 0 s'il n'en est pas un."""
+    if isinstance(value, bool):
+        return 0
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _appends_only(ops, name):
+    """Nombre d'ajouts en fin de `name` si `ops` ne modifie `name` qu'ainsi,
+    sinon None."""
+    appended = 0
+    for op in ops:
+        touched = _touched([op])
+        if op.get("from") is not None:
+            touched = None
+        if touched is not None and name not in touched:
+            continue
+        if op.get("op") != "add" or op.get("path") != f"/{name}/-":
+            return None
+        appended += 1
+    return appended
+
+
+class RentalIndex:
+    """Ce que vérifie une location, indexé : fin de location la plus tardive
+    par exemplaire et par locataire/film/format, fiche de chaque propriétaire
+    pour chaque film, et dernier id de location attribué (au moins la
+    séquence `sequences.rentals`).
+
+    Seules les locations en cours sont indexées. Leurs échéances sont rangées
+    dans un tas : à chaque lecture, celles qui sont passées sortent de
+    l'index, si bien qu'une disponibilité se lit en O(1) quelle que soit la
+    longueur de l'historique.
+
+    Mis à jour par `store.apply`, sous le verrou du store : un ajout en fin
+    de `rentals` est indexé tel quel, toute autre modification de `rentals`
+    ou de `user_owns` fait reconstruire la partie concernée à la lecture
+    suivante. Les lectures passent aussi par `store.read`. Une mise à jour
+    en échec rend tout l'index à reconstruire.
+    """
+
+    def __init__(self, store):
+        self._stale = {"rentals", "user_owns"}
+        self.copies = {}  # {(owner_id, movie_id, format): fin}
+        self.renters = {}  # {(user_id, movie_id, format): fin}
+        self.movies = {}  # {movie_id: {(owner_id, format): fin}}
+        self._expiries = []  # tas de (fin, n°, table, clé)
+        self._order = itertools.count()
+        self.owns = {}  # {(user_id, movie_id): fiche}
+        self.last_id = 0
+        store.subscribe(self._on_apply)
+
+    def _on_apply(self, doc, ops, touched):
+        try:
+            self._follow(doc, ops, touched)
+        except Exception:
+            self._stale.update(("rentals", "user_owns"))
+            raise
+
+    def _sequence(self, doc):
+        sequences = doc.get("sequences")
+        return _as_id(sequences.get("rentals")) if isinstance(sequences, dict) else 0
+
+    def _follow(self, doc, ops, touched):
+        if touched is None:
+            self._stale.update(("rentals", "user_owns"))
+            touched = {"sequences"}
+        if "sequences" in touched:
+            self.last_id = max(self.last_id, self._sequence(doc))
+        if "user_owns" in touched:
+            self._stale.add("user_owns")
+        if "rentals" in touched and "rentals" not in self._stale:
+            appended = _appends_only(ops, "rentals")
+            if appended is None:
+                self._stale.add("rentals")
+            elif appended:
+                for rental in doc["rentals"][-appended:]:
+                    self._add_rental(rental)
+
+    def _add_rental(self, rental):
+        if not isinstance(rental, dict):
+            return
+        self.last_id = max(self.last_id, _as_id(rental.get("id")))
+        expires = _expires(rental)
+        if expires is None or expires <= datetime.utcnow():
+            return
+        movie_id, fmt = rental.get("movie_id"), rental.get("format")
+        for table, key in (
+            (self.copies, (rental.get("owner_id"), movie_id, fmt)),
+            (self.renters, (rental.get("user_id"), movie_id, fmt)),
+        ):
+            try:
+                if key in table and expires <= table[key]:
+                    continue
+                table[key] = expires
+            except TypeError:  # valeur non hachable : ligne ignorée
+                continue
+            heapq.heappush(self._expiries, (expires, next(self._order), table, key))
+            if table is self.copies:
+                self.movies.setdefault(movie_id, {})[key[0], fmt] = expires
+
+    def _expire(self, now):
+        """Retire de l'index les locations terminées à `now`."""
+        while self._expiries and self._expiries[0][0] <= now:
+            expires, _, table, key = heapq.heappop(self._expiries)
+            if table.get(key) != expires:
+                continue  # remplacée depuis par une échéance plus tardive
+            del table[key]
+            if table is self.copies:
+                owner_id, movie_id, fmt = key
+                busy = self.movies[movie_id]
+                del busy[owner_id, fmt]
+                if not busy:
+                    del self.movies[movie_id]
+
+    def refresh(self, doc):
+        """Reconstruit ce qui doit l'être (appelé sous le verrou du store)."""
+        if "rentals" in self._stale:
+            self.copies, self.renters, self.movies = {}, {}, {}
+            self._expiries = []
+            self.last_id = max(self.last_id, self._sequence(doc))
+            for rental in doc.get("rentals", []):
+                self._add_rental(rental)
+        if "user_owns" in self._stale:
+            self.owns = {}
+            for own in doc.get("user_owns", []):
+                if isinstance(own, dict):
+                    try:
+                        self.owns.setdefault((own.get("user_id"), own.get("movie_id")), own)
+                    except TypeError:
+                        pass
+        self._stale.clear()
+        self._expire(datetime.utcnow())
+        return self
+
+
+def _active(until, now):
+    return until if until is not None and until > now else None
+
+
+class RentalDesk:
+    def __init__(self, store):
+        self.store = store
+        self.index = RentalIndex(store)
+        self._locks = KeyedLocks()
+        self._id_lock = threading.Lock()
+        self._next_id = 0
+
+    def _state(self, doc, user_id, owner_id, movie_id, fmt, now):
+        """Lecture (sous le verrou du store) de tout ce que la location vérifie."""
+        index = self.index.refresh(doc)
+        own = index.owns.get((owner_id, movie_id))
+        copy_until = _active(index.copies.get((owner_id, movie_id, fmt)), now)
+        renter_until = _active(index.renters.get((user_id, movie_id, fmt)), now)
+        owns_version = self.store.collection_version("user_owns")
+        own = dict(own) if own else None
+        return own, copy_until, renter_until, index.last_id, owns_version
+
+    def busy_copies(self, movie_id):
+        """Exemplaires du film loués en ce moment : `{(owner_id, format): fin}`."""
+        return self.store.read(lambda doc: dict(self.index.refresh(doc).movies.get(movie_id, {})))
+
+    def _allocate_id(self, last_id):
+        with self._id_lock:
+            self._next_id = max(self._next_id, last_id + 1)
+            rental_id = self._next_id
+            self._next_id += 1
+            return rental_id
+
+    def _rent_locked(self, user_id, owner_id, movie_id, fmt, duration_days):
+        now = datetime.utcnow()
+        own, copy_until, renter_until, last_id, owns_version = self.store.read(
+            lambda doc: self._state(doc, user_id, owner_id, movie_id, fmt, now)
+        )
+
+        if not own or not own.get("is_public", False):
+            raise RentalRefused("not_available")
+        if renter_until:
+            raise RentalRefused("already_renting", busy_until=renter_until)
+        if not own.get(f"has_{fmt}"):
+            raise RentalRefused("format_unavailable")
+        if copy_until:
+            raise RentalRefused("copy_busy", busy_until=copy_until)
+
+        price = own.get(f"{fmt}_price")
+        max_days = own.get(f"{fmt}_max_days")
+        if price is None:
+            price = own.get("bluray_price") or own.get("digital_price") or 3.99
+
+        try:
+            days = int(duration_days or (max_days or 3))
+        except (TypeError, ValueError):
+            days = max_days or 3
+        days = max(days, 1)
+        if max_days and days > max_days:
+            days = max_days
+
+        rental = {
+            "id": self._allocate_id(last_id),
+            "user_id": user_id,
+            "movie_id": movie_id,
+            "owner_id": owner_id,
+            "format": fmt,
+            "rented_at": now.isoformat(timespec="seconds"),
+            "expires_at": (now + timedelta(days=days)).isoformat(timespec="seconds"),
+            "price_cents": int(round(price * 100)),
+        }
+        ops = []
+        if not self.store.has("rentals"):
+            ops.append({"op": "add", "path": "/rentals", "value": []})
+        ops.append({"op": "add", "path": "/rentals/-", "value": rental})
+        # L'exemplaire est protégé par son verrou ; seule la fiche du
+        # propriétaire (prix, publication) peut encore changer.
+        version = self.store.apply(ops, expect={"user_owns": owns_version})
+        return rental, version
+
+    def rent(self, user_id, owner_id, movie_id, fmt, duration_days=None):
+        """Crée la location ; renvoie `(location, version du document)` ou
+        lève `RentalRefused`."""
+        if fmt not in ("bluray", "digital"):
+            raise RentalRefused("invalid_format", status=400)
+
+        keys = sorted(
+            [("copy", owner_id, movie_id, fmt), ("renter", user_id, movie_id, fmt)]
+        )
+        for key in keys:
+            self._locks.acquire(key)
+        try:
+            for attempt in range(MAX_RETRIES):
+                try:
+                    return self._rent_locked(user_id, owner_id, movie_id, fmt, duration_days)
+                except VersionConflict:
+                    if attempt == MAX_RETRIES - 1:
+                        raise
+        finally:
+            for key in reversed(keys):
+                self._locks.release(key)
@@ -0,0 +1,475 @@
+"""Stockage du document PopCornHub.
+
+Deux modes sont disponibles :
+
+- `FileStore` (par défaut) réécrit tout data.json à chaque modification ;
+- `JournalStore` ajoute chaque modification à un journal (une ligne JSON
+  par commit), regroupe les écritures concurrentes en un seul fsync et
+  compacte périodiquement le journal dans un snapshot.
+
+Dans les deux cas le document vit en mémoire et toutes les écritures
+passent par `apply()` sous forme d'opérations JSON Patch.
+
+Chaque commit incrémente `version` (monotone, persistée). Chaque collection
+retient la version du dernier commit qui l'a modifiée : ces numéros servent
+d'ETag et de précondition pour les écritures conditionnelles.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import codec
+from json_patch import apply_patch, parse_pointer, PatchError
+from metrics import registry
+
+log = logging.getLogger(__name__)
+
+WRITE_SECONDS = registry.histogram(
+    "popcornhub_api_store_write_seconds",
+    "Durée d'une écriture, du patch appliqué jusqu'à sa durabilité.",
+)
+PERSIST_SECONDS = registry.histogram(
+    "popcornhub_api_store_persist_seconds",
+    "Durée des écritures disque (snapshot, fsync du journal, compaction).",
+    ("step",),
+)
+CONFLICTS = registry.counter(
+    "popcornhub_api_store_conflicts_total",
+    "Écritures conditionnelles refusées (version dépassée).",
+    ("collection",),
+)
+
+
+class VersionConflict(Exception):
+    """La version de base d'une écriture conditionnelle n'est plus à jour."""
+
+
+def empty_document():
+    return {
+        "users": [],
+        "library": {},
+        "favorites": {},
+        "reviews": [],
+        "rentals": [],
+        "user_owns": [],
+        "deleted_films": [],
+        "film_overrides": {},
+        "catalog": [],
+        "review_stats": {},
+    }
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _touched(ops):
+    """Collections de premier niveau modifiées par `ops` (None = toutes)."""
+    names = set()
+    for op in ops:
+        parts = parse_pointer(op["path"])
+        if not parts:
+            return None
+        names.add(parts[0])
+    return names
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class FileStore:
+    """Mode historique : data.json est réécrit en entier à chaque commit.
+
+    `pretty=False` l'écrit en JSON compact (sans indentation) ; la version
+    lisible reste disponible via `export()`.
+    """
+
+    def __init__(self, path, pretty=True):
+        self.path = Path(path)
+        self.pretty = pretty
+        self.meta_path = self.path.with_suffix(".version.json")
+        self.version = 0
+        self.versions = {}
+        self._lock = threading.Lock()
+        self._encoded = {}
+        self._listeners = []
+        # Taille du dernier snapshot écrit ou relu, en octets.
+        self.snapshot_bytes = 0
+        self._doc = self._recover()
+
+    def _recover(self):
+        if self.meta_path.exists():
+            with self.meta_path.open("r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.version = meta["version"]
+            self.versions = meta["versions"]
+        if not self.path.exists():
+            doc = empty_document()
+            self._write_snapshot(doc)
+            return doc
+        self.snapshot_bytes = self.path.stat().st_size
+        with self.path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self):
+        tmp = self.meta_path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "versions": self.versions}, f)
+        tmp.replace(self.meta_path)
+
+    def _write_snapshot(self, doc):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            if self.pretty:
+                json.dump(doc, f, indent=2, ensure_ascii=False)
+            else:
+                f.write(_dumps(doc))
+        self.snapshot_bytes = tmp.stat().st_size
+        tmp.replace(self.path)
+
+    def stored_bytes(self):
+        """Taille du document sur disque, sans le resérialiser."""
+        return self.snapshot_bytes
+
+    def has(self, name):
+        with self._lock:
+            return name in self._doc
+
+    def collection_version(self, name):
+        return self.versions.get(name, 0)
+
+    def read(self, fn):
+        """Appelle `fn(document)` sous le verrou du store (lecture cohérente
+        avec les écritures). `fn` doit être rapide et ne rien modifier."""
+        with self._lock:
+            return fn(self._doc)
+
+    def dump(self, name=None, content_type=codec.JSON, encoding=None):
+        """Renvoie `(corps, version)` pour le document entier ou la collection
+        `name`, au format `content_type` et compressé selon `encoding`.
+        Chaque variante est mémorisée jusqu'à la prochaine modification."""
+        with self._lock:
+            variants = self._encoded.setdefault(name, {})
+            body = variants.get((content_type, encoding))
+            if body is None:
+                raw = variants.get((content_type, None))
+                if raw is None:
+                    value = self._doc if name is None else self._doc[name]
+                    raw = variants[(content_type, None)] = codec.encode(value, content_type)
+                body = variants[(content_type, encoding)] = codec.compress(raw, encoding)
+            version = self.version if name is None else self.collection_version(name)
+            return body, version
+
+    def export(self):
+        """Document entier en JSON indenté, pour lecture humaine."""
+        with self._lock:
+            body = json.dumps(self._doc, indent=2, ensure_ascii=False)
+            return body.encode("utf-8"), self.version
+
+    def apply(self, ops, if_version=None, expect=None):
+        """Applique un JSON Patch de façon atomique puis le rend durable.
+
+        - `if_version` : version globale attendue du document ;
+        - `expect` : `{collection: version}` attendues (ensemble lu par le client).
+
+        Lève `VersionConflict` si une précondition n'est plus vraie.
+        Renvoie la nouvelle version du document.
+        """
+        if not isinstance(ops, list):
+            raise PatchError("Le patch doit être une liste d'opérations")
+        for op in ops:
+            if (
+                isinstance(op, dict)
+                and op.get("path") == ""
+                and not isinstance(op.get("value"), dict)
+            ):
+                raise PatchError("Root JSON must be an object")
+
+        with WRITE_SECONDS.time():
+            with self._lock:
+                if if_version is not None and if_version != self.version:
+                    CONFLICTS.inc("*")
+                    raise VersionConflict(None)
+                for name, version in (expect or {}).items():
+                    if self.collection_version(name) != version:
+                        CONFLICTS.inc(name)
+                        raise VersionConflict(name)
+
+                # Sérialisé avant l'application : les valeurs insérées sont
+                # partagées avec le document et une opération suivante du
+                # même patch peut les modifier.
+                record = self._record(ops)
+                self._doc = apply_patch(self._doc, ops, atomic=True)
+                self.version += 1
+                touched = _touched(ops)
+                self._mark_touched(touched)
+
+                ticket = self._persist(record)
+                version = self.version
+                # L'écriture est enregistrée : un abonné en échec ne doit
+                # plus l'annuler ni la faire échouer.
+                for listener in self._listeners:
+                    try:
+                        listener(self._doc, ops, touched)
+                    except Exception:
+                        log.exception("abonné %r en échec après l'écriture %d", listener, version)
+            self._wait_durable(ticket)
+        return version
+
+    def subscribe(self, listener):
+        """`listener(document, ops, collections modifiées)` sera appelé sous
+        le verrou après chaque écriture enregistrée (collections : None =
+        toutes). Ses exceptions sont journalisées, jamais propagées."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def _mark_touched(self, touched):
+        if touched is None:
+            touched = set(self._doc)
+            self.versions = {}
+            self._encoded.clear()
+        else:
+            self._encoded.pop(None, None)
+        for name in touched:
+            self.versions[name] = self.version
+            self._encoded.pop(name, None)
+
+    def _record(self, ops):
+        """Forme durable de `ops`, calculée avant qu'elles ne soient appliquées."""
+        return None
+
+    def _persist(self, record):
+        # La version est écrite avant les données : après un arrêt brutal elle
+        # peut être en avance sur data.json, jamais en retard.
+        self._write_meta()
+        with PERSIST_SECONDS.time("snapshot"):
+            self._write_snapshot(self._doc)
+        return None
+
+    def _wait_durable(self, ticket):
+        pass
+
+
+class JournalStore(FileStore):
+    """Journal append-only + snapshots, avec commit groupé.
+
+    - `data.snapshot.json` contient `{"seq": n, "versions": {...}, "data": {...}}` ;
+    - `data.journal` contient une ligne `{"seq": n, "ops": [...]}` par commit,
+      `seq` étant la version du document après ce commit ;
+    - au démarrage le snapshot est relu puis la fin du journal rejouée
+      (les entrées déjà couvertes par le snapshot sont ignorées).
+
+    Au-delà de `compact_bytes`, le journal courant est renommé en
+    `data.journal.<seq>` et un nouveau snapshot est écrit en tâche de fond ;
+    le segment n'est supprimé qu'une fois le snapshot en place.
+    """
+
+    def __init__(self, path, compact_bytes=4 * 1024 * 1024):
+        path = Path(path)
+        self.snapshot_path = path.with_suffix(".snapshot.json")
+        self.journal_path = path.with_suffix(".journal")
+        self.compact_bytes = compact_bytes
+        self.legacy_path = path
+
+        self._pending = []
+        self._pending_seq = 0
+        self._flushed_seq = 0
+        self._flushing = False
+        self._compacting = False
+        self._cond = threading.Condition(threading.Lock())
+        self._journal = None
+        self._journal_size = 0
+
+        super().__init__(path)
+
+        self._journal = self.journal_path.open("ab")
+        self._journal_size = self._journal.tell()
+
+    def _segments(self):
+        segments = []
+        for p in self.journal_path.parent.glob(self.journal_path.name + ".*"):
+            suffix = p.name.rsplit(".", 1)[1]
+            if suffix.isdigit():
+                segments.append((int(suffix), p))
+        segments.sort()
+        return [p for _, p in segments]
+
+    def _recover(self):
+        journals = [j for j in self._segments() + [self.journal_path] if j.exists()]
+        if self.snapshot_path.exists():
+            with self.snapshot_path.open("r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            doc, snapshot_seq = snapshot["data"], snapshot["seq"]
+            self.versions = snapshot.get("versions", {})
+            self.snapshot_bytes = self.snapshot_path.stat().st_size
+        elif self.legacy_path.exists():
+            with self.legacy_path.open("r", encoding="utf-8") as f:
+                doc, snapshot_seq = json.load(f), 0
+            self.snapshot_bytes = self.legacy_path.stat().st_size
+            if self.meta_path.exists() and not any(j.stat().st_size for j in journals):
+                # Migration depuis un FileStore : les versions continuent,
+                # fixées par un premier snapshot.
+                with self.meta_path.open("r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                snapshot_seq = meta["version"]
+                self.versions = meta["versions"]
+                self._store_snapshot(
+                    _dumps({"seq": snapshot_seq, "versions": self.versions, "data": doc})
+                )
+        else:
+            doc, snapshot_seq = empty_document(), 0
+
+        seq = snapshot_seq
+        replayed = 0
+        for journal in journals:
+            good_offset = 0
+            with journal.open("rb") as f:
+                for raw in f:
+                    try:
+                        entry = json.loads(raw)
+                    except ValueError:
+                        # Ligne tronquée par un arrêt brutal : on s'arrête là.
+                        log.warning("journal %s tronqué à l'offset %d", journal, good_offset)
+                        break
+                    good_offset += len(raw)
+                    if entry["seq"] <= snapshot_seq:
+                        continue
+                    doc = apply_patch(doc, entry["ops"])
+                    seq = entry["seq"]
+                    touched = _touched(entry["ops"])
+                    if touched is None:
+                        self.versions, touched = {}, doc
+                    for name in touched:
+                        self.versions[name] = seq
+                    replayed += 1
+            if journal == self.journal_path and good_offset < journal.stat().st_size:
+                with journal.open("r+b") as f:
+                    f.truncate(good_offset)
+
+        if replayed:
+            log.info("journal : %d entrées rejouées (seq %d)", replayed, seq)
+        self.version = self._pending_seq = self._flushed_seq = seq
+        return doc
+
+    def _record(self, ops):
+        return _dumps(ops)
+
+    def _persist(self, record):
+        # Appelé sous self._lock : l'ordre du journal suit l'ordre d'application.
+        line = f'{{"seq":{self.version},"ops":{record}}}\n'.encode("utf-8")
+        with self._cond:
+            self._pending.append(line)
+            self._pending_seq = self.version
+        return self.version
+
+    def _wait_durable(self, seq):
+        """Commit groupé : le premier écrivain disponible écrit et synchronise
+        toutes les lignes en attente d'un seul fsync, les autres attendent."""
+        with self._cond:
+            while self._flushed_seq < seq:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                self._flushing = True
+                batch, self._pending = self._pending, []
+                upto = self._pending_seq
+                self._cond.release()
+                try:
+                    data = b"".join(batch)
+                    with PERSIST_SECONDS.time("journal_fsync"):
+                        self._journal.write(data)
+                        self._journal.flush()
+                        os.fsync(self._journal.fileno())
+                finally:
+                    self._cond.acquire()
+                    self._flushing = False
+                    self._cond.notify_all()
+                self._flushed_seq = upto
+                self._journal_size += len(data)
+
+            compact = self._journal_size >= self.compact_bytes and not self._compacting
+            if compact:
+                self._compacting = True
+        if compact:
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def _rotate(self):
+        """Sous self._lock : fige l'état courant et ouvre un nouveau journal."""
+        with self._cond:
+            while self._flushing or self._pending:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                # Écrivains enregistrés mais pas encore vidés : on vide pour eux.
+                self._cond.release()
+                try:
+                    self._wait_durable(self._pending_seq)
+                finally:
+                    self._cond.acquire()
+            self._journal.close()
+            segment = self.journal_path.with_name(f"{self.journal_path.name}.{self.version}")
+            self.journal_path.replace(segment)
+            self._journal = self.journal_path.open("ab")
+            self._journal_size = 0
+        return segment
+
+    def compact(self):
+        """Écrit un snapshot puis supprime le segment de journal qu'il couvre."""
+        start = time.perf_counter()
+        try:
+            with self._lock:
+                segment = self._rotate()
+                body = _dumps(
+                    {"seq": self.version, "versions": self.versions, "data": self._doc}
+                )
+
+            self._store_snapshot(body)
+
+            covered = int(segment.name.rsplit(".", 1)[1])
+            for old in self._segments():
+                if int(old.name.rsplit(".", 1)[1]) <= covered:
+                    old.unlink(missing_ok=True)
+        finally:
+            PERSIST_SECONDS.observe(time.perf_counter() - start, "compact")
+            with self._cond:
+                self._compacting = False
+
+    def _store_snapshot(self, body):
+        tmp = self.snapshot_path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        self.snapshot_bytes = tmp.stat().st_size
+        tmp.replace(self.snapshot_path)
+        _fsync_dir(self.snapshot_path.parent)
+
+    def _write_snapshot(self, doc):
+        # En mode journal, seuls `compact()` et la migration écrivent un snapshot.
+        pass
+
+    def stored_bytes(self):
+        # Snapshot + journal courant (les segments en cours de compaction
+        # ne sont pas comptés).
+        return self.snapshot_bytes + self._journal_size
+
+
+def open_store(path, mode="file", compact_bytes=4 * 1024 * 1024, pretty=True):
+    if mode == "journal":
+        return JournalStore(path, compact_bytes=compact_bytes)
+    return FileStore(path, pretty=pretty)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Les modules de l'API sont à plat dans popcornhub-api/.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
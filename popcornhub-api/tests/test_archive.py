@@ -0,0 +1,51 @@
+import gzip
+
+from archive import RentalArchive, sweep
+from store import FileStore, VersionConflict
+
+
+def _rental(id, user_id, movie_id, expires_at="2024-03-10T12:00:00"):
+    return {"id": id, "user_id": user_id, "owner_id": 9, "movie_id": movie_id,
+            "format": "bluray", "expires_at": expires_at}
+
+
+def test_query_reads_indexed_segments(tmp_path):
+    archive = RentalArchive(tmp_path)
+    archive.append([_rental(1, 1, 10), _rental(2, 2, 10)])
+    archive.append([_rental(3, 1, 11, "2024-04-02T08:00:00")])
+
+    assert [r["id"] for r in archive.query(user_id=1)] == [1, 3]
+    assert [r["id"] for r in archive.query(movie_id=10, user_id=2)] == [2]
+    assert archive.query(user_id=42) == []
+
+    # Index reconstruit depuis les fichiers.
+    assert [r["id"] for r in RentalArchive(tmp_path).query(owner_id=9)] == [1, 2, 3]
+
+
+def test_append_skips_rentals_already_archived(tmp_path):
+    archive = RentalArchive(tmp_path)
+    assert archive.append([_rental(1, 1, 10)]) == 1
+    assert RentalArchive(tmp_path).append([_rental(1, 1, 10), _rental(2, 1, 10)]) == 1
+
+    with gzip.open(tmp_path / "rentals-2024-03.jsonl.gz", "rt") as f:
+        assert len(f.readlines()) == 2
+
+
+def test_sweep_after_conflict_does_not_archive_twice(tmp_path):
+    store = FileStore(tmp_path / "data.json")
+    store.apply([{"op": "add", "path": "/rentals/-", "value": _rental(1, 1, 10)}])
+    archive = RentalArchive(tmp_path / "archive")
+
+    apply = store.apply
+
+    def conflict(*args, **kwargs):
+        store.apply = apply
+        raise VersionConflict()
+
+    store.apply = conflict
+    assert sweep(store, archive) == 0
+    assert sweep(store, archive) == 1
+
+    assert store.read(lambda doc: doc["rentals"]) == []
+    with gzip.open(tmp_path / "archive" / "rentals-2024-03.jsonl.gz", "rt") as f:
+        assert len(f.readlines()) == 1
@@ -0,0 +1,35 @@
+from werkzeug.datastructures import MultiDict
+
+from query import QueryEngine
+from store import FileStore
+
+
+def _engine(tmp_path, rows):
+    store = FileStore(tmp_path / "data.json")
+    store.apply([{"op": "add", "path": "/reviews", "value": rows}])
+    return QueryEngine(store)
+
+
+def test_sort_mixed_types_and_paginate(tmp_path):
+    engine = _engine(tmp_path, [
+        {"id": 1, "movie_id": 5, "created_at": "2024-01-02"},
+        {"id": 2, "movie_id": 5, "created_at": None},
+        {"id": 3, "movie_id": 5, "created_at": 7},
+        {"id": 4, "movie_id": 5, "created_at": "2024-03-01"},
+        {"id": 5, "movie_id": 6, "created_at": "2025-01-01"},
+    ])
+    body, _ = engine.run("reviews", MultiDict(
+        [("movie_id", "5"), ("sort", "-created_at,id"), ("page", "1"), ("page_size", "2")]
+    ))
+    assert [r["id"] for r in body["items"]] == [4, 1]
+    assert body["total"] == 4
+
+    body, _ = engine.run("reviews", MultiDict([("movie_id", "5"), ("sort", "created_at")]))
+    assert [r["id"] for r in body["items"]] == [2, 3, 1, 4]
+
+
+def test_returned_rows_are_copies(tmp_path):
+    engine = _engine(tmp_path, [{"id": 1, "movie_id": 5, "tags": []}])
+    body, _ = engine.run("reviews", MultiDict([("movie_id", "5")]))
+    body["items"][0]["tags"].append("x")
+    assert engine.store.read(lambda doc: doc["reviews"][0]["tags"]) == []
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import rentals
+from rentals import RentalDesk, RentalRefused
+from store import FileStore, JournalStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = FileStore(tmp_path / "data.json")
+    store.apply([
+        {"op": "add", "path": "/user_owns/-", "value": {
+            "user_id": 1, "movie_id": 10, "is_public": True,
+            "has_bluray": True, "bluray_price": 2.5,
+        }},
+        {"op": "add", "path": "/sequences", "value": {"rentals": 41}},
+    ])
+    return store
+
+
+def test_rent_checks_copy_and_renter(store):
+    desk = RentalDesk(store)
+    rental, _ = desk.rent(2, 1, 10, "bluray")
+    assert rental["id"] == 42
+    assert rental["price_cents"] == 250
+
+    with pytest.raises(RentalRefused) as refused:
+        desk.rent(2, 1, 10, "bluray")
+    assert refused.value.reason == "already_renting"
+    with pytest.raises(RentalRefused) as refused:
+        desk.rent(3, 1, 10, "bluray")
+    assert refused.value.reason == "copy_busy"
+
+
+def test_index_follows_other_writes(store):
+    desk = RentalDesk(store)
+    desk.rent(2, 1, 10, "bluray")
+
+    # Retour de la location par un patch quelconque : l'exemplaire se libère.
+    store.apply([{"op": "remove", "path": "/rentals/0"}])
+    rental, _ = desk.rent(3, 1, 10, "bluray")
+    assert rental["id"] == 43
+
+    store.apply([{"op": "replace", "path": "/user_owns/0/is_public", "value": False}])
+    store.apply([{"op": "remove", "path": "/rentals/0"}])
+    with pytest.raises(RentalRefused) as refused:
+        desk.rent(4, 1, 10, "bluray")
+    assert refused.value.reason == "not_available"
+
+
+def test_string_ids_are_indexed_and_journaled(tmp_path):
+    store = JournalStore(tmp_path / "data.json")
+    store.apply([{"op": "add", "path": "/user_owns/-", "value": {
+        "user_id": 1, "movie_id": 10, "is_public": True, "has_digital": True,
+    }}])
+    desk = RentalDesk(store)
+    desk.rent(2, 1, 10, "digital")
+
+    store.apply([{"op": "add", "path": "/rentals/-", "value": {"id": "7", "user_id": 5}}])
+    store._journal.close()
+
+    replayed = JournalStore(tmp_path / "data.json")
+    assert replayed.read(lambda doc: doc["rentals"][-1]["id"]) == "7"
+    replayed._journal.close()
+    assert desk.index.last_id == 7
+
+
+def test_failing_listener_does_not_undo_the_write(tmp_path):
+    store = JournalStore(tmp_path / "data.json")
+
+    def broken(doc, ops, touched):
+        raise RuntimeError("boom")
+
+    store.subscribe(broken)
+    version = store.apply([{"op": "add", "path": "/users/-", "value": {"id": 1}}])
+    store._journal.close()
+
+    replayed = JournalStore(tmp_path / "data.json")
+    assert replayed.version == version
+    assert replayed.read(lambda doc: doc["users"]) == [{"id": 1}]
+    replayed._journal.close()
+
+
+
+def test_busy_copies_expire_lazily(store, monkeypatch):
+    desk = RentalDesk(store)
+    rental, _ = desk.rent(2, 1, 10, "bluray", duration_days=1)
+    until = desk.busy_copies(10)[1, "bluray"]
+    assert until.isoformat(timespec="seconds") == rental["expires_at"]
+    assert desk.busy_copies(11) == {}
+
+    # Échéance passée : sortie de l'index à la lecture suivante, sans écriture.
+    class Later(datetime):
+        @classmethod
+        def utcnow(cls):
+            return until + timedelta(seconds=1)
+
+    monkeypatch.setattr(rentals, "datetime", Later)
+    assert desk.busy_copies(10) == {}
+    assert desk.index.copies == {} and desk.index.renters == {}
+    rental, _ = desk.rent(3, 1, 10, "bluray")
+    assert desk.busy_copies(10)
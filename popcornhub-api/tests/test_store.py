@@ -0,0 +1,81 @@
+import json
+
+from store import FileStore, JournalStore
+
+
+def test_journal_replay_matches_live_document(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({"a": []}), encoding="utf-8")
+    store = JournalStore(path)
+    # La seconde opération modifie la valeur insérée par la première.
+    store.apply([
+        {"op": "add", "path": "/a/-", "value": {"n": []}},
+        {"op": "add", "path": "/a/0/n/-", "value": 1},
+    ])
+    live = store.read(lambda doc: json.loads(json.dumps(doc)))
+    assert live == {"a": [{"n": [1]}]}
+    store._journal.close()
+
+    replayed = JournalStore(path)
+    assert replayed.read(lambda doc: doc) == live
+    assert replayed.version == store.version
+
+
+def test_journal_replay_after_compaction(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({"a": []}), encoding="utf-8")
+    store = JournalStore(path)
+    store.apply([{"op": "add", "path": "/a/-", "value": {"n": []}}])
+    store.compact()
+    store.apply([
+        {"op": "add", "path": "/a/-", "value": {"n": [0]}},
+        {"op": "add", "path": "/a/1/n/-", "value": 2},
+    ])
+    store._journal.close()
+
+    replayed = JournalStore(path)
+    assert replayed.read(lambda doc: doc) == {"a": [{"n": []}, {"n": [0, 2]}]}
+
+
+def test_file_store_recovers_written_document(tmp_path):
+    path = tmp_path / "data.json"
+    store = FileStore(path)
+    store.apply([{"op": "add", "path": "/users/-", "value": {"id": 1, "tags": []}},
+                 {"op": "add", "path": "/users/0/tags/-", "value": "x"}])
+    assert FileStore(path).read(lambda doc: doc["users"]) == [{"id": 1, "tags": ["x"]}]
+
+
+def test_stored_bytes_follows_writes(tmp_path):
+    store = FileStore(tmp_path / "data.json", pretty=False)
+    store.apply([{"op": "add", "path": "/users/-", "value": {"id": 1}}])
+    assert store.stored_bytes() == (tmp_path / "data.json").stat().st_size
+
+    journal = JournalStore(tmp_path / "j.json")
+    journal.apply([{"op": "add", "path": "/users/-", "value": {"id": 1}}])
+    journal.compact()
+    journal.apply([{"op": "add", "path": "/users/-", "value": {"id": 2}}])
+    on_disk = (tmp_path / "j.snapshot.json").stat().st_size + (tmp_path / "j.journal").stat().st_size
+    assert journal.stored_bytes() == on_disk
+    journal._journal.close()
+
+
+def test_migration_from_file_store_keeps_versions(tmp_path):
+    path = tmp_path / "data.json"
+    legacy = FileStore(path)
+    legacy.apply([{"op": "add", "path": "/users/-", "value": {"id": 1}}])
+    legacy.apply([{"op": "add", "path": "/reviews", "value": []}])
+
+    store = JournalStore(path)
+    assert store.version == legacy.version
+    assert store.collection_version("users") == legacy.collection_version("users")
+    store.apply([{"op": "add", "path": "/users/-", "value": {"id": 2}}])
+    assert store.version == legacy.version + 1
+    store._journal.close()
+
+    replayed = JournalStore(path)
+    assert replayed.version == legacy.version + 1
+    assert replayed.collection_version("reviews") == legacy.collection_version("reviews")
+    # Remplacement de la racine rejoué : seules ses collections ont une version.
+    replayed.apply([{"op": "replace", "path": "", "value": {"users": []}}])
+    replayed._journal.close()
+    assert JournalStore(path).versions == {"users": replayed.version}
@@ -1,5 +1,7 @@
 from flask import (
     Flask,
+    Response,
+    jsonify,
     render_template,
     request,
     redirect,
@@ -9,14 +11,30 @@ from flask import (
 
 from datetime import datetime
 
-from config import SECRET_KEY
+from config import SECRET_KEY, WARM_ENABLED, WARM_INTERVAL, WARM_MAX_FILMS, WARM_RATE
 
-from services.data import load_data
-from services.tmdb import tmdb_get, tmdb_movie_to_film
+from services import catalog
+from services.data import load_data, query
+from services.page_cache import cache_anonymous, page_cache_stats
+from services.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, instrument, registry
+from services.profiler import init_profiler
+from services.parallel import submit
+from services.tmdb import tmdb_get, tmdb_movie_to_film, tmdb_cache_stats
+from services.warmer import start_warmer
 
 app = Flask(__name__)
 app.secret_key = SECRET_KEY
 
+instrument(
+    app,
+    registry.histogram(
+        "popcornhub_web_request_seconds",
+        "Durée de traitement des pages et actions du site.",
+        ("endpoint", "method", "status"),
+    ),
+)
+init_profiler(app)
+
 MAX_FILMS = 1000           
 TMDB_PAGE_SIZE = 20         
 MAX_PAGES = MAX_FILMS // TMDB_PAGE_SIZE
@@ -28,7 +46,7 @@ def login_required(view):
     @wraps(view)
     def wrapped(*args, **kwargs):
         if "user_id" not in session:
-            return redirect(url_for("login", next=request.path))
+            return redirect(url_for("auth.login", next=request.path))
         return view(*args, **kwargs)
 
     return wrapped
@@ -36,17 +54,23 @@ def login_required(view):
 from routes.auth import auth_bp
 from routes.films import films_bp
 from routes.favorites import favorites_bp
+from routes.images import images_bp
 from routes.profile import profile_bp
 
 app.register_blueprint(auth_bp)
 app.register_blueprint(films_bp)
 app.register_blueprint(favorites_bp)
+app.register_blueprint(images_bp)
 app.register_blueprint(profile_bp)
 
+def _index_depends():
+    # Recherche : le catalogue local est consulté avant TMDb.
+    return ("deleted_films", "catalog") if request.args.get("q", "").strip() else ("deleted_films",)
+
+
 @app.route("/", endpoint="index")
+@cache_anonymous(depends=_index_depends)
 def index():
-    data = load_data()
-
     q = request.args.get("q", "").strip()
     genre_id = request.args.get("genre", "").strip()
     try:
@@ -57,10 +81,22 @@ def index():
 
     params = {"page": page}
 
+    uid = str(session["user_id"]) if session.get("user_id") else None
+    names = ["deleted_films"] + (["catalog"] if q else [])
+    # Document, genres et listes de l'utilisateur demandés pendant que la
+    # page de films est chargée.
+    data = load_data().prefetch(*names)
+    genres_call = submit(tmdb_get, "/genre/movie/list", {"language": "fr-FR"})
+    if uid is not None:
+        lists_calls = [submit(query, "favorites", key=uid), submit(query, "library", key=uid)]
+
     try:
         if q:
-            params["query"] = q
-            tmdb_page = tmdb_get("/search/movie", params)
+            # Catalogue local d'abord, TMDb seulement si rien ne correspond.
+            tmdb_page = catalog.search(data, q, page=page, page_size=TMDB_PAGE_SIZE)
+            if not tmdb_page["results"]:
+                params["query"] = q
+                tmdb_page = tmdb_get("/search/movie", params)
 
         elif genre_id:
             params["with_genres"] = genre_id
@@ -90,14 +126,13 @@ def index():
 
     favorite_ids = set()
     library_ids = set()
-    if session.get("user_id"):
-        uid = str(session["user_id"])
-        favorite_ids = set(data.get("favorites", {}).get(uid, []))
-        library_ids = set(data.get("library", {}).get(uid, []))
+    if uid is not None:
+        favorites, library = (call.result() for call in lists_calls)
+        favorite_ids = set(favorites["items"].get(uid, []))
+        library_ids = set(library["items"].get(uid, []))
 
     try:
-        genres_data = tmdb_get("/genre/movie/list", {"language": "fr-FR"})
-        genres = genres_data.get("genres", [])
+        genres = genres_call.result().get("genres", [])
     except Exception:
         genres = []
 
@@ -114,5 +149,16 @@ def index():
         selected_genre=genre_id,
     )
 
+@app.get("/cache/stats", endpoint="cache_stats")
+def cache_stats():
+    return jsonify({"tmdb": tmdb_cache_stats(), "pages": page_cache_stats()})
+
+@app.get("/metrics", endpoint="metrics")
+def metrics():
+    return Response(registry.render(), content_type=METRICS_CONTENT_TYPE)
+
 if __name__ == "__main__":
+    # Un seul préchargeur, dans le processus qui sert le site.
+    if WARM_ENABLED and WARM_INTERVAL > 0:
+        start_warmer(WARM_INTERVAL, WARM_RATE, WARM_MAX_FILMS)
     app.run(host="0.0.0.0", port=5000, debug=False)
\ No newline at end of file
@@ -7,6 +7,106 @@ TMDB_API_KEY = os.environ.get(
     "c3480147e43da7baac0b6bb5a88ebc25"
 )
 
-TMDB_BASE_URL = "https://api.themoviedb.org/3"
+TMDB_BASE_URL = os.environ.get("TMDB_BASE_URL", "https://api.themoviedb.org/3")
 
-TMDB_IMG_BASE = "https://image.tmdb.org/t/p"
\ No newline at end of file
+TMDB_IMG_BASE = os.environ.get("TMDB_IMG_BASE", "https://image.tmdb.org/t/p")
+
+# Avis affichés par page sur la fiche d'un film.
+REVIEWS_PAGE_SIZE = int(os.environ.get("REVIEWS_PAGE_SIZE", 10))
+
+# Cache des réponses TMDb : nombre d'entrées en mémoire et, optionnellement,
+# fichier SQLite partagé entre workers et conservé entre redémarrages.
+TMDB_CACHE_SIZE = int(os.environ.get("TMDB_CACHE_SIZE", 4096))
+TMDB_CACHE_PATH = os.environ.get("TMDB_CACHE_PATH") or None
+
+# Durée de vie (secondes) par préfixe de chemin TMDb ; le plus long préfixe
+# correspondant l'emporte.
+TMDB_CACHE_TTLS = {
+    "/genre/": 7 * 24 * 3600,
+    "/movie/popular": 3600,
+    "/discover/": 3600,
+    "/search/": 15 * 60,
+    "/movie/": 24 * 3600,
+    "/person/": 24 * 3600,
+}
+TMDB_CACHE_DEFAULT_TTL = 3600
+
+# Une réponse expirée depuis moins de TMDB_CACHE_MAX_STALE secondes reste
+# servie pendant qu'un seul rafraîchissement tourne en arrière-plan.
+TMDB_CACHE_MAX_STALE = int(os.environ.get("TMDB_CACHE_MAX_STALE", 3600))
+
+# Appels TMDb simultanés au maximum lors de l'hydratation d'une liste de films.
+TMDB_MAX_CONCURRENCY = int(os.environ.get("TMDB_MAX_CONCURRENCY", 8))
+
+# Threads partagés par les vues pour lancer leurs appels TMDb et API en
+# parallèle (services/parallel.py).
+PARALLEL_WORKERS = int(os.environ.get("PARALLEL_WORKERS", 32))
+
+# Client HTTP partagé (services/http_client.py) : un pool de connexions
+# keep-alive par amont, délais (connexion, lecture), tentatives pour les
+# requêtes idempotentes et disjoncteur.
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 32))
+
+HTTP_UPSTREAMS = {
+    "tmdb": {
+        "pool_size": HTTP_POOL_SIZE,
+        "timeout": (3.05, float(os.environ.get("TMDB_TIMEOUT", 5))),
+        "retries": int(os.environ.get("TMDB_RETRIES", 2)),
+        "backoff": 0.2,
+        "breaker_failures": 5,
+        "breaker_cooldown": 30.0,
+    },
+    "tmdb_img": {
+        "pool_size": HTTP_POOL_SIZE,
+        "timeout": (3.05, float(os.environ.get("TMDB_IMG_TIMEOUT", 10))),
+        "retries": 1,
+        "backoff": 0.2,
+        "breaker_failures": 5,
+        "breaker_cooldown": 30.0,
+    },
+    "api": {
+        "pool_size": HTTP_POOL_SIZE,
+        "timeout": (1, float(os.environ.get("API_TIMEOUT", 5))),
+        "retries": int(os.environ.get("API_RETRIES", 2)),
+        "backoff": 0.05,
+        "breaker_failures": 5,
+        "breaker_cooldown": 5.0,
+    },
+}
+
+# Profilage à la demande (services/profiler.py) : en-tête `X-Profile` ou
+# tirage au sort, fichiers écrits dans PROFILE_DIR (les PROFILE_KEEP derniers).
+PROFILE_ENABLED = os.environ.get("PROFILE_ENABLED", "0") in ("1", "true")
+PROFILE_MODE = os.environ.get("PROFILE_MODE", "sample")  # "sample" ou "cprofile"
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN") or None
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 200))
+
+# Proxy d'images (services/images.py) : largeur (px) de chaque variante,
+# taille TMDb de l'image source redimensionnée localement (Pillow), cache
+# disque borné et durées de cache navigateur.
+IMAGE_SIZES = {"face": 185, "thumb": 342, "detail": 500}
+IMAGE_SOURCE_SIZE = "w500"
+IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", 82))
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", "image_cache")
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_MB", 512)) * 1024 * 1024
+IMAGE_MAX_AGE = 365 * 24 * 3600
+IMAGE_FALLBACK_MAX_AGE = 300
+IMAGE_RETRY_AFTER = 300
+
+# Cache des pages anonymes (services/page_cache.py) : entrées en mémoire,
+# durée de vie maximale d'une page et des fragments partagés (secondes).
+PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", 1024))
+PAGE_CACHE_TTL = int(os.environ.get("PAGE_CACHE_TTL", 300))
+FRAGMENT_CACHE_TTL = int(os.environ.get("FRAGMENT_CACHE_TTL", 3600))
+
+# Préchargement (services/warmer.py) : toutes les WARM_INTERVAL secondes
+# (0 pour désactiver), fiches TMDb et affiches des WARM_MAX_FILMS films les
+# plus référencés, à WARM_RATE appels TMDb par seconde au plus. Lancé
+# seulement par `python app.py` et si WARM_ENABLED, jamais à l'import.
+WARM_ENABLED = os.environ.get("WARM_ENABLED", "1") in ("1", "true")
+WARM_INTERVAL = float(os.environ.get("WARM_INTERVAL", 900))
+WARM_MAX_FILMS = int(os.environ.get("WARM_MAX_FILMS", 1000))
+WARM_RATE = float(os.environ.get("WARM_RATE", 4))
@@ -10,24 +10,15 @@ from flask import (
 
 from werkzeug.security import generate_password_hash, check_password_hash
 
-from services.data import load_data, save_data
+from services.data import query, update_data, find_user_by_username
 from services.auth_utils import login_required
 
 
 auth_bp = Blueprint("auth", __name__)
 
 
-def find_user_by_username(data, username):
-    for u in data["users"]:
-        if u["username"].lower() == username.lower():
-            return u
-    return None
-
-
 @auth_bp.route("/signup", methods=["GET", "POST"])
 def signup():
-    data = load_data()
-
     if request.method == "POST":
         username = request.form.get("username", "").strip()
         password = request.form.get("password", "")
@@ -36,19 +27,29 @@ def signup():
             flash("Tous les champs sont obligatoires.", "danger")
             return redirect(url_for("auth.signup"))
 
-        existing = find_user_by_username(data, username)
-        if existing is not None:
+        # Vérification rapide sans télécharger les utilisateurs ; elle est
+        # refaite dans la transaction.
+        if query("users", username=username)["items"]:
             flash("Ce nom d'utilisateur existe déjà.", "danger")
             return redirect(url_for("auth.signup"))
 
-        new_user = {
-            "id": (max((u["id"] for u in data["users"]), default=0) + 1),
-            "username": username,
-            "password_hash": generate_password_hash(password),
-        }
-
-        data["users"].append(new_user)
-        save_data(data)
+        password_hash = generate_password_hash(password)
+
+        def create_user(data):
+            if find_user_by_username(data, username) is not None:
+                return False
+            data["users"].append(
+                {
+                    "id": data.next_id("users"),
+                    "username": username,
+                    "password_hash": password_hash,
+                }
+            )
+            return True
+
+        if not update_data(create_user):
+            flash("Ce nom d'utilisateur existe déjà.", "danger")
+            return redirect(url_for("auth.signup"))
 
         flash("Compte créé avec succès ! Vous pouvez maintenant vous connecter.", "success")
         return redirect(url_for("auth.login"))
@@ -58,13 +59,12 @@ def signup():
 
 @auth_bp.route("/login", methods=["GET", "POST"])
 def login():
-    data = load_data()
-
     if request.method == "POST":
         username = request.form.get("username", "").strip()
         password = request.form.get("password", "")
 
-        user = find_user_by_username(data, username)
+        found = query("users", username=username)["items"]
+        user = found[0] if found else None
 
         if user is None or not check_password_hash(user["password_hash"], password):
             flash("Nom d'utilisateur ou mot de passe incorrect.", "danger")
@@ -1,5 +1,6 @@
 from flask import (
     Blueprint,
+    get_template_attribute,
     render_template,
     request,
     redirect,
@@ -8,58 +9,43 @@ from flask import (
     session,
     abort,
 )
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from config import REVIEWS_PAGE_SIZE
 
 from services.data import (
-    load_data,
-    save_data,
-    get_next_id,
+    query,
+    update_data,
+    create_rental,
+    fetch_busy_copies,
     find_ownership,
 )
 from services.tmdb import (
     tmdb_get,
     tmdb_movie_to_film,
+    tmdb_movie_details,
+    tmdb_pick_trailer,
     tmdb_search_person,
     tmdb_person_image_url,
-    tmdb_movie_trailer_key,
 )
 
+from services import catalog
+from services.reviews import (
+    average,
+    movie_stats,
+    paginate,
+    record_rating,
+    stats_from,
+)
 from services.auth_utils import login_required
+from services.page_cache import cache_anonymous, fragment
+from services.parallel import gather
 
 
 films_bp = Blueprint("films_bp", __name__)
 
-def _active_rental_until(
-    data,
-    owner_id: int,
-    movie_id: int,
-    fmt: str | None = None,
-    now: datetime | None = None,
-):
-    """Return latest active expires_at for an owner/movie.
-
-    If `fmt` is provided ("bluray" or "digital"), only rentals for that format are considered.
-    """
-    if now is None:
-        now = datetime.utcnow()
-
-    latest = None
-    for r in data.get("rentals", []):
-        if r.get("owner_id") != owner_id or r.get("movie_id") != movie_id:
-            continue
-        if fmt is not None and r.get("format") != fmt:
-            continue
-        try:
-            expires = datetime.fromisoformat(r.get("expires_at"))
-        except Exception:
-            continue
-        if expires <= now:
-            continue
-        if latest is None or expires > latest:
-            latest = expires
-    return latest
-
 @films_bp.route("/actors/<actor_name>", endpoint="actor_films")
+@cache_anonymous()
 def actor_films(actor_name):
     person = None
     try:
@@ -93,90 +79,95 @@ def actor_films(actor_name):
         films=films_for_actor,
     )
 
+def _film_meta(film, credits, trailer_key):
+    """Affiche, en-tête et casting de la fiche (templates/film_meta.html)."""
+    # Le casting fournit déjà `profile_path` : pas de recherche par acteur.
+    actors = [
+        {"name": cast["name"], "image_url": tmdb_person_image_url(cast)}
+        for cast in credits.get("cast", [])[:8]
+        if cast.get("name")
+    ]
+
+    def macro(name):
+        return get_template_attribute("film_meta.html", name)
+
+    return {
+        "poster": macro("poster")(film),
+        "heading": macro("heading")(film, trailer_key),
+        "cast": macro("cast")(actors),
+    }
+
+
 @films_bp.route("/films/<int:film_id>", endpoint="film_detail")
+@cache_anonymous(depends=("reviews", "review_stats", "user_owns"))
 def film_detail(film_id):
-    movie = tmdb_get(f"/movie/{film_id}", {"append_to_response": "credits"})
+    uid = session.get("user_id")
+    reviews_page = max(1, request.args.get("reviews_page", 1, type=int))
+
+    # Fiche TMDb et requêtes ciblées à l'API, toutes en même temps.
+    calls = [
+        lambda: tmdb_movie_details(film_id),
+        lambda: movie_stats(film_id),
+        lambda: paginate(film_id, reviews_page, REVIEWS_PAGE_SIZE),
+        lambda: query("user_owns", movie_id=film_id),
+        lambda: query("catalog", id=film_id),
+    ]
+    if uid:
+        calls += [
+            lambda: query("library", key=str(uid)),
+            lambda: query("favorites", key=str(uid)),
+            lambda: query("reviews", user_id=uid, movie_id=film_id),
+            lambda: query("rentals", user_id=uid, movie_id=film_id, active=True),
+        ]
+    movie, stats, (reviews, reviews_pages), owns, known, *mine = gather(*calls)
+
+    catalog.remember(movie, known=known["items"])
     credits = movie.get("credits", {})
     film = tmdb_movie_to_film(movie, credits=credits)
+    trailer_key = tmdb_pick_trailer(movie.get("videos", {}).get("results", []))
+    meta = fragment(("film_meta", film_id), lambda: _film_meta(film, credits, trailer_key))
 
-    actors = []
-    for cast in credits.get("cast", [])[:8]:
-        name = cast.get("name")
-        if not name:
-            continue
-        try:
-            person = tmdb_search_person(name)
-        except Exception:
-            person = None
-        image_url = tmdb_person_image_url(person)
-        actors.append({"name": name, "image_url": image_url})
+    avg_rating = average(stats)
+    reviews_count = stats["count"]
 
-    data = load_data()
     in_library = False
     is_favorite = False
-    if session.get("user_id"):
-        uid = str(session["user_id"])
-        in_library = film_id in data.get("library", {}).get(uid, [])
-        is_favorite = film_id in data.get("favorites", {}).get(uid, [])
-
-    reviews = [r for r in data["reviews"] if r["movie_id"] == film_id]
-    users_by_id = {u["id"]: u for u in data["users"]}
-    for r in reviews:
-        u = users_by_id.get(r["user_id"])
-        r["username"] = u["username"] if u else "?"
-
-    if reviews:
-        avg_rating = round(sum(r["rating"] for r in reviews) / len(reviews), 1)
-        reviews_count = len(reviews)
-    else:
-        avg_rating = None
-        reviews_count = 0
-
     user_review = None
-    if session.get("user_id"):
-        for r in reviews:
-            if r["user_id"] == session["user_id"]:
-                user_review = r
-                break
-
     is_rented = False
     rental_expires_at = None
-    if session.get("user_id"):
-        for r in data["rentals"]:
-            if r["user_id"] == session["user_id"] and r["movie_id"] == film_id:
-                expires = datetime.fromisoformat(r["expires_at"])
-                if expires > datetime.utcnow():
-                    is_rented = True
-                    rental_expires_at = expires
-                break
-
     ownership_for_user = None
-    owners_count = 0
 
-    if session.get("user_id"):
-        ownership_for_user = find_ownership(data, session["user_id"], film_id)
+    if uid:
+        library, favorites, my_reviews, my_rentals = mine
+        in_library = film_id in library["items"].get(str(uid), [])
+        is_favorite = film_id in favorites["items"].get(str(uid), [])
+        user_review = my_reviews["items"][0] if my_reviews["items"] else None
 
-    owners_for_film = [
-        o for o in data.get("user_owns", [])
-        if o["movie_id"] == film_id
-    ]
-    owners_count = len(owners_for_film)
+        # Locations en cours de ce film par l'utilisateur (filtrées par l'API).
+        rental_expires_at = max(
+            (datetime.fromisoformat(r["expires_at"]) for r in my_rentals["items"]),
+            default=None,
+        )
+        is_rented = rental_expires_at is not None
 
-    trailer_key = None
-    try:
-        trailer_key = tmdb_movie_trailer_key(film.get("titre"), film.get("annee"))
-    except Exception:
-        trailer_key = None
+        ownership_for_user = next(
+            (o for o in owns["items"] if o["user_id"] == uid), None
+        )
+
+    owners_count = owns["total"]
 
     return render_template(
         "film_detail.html",
         film=film,
-        actors=actors,
+        meta=meta,
         in_library=in_library,
         is_favorite=is_favorite,
         reviews=reviews,
         avg_rating=avg_rating,
         reviews_count=reviews_count,
+        rating_hist=stats["hist"],
+        reviews_page=reviews_page,
+        reviews_pages=reviews_pages,
         user_review=user_review,
         is_rented=is_rented,
         rental_expires_at=rental_expires_at,
@@ -188,7 +179,6 @@ def film_detail(film_id):
 @films_bp.post("/films/<int:film_id>/own", endpoint="own_film")
 @login_required
 def own_film(film_id):
-    data = load_data()
     user_id = session["user_id"]
 
     has_bluray = bool(request.form.get("has_bluray"))
@@ -222,31 +212,33 @@ def own_film(film_id):
     bluray_max_days = parse_int("bluray_max_days") if has_bluray else None
     digital_max_days = parse_int("digital_max_days") if has_digital else None
 
-    existing = find_ownership(data, user_id, film_id)
-
-    if existing:
-        existing["has_bluray"] = has_bluray
-        existing["has_digital"] = has_digital
-        existing["bluray_price"] = bluray_price
-        existing["digital_price"] = digital_price
-        existing["bluray_max_days"] = bluray_max_days
-        existing["digital_max_days"] = digital_max_days
-    else:
-        data.setdefault("user_owns", []).append(
-            {
-                "user_id": user_id,
-                "movie_id": film_id,
-                "has_bluray": has_bluray,
-                "has_digital": has_digital,
-                "bluray_price": bluray_price,
-                "digital_price": digital_price,
-                "bluray_max_days": bluray_max_days,
-                "digital_max_days": digital_max_days,
-                "is_public": False,
-            }
-        )
+    def upsert_ownership(data):
+        existing = find_ownership(data, user_id, film_id)
+
+        if existing:
+            existing["has_bluray"] = has_bluray
+            existing["has_digital"] = has_digital
+            existing["bluray_price"] = bluray_price
+            existing["digital_price"] = digital_price
+            existing["bluray_max_days"] = bluray_max_days
+            existing["digital_max_days"] = digital_max_days
+        else:
+            data.setdefault("user_owns", []).append(
+                {
+                    "user_id": user_id,
+                    "movie_id": film_id,
+                    "has_bluray": has_bluray,
+                    "has_digital": has_digital,
+                    "bluray_price": bluray_price,
+                    "digital_price": digital_price,
+                    "bluray_max_days": bluray_max_days,
+                    "digital_max_days": digital_max_days,
+                    "is_public": False,
+                }
+            )
 
-    save_data(data)
+    update_data(upsert_ownership)
+    catalog.remember_id(film_id)
     flash("Le film a été ajouté à votre vidéothèque.", "success")
     return redirect(url_for("films_bp.film_detail", film_id=film_id))
 
@@ -254,7 +246,6 @@ def own_film(film_id):
 @films_bp.post("/films/<int:film_id>/review")
 @login_required
 def add_or_update_review(film_id):
-    data = load_data()
     user_id = session["user_id"]
 
     try:
@@ -265,32 +256,38 @@ def add_or_update_review(film_id):
 
     comment = request.form.get("comment", "").strip()
 
-    existing = None
-    for r in data["reviews"]:
-        if r["user_id"] == user_id and r["movie_id"] == film_id:
-            existing = r
-            break
-
     now = datetime.utcnow().isoformat(timespec="seconds")
 
-    if existing:
-        existing["rating"] = rating
-        existing["comment"] = comment
-        existing["created_at"] = now
-    else:
-        review_id = get_next_id(data["reviews"])
-        data["reviews"].append(
-            {
-                "id": review_id,
-                "user_id": user_id,
-                "movie_id": film_id,
-                "rating": rating,
-                "comment": comment,
-                "created_at": now,
-            }
-        )
+    def upsert_review(data):
+        existing = data.find_one("reviews", "user_movie", (user_id, film_id))
+        old_rating = existing["rating"] if existing else None
+
+        if existing:
+            existing["rating"] = rating
+            existing["comment"] = comment
+            existing["created_at"] = now
+        else:
+            review_id = data.next_id("reviews")
+            data["reviews"].append(
+                {
+                    "id": review_id,
+                    "user_id": user_id,
+                    "movie_id": film_id,
+                    "rating": rating,
+                    "comment": comment,
+                    "created_at": now,
+                }
+            )
+
+        all_stats = data.setdefault("review_stats", {})
+        key = str(film_id)
+        if key in all_stats:
+            record_rating(all_stats[key], old_rating, rating)
+        else:
+            all_stats[key] = stats_from(data.find("reviews", "movie", film_id))
 
-    save_data(data)
+    update_data(upsert_review)
+    catalog.remember_id(film_id)
     flash("Votre avis a été enregistré.", "success")
 
     return redirect(url_for("films_bp.film_detail", film_id=film_id))
@@ -298,38 +295,25 @@ def add_or_update_review(film_id):
 
 @films_bp.route("/films/<int:film_id>/availability", endpoint="film_availability")
 def film_availability(film_id):
+    movie, owns, busy = gather(
+        lambda: tmdb_get(f"/movie/{film_id}"),
+        lambda: query("user_owns", movie_id=film_id, is_public=True),
+        lambda: fetch_busy_copies(film_id),
+        return_exceptions=True,
+    )
+    for result in (owns, busy):
+        if isinstance(result, Exception):
+            raise result
     try:
-        movie = tmdb_get(f"/movie/{film_id}")
+        if isinstance(movie, Exception):
+            raise movie
         film = tmdb_movie_to_film(movie)
     except Exception:
         abort(404)
 
-    data = load_data()
-    users_by_id = {u["id"]: u for u in data.get("users", [])}
-    now = datetime.utcnow()
-
-    active_rentals = {}
-    for r in data.get("rentals", []):
-        try:
-            expires = datetime.fromisoformat(r["expires_at"])
-        except Exception:
-            continue
-
-        if expires <= now:
-            continue
-
-        fmt = r.get("format")
-        if fmt not in ("bluray", "digital"):
-            continue
-
-        key = (r.get("owner_id"), r.get("movie_id"), fmt)
-        if key not in active_rentals or expires > active_rentals[key]:
-            active_rentals[key] = expires
-
-    ownerships_raw = [
-        o for o in data.get("user_owns", [])
-        if o.get("movie_id") == film_id and o.get("is_public", False)
-    ]
+    ownerships_raw = owns["items"]
+    owners = query("users", id=sorted({o["user_id"] for o in ownerships_raw}))
+    users_by_id = {u["id"]: u for u in owners["items"]}
 
     entries = []
     for own in ownerships_raw:
@@ -351,8 +335,8 @@ def film_availability(film_id):
 
         seller_rating = own.get("seller_rating")  
 
-        bluray_unavailable_until = active_rentals.get((own["user_id"], film_id, "bluray"))
-        digital_unavailable_until = active_rentals.get((own["user_id"], film_id, "digital"))
+        bluray_unavailable_until = busy.get((own["user_id"], "bluray"))
+        digital_unavailable_until = busy.get((own["user_id"], "digital"))
 
         bluray_available = has_bluray and bluray_unavailable_until is None
         digital_available = has_digital and digital_unavailable_until is None
@@ -449,107 +433,42 @@ def film_availability(film_id):
 @films_bp.post("/films/<int:film_id>/rent-from-owner/<int:owner_id>", endpoint="rent_from_owner")
 @login_required
 def rent_from_owner(film_id, owner_id):
-    data = load_data()
     user_id = session["user_id"]
-    now = datetime.utcnow()
-
-
-
-    own = None
-    for o in data.get("user_owns", []):
-        if (
-            o.get("user_id") == owner_id
-            and o.get("movie_id") == film_id
-            and o.get("is_public", False)
-        ):
-            own = o
-            break
-
-    if not own:
-        flash("Cet exemplaire n’est plus disponible.", "warning")
-        return redirect(url_for("films_bp.film_availability", film_id=film_id))
 
     fmt = request.form.get("format")
     if fmt not in ("bluray", "digital"):
         flash("Veuillez choisir un format à louer.", "warning")
         return redirect(url_for("films_bp.film_availability", film_id=film_id))
 
-    for r in data.get("rentals", []):
-        if r.get("user_id") != user_id or r.get("movie_id") != film_id:
-            continue
-        if r.get("format") != fmt:
-            continue
-        try:
-            last_expires = datetime.fromisoformat(r.get("expires_at"))
-        except Exception:
-            continue
-        if last_expires > now:
-            label = "Blu-ray" if fmt == "bluray" else "Streaming"
-            flash(
-                f"Vous avez déjà une location active ({label}) pour ce film "
-                f"(jusqu’au {last_expires.strftime('%d/%m/%Y %H:%M')}).",
-                "warning",
-            )
-            return redirect(url_for("films_bp.film_availability", film_id=film_id))
-
-    if fmt == "bluray" and not own.get("has_bluray"):
-        flash("Ce propriétaire ne propose plus le Blu-ray.", "warning")
-        return redirect(url_for("films_bp.film_availability", film_id=film_id))
+    label = "Blu-ray" if fmt == "bluray" else "Streaming"
 
-    if fmt == "digital" and not own.get("has_digital"):
-        flash("Ce propriétaire ne propose plus le streaming.", "warning")
+    status, result = create_rental(
+        user_id, owner_id, film_id, fmt, request.form.get("duration_days")
+    )
+    if status == 201:
+        flash("Location créée avec succès ✅", "success")
+        catalog.remember_id(film_id)
         return redirect(url_for("films_bp.film_availability", film_id=film_id))
 
-    busy_until = _active_rental_until(data, owner_id, film_id, fmt=fmt, now=now)
-    if busy_until:
-        label = "Blu-ray" if fmt == "bluray" else "Streaming"
-        flash(
+    busy_until = result.get("busy_until")
+    busy_until = busy_until and datetime.fromisoformat(busy_until)
+    messages = {
+        "not_available": "Cet exemplaire n’est plus disponible.",
+        "already_renting": (
+            f"Vous avez déjà une location active ({label}) pour ce film "
+            f"(jusqu’au {busy_until.strftime('%d/%m/%Y %H:%M')})."
+            if busy_until else ""
+        ),
+        "format_unavailable": (
+            "Ce propriétaire ne propose plus le Blu-ray."
+            if fmt == "bluray"
+            else "Ce propriétaire ne propose plus le streaming."
+        ),
+        "copy_busy": (
             f"Cet exemplaire ({label}) est déjà loué. "
-            f"Disponible à partir du {busy_until.strftime('%d/%m/%Y') }.",
-            "warning",
-        )
-        return redirect(url_for("films_bp.film_availability", film_id=film_id))
-
-    if fmt == "bluray":
-        price = own.get("bluray_price")
-        max_days = own.get("bluray_max_days")
-    else:
-        price = own.get("digital_price")
-        max_days = own.get("digital_max_days")
-
-    if price is None:
-        price = own.get("bluray_price") or own.get("digital_price") or 3.99
-
-    price_cents = int(round(price * 100))
-
-    try:
-        duration_days = int(request.form.get("duration_days") or (max_days or 3))
-    except ValueError:
-        duration_days = max_days or 3
-
-    if duration_days < 1:
-        duration_days = 1
-
-    if max_days and duration_days > max_days:
-        duration_days = max_days
-
-    expires = now + timedelta(days=duration_days)
-    rentals_list = data.setdefault("rentals", [])
-    rental_id = get_next_id(rentals_list)
-
-    rentals_list.append(
-        {
-            "id": rental_id,
-            "user_id": user_id,
-            "movie_id": film_id,
-            "owner_id": owner_id,
-            "format": fmt,
-            "rented_at": now.isoformat(timespec="seconds"),
-            "expires_at": expires.isoformat(timespec="seconds"),
-            "price_cents": price_cents,
-        }
-    )
-    save_data(data)
-
-    flash("Location créée avec succès ✅", "success")
+            f"Disponible à partir du {busy_until.strftime('%d/%m/%Y')}."
+            if busy_until else ""
+        ),
+    }
+    flash(messages.get(result.get("error")) or "Location impossible.", "warning")
     return redirect(url_for("films_bp.film_availability", film_id=film_id))
@@ -0,0 +1,36 @@
+import hashlib
+
+from flask import Blueprint, Response, abort, current_app, request
+
+from config import IMAGE_FALLBACK_MAX_AGE, IMAGE_MAX_AGE, IMAGE_SIZES
+from services.images import FILENAME, KINDS, URL_PREFIX, WEBP, variant
+
+images_bp = Blueprint("images_bp", __name__, url_prefix=URL_PREFIX)
+
+
+@images_bp.get("/<kind>/<size>/<filename>", endpoint="image")
+def image(kind, size, filename):
+    if kind not in KINDS or size not in IMAGE_SIZES or not FILENAME.match(filename):
+        abort(404)
+
+    webp = "image/webp" in request.headers.get("Accept", "")
+    found = variant(size, f"/{filename}", webp=webp)
+
+    if found is None:
+        # Image par défaut, gardée peu de temps : l'amont peut revenir.
+        response = current_app.send_static_file(KINDS[kind])
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMAGE_FALLBACK_MAX_AGE
+        return response
+
+    data, mimetype = found
+    response = Response(data, mimetype=mimetype)
+    # Un chemin TMDb ne change jamais de contenu : ETag fort, cache d'un an.
+    response.set_etag(hashlib.blake2b(data, digest_size=16).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = IMAGE_MAX_AGE
+    response.cache_control.immutable = True
+    if WEBP:
+        response.vary.add("Accept")
+    return response.make_conditional(request)
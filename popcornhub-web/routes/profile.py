@@ -10,31 +10,57 @@ from flask import (
 from datetime import datetime
 
 from services.data import (
-    load_data,
-    save_data,
-    get_user_by_id,
+    query,
+    update_data,
+    fetch_archived_rentals,
     find_ownership,
 )
-from services.tmdb import tmdb_get, tmdb_movie_to_film
+from services.columnar import RentalColumns
+from services.parallel import gather
+from services.tmdb import get_movies
 
 from services.auth_utils import login_required
 
 profile_bp = Blueprint("profile_bp", __name__)
 
 
+def _live_rentals(user_id, now):
+    """Locations de l'utilisateur encore dans le document, filtrées côté API
+    puis mises en colonnes : `(lignes, masque en cours, centimes)`."""
+    rows = query("rentals", user_id=user_id)["items"]
+    columns = RentalColumns.from_rows(rows)
+    return rows, columns.active_at(now), columns.revenue_cents()
+
+
+def _spent_cents(live_cents, archived):
+    # Total de toutes les locations : document et archive.
+    return live_cents + sum(r.get("price_cents") or 0 for r in archived)
+
+
 def _build_profile_context():
-    data = load_data()
     user_id = session["user_id"]
+    now = datetime.utcnow()
+    # Document et archive des locations demandés en même temps.
+    users, owns, library, live, archived = gather(
+        lambda: query("users", id=user_id),
+        lambda: query("user_owns", user_id=user_id),
+        lambda: query("library", key=str(user_id)),
+        lambda: _live_rentals(user_id, now),
+        lambda: fetch_archived_rentals(user_id=user_id),
+        return_exceptions=True,
+    )
+    for result in (users, owns, library, live):
+        if isinstance(result, Exception):
+            raise result
+    if isinstance(archived, Exception):
+        archived = []
 
-    user = get_user_by_id(data, user_id)
+    user = users["items"][0] if users["items"] else None
 
-    ownerships = [
-        own for own in data.get("user_owns", [])
-        if own.get("user_id") == user_id
-    ]
+    ownerships = owns["items"]
 
     uid_str = str(user_id)
-    legacy_ids = data.get("library", {}).get(uid_str, [])
+    legacy_ids = library["items"].get(uid_str, [])
     already_owned_ids = {own["movie_id"] for own in ownerships}
 
     for fid in legacy_ids:
@@ -54,50 +80,33 @@ def _build_profile_context():
             }
         )
 
-    library_movies = []
-    for own in ownerships:
-        film_id = own["movie_id"]
-        try:
-            movie = tmdb_get(f"/movie/{film_id}")
-            film = tmdb_movie_to_film(movie)
-        except Exception:
-            film = {
-                "id": film_id,
-                "titre": f"Film #{film_id}",
-                "annee": None,
-                "realisateur": "",
-                "resume": "",
-                "affiche_url": None,
-                "genres": [],
-            }
-
-        library_movies.append(
-            {
-                "movie": film,
-                "ownership": own,
-            }
-        )
+    # Historique : archive de l'API (locations terminées) + document.
+    live_rows, live_active, live_cents = live
+    live_ids = {r.get("id") for r in live_rows}
+    archived = [r for r in archived if r.get("id") not in live_ids]
+    user_rentals = archived + live_rows
+    statuses = [False] * len(archived) + live_active.tolist()
+
+    # Vidéothèque et locations hydratées en un seul lot.
+    films = get_movies(
+        [own["movie_id"] for own in ownerships]
+        + [r["movie_id"] for r in user_rentals]
+    )
+    library_films = films[:len(ownerships)]
+    rental_films = films[len(ownerships):]
+
+    library_movies = [
+        {
+            "movie": film,
+            "ownership": own,
+        }
+        for own, film in zip(ownerships, library_films)
+    ]
 
-    now = datetime.utcnow()
     rentals = []
 
-    for r in data.get("rentals", []):
-        if r.get("user_id") != user_id:
-            continue
-
+    for r, film, is_active in zip(user_rentals, rental_films, statuses):
         film_id = r["movie_id"]
-        try:
-            movie = tmdb_get(f"/movie/{film_id}")
-            film = tmdb_movie_to_film(movie)
-        except Exception:
-            film = {
-                "id": film_id,
-                "titre": f"Film #{film_id}",
-                "annee": None,
-                "realisateur": "",
-            }
-
-        expires = datetime.fromisoformat(r["expires_at"])
         rentals.append(
             {
                 "rental_id": r.get("id"),
@@ -109,7 +118,7 @@ def _build_profile_context():
                 "price_eur": r.get("price_cents", 0) / 100.0,
                 "rented_at": r.get("rented_at"),
                 "expires_at": r.get("expires_at"),
-                "is_active": expires > now,
+                "is_active": bool(is_active),
             }
         )
 
@@ -117,6 +126,7 @@ def _build_profile_context():
         "user": user,
         "library_movies": library_movies,
         "rentals": rentals,
+        "rentals_spent_eur": _spent_cents(live_cents, archived) / 100.0,
     }
 
 
@@ -131,32 +141,25 @@ def profile():
 @profile_bp.route("/profile/locations")
 @login_required
 def profile_locations():
-    data = load_data()
     user_id = session["user_id"]
-    now = datetime.utcnow()
 
-    user_rentals = []
-    for r in data.get("rentals", []):
-        if r.get("user_id") != user_id:
-            continue
-        try:
-            expires = datetime.fromisoformat(r["expires_at"])
-        except Exception:
-            continue
-
-        if expires <= now:
-            continue  
-
-        user_rentals.append(r)
+    live, archived = gather(
+        lambda: _live_rentals(user_id, datetime.utcnow()),
+        lambda: fetch_archived_rentals(user_id=user_id),
+        return_exceptions=True,
+    )
+    if isinstance(live, Exception):
+        raise live
+    if isinstance(archived, Exception):
+        archived = []
+    live_rows, live_active, live_cents = live
+    live_ids = {r.get("id") for r in live_rows}
+    archived = [r for r in archived if r.get("id") not in live_ids]
+    user_rentals = [r for r, is_active in zip(live_rows, live_active) if is_active]
 
     rentals = []
-    for r in user_rentals:
-        try:
-            movie = tmdb_get(f"/movie/{r['movie_id']}")
-            film = tmdb_movie_to_film(movie)
-        except Exception:
-            continue
-
+    films = get_movies([r["movie_id"] for r in user_rentals])
+    for r, film in zip(user_rentals, films):
         rentals.append(
             {
                 "rental_id": r["id"],
@@ -178,22 +181,23 @@ def profile_locations():
         "profile.html",
         active_tab="locations",
         rentals=rentals,
+        rentals_spent_eur=_spent_cents(live_cents, archived) / 100.0,
         library_movies=[], 
     )
 
 @profile_bp.post("/profile/locations/return/<int:rental_id>", endpoint="return_rental")
 @login_required
 def return_rental(rental_id):
-    data = load_data()
     user_id = session["user_id"]
     now = datetime.utcnow().isoformat(timespec="seconds")
 
-    for r in data.get("rentals", []):
-        if r.get("user_id") == user_id and r.get("id") == rental_id:
-            r["expires_at"] = now  
-            break
+    def end_rental(data):
+        for r in data.find("rentals", "renter", user_id):
+            if r.get("id") == rental_id:
+                r["expires_at"] = now
+                break
 
-    save_data(data)
+    update_data(end_rental)
     flash("Merci ! Le film a été rendu 👍", "success")
     return redirect(url_for("profile_bp.profile_locations"))
 
@@ -202,21 +206,23 @@ def return_rental(rental_id):
 @login_required
 def toggle_library_public(film_id):
     """Rend un film de la vidéothèque public ou privé."""
-    data = load_data()
     user_id = session["user_id"]
 
-    own = find_ownership(data, user_id, film_id)
-    if not own:
+    def toggle(data):
+        own = find_ownership(data, user_id, film_id)
+        if not own:
+            return None
+        own["is_public"] = not bool(own.get("is_public", False))
+        return own["is_public"]
+
+    is_public = update_data(toggle)
+    if is_public is None:
         flash("Ce film n'est pas dans votre vidéothèque.", "warning")
         return redirect(url_for("profile"))
 
-    current = bool(own.get("is_public", False))
-    own["is_public"] = not current
-    save_data(data)
-
     flash(
         "Le film est maintenant {}."
-        .format("public" if own["is_public"] else "privé"),
+        .format("public" if is_public else "privé"),
         "success",
     )
     return redirect(url_for("profile_bp.profile"))
@@ -226,14 +232,8 @@ def toggle_library_public(film_id):
 @login_required
 def update_library_item(film_id):
     """Met à jour formats + prix pour un film dans la vidéothèque."""
-    data = load_data()
     user_id = session["user_id"]
 
-    own = find_ownership(data, user_id, film_id)
-    if not own:
-        flash("Ce film n'est pas dans votre vidéothèque.", "warning")
-        return redirect(url_for("profile_bp.profile"))
-
     has_bluray = bool(request.form.get("has_bluray"))
     has_digital = bool(request.form.get("has_digital"))
 
@@ -259,14 +259,26 @@ def update_library_item(film_id):
         except ValueError:
             return None
 
-    own["has_bluray"] = has_bluray
-    own["has_digital"] = has_digital
-    own["bluray_price"] = parse_float("bluray_price") if has_bluray else None
-    own["digital_price"] = parse_float("digital_price") if has_digital else None
-    own["bluray_max_days"] = parse_int("bluray_max_days") if has_bluray else None
-    own["digital_max_days"] = parse_int("digital_max_days") if has_digital else None
+    changes = {
+        "has_bluray": has_bluray,
+        "has_digital": has_digital,
+        "bluray_price": parse_float("bluray_price") if has_bluray else None,
+        "digital_price": parse_float("digital_price") if has_digital else None,
+        "bluray_max_days": parse_int("bluray_max_days") if has_bluray else None,
+        "digital_max_days": parse_int("digital_max_days") if has_digital else None,
+    }
+
+    def update(data):
+        own = find_ownership(data, user_id, film_id)
+        if not own:
+            return False
+        own.update(changes)
+        return True
+
+    if not update_data(update):
+        flash("Ce film n'est pas dans votre vidéothèque.", "warning")
+        return redirect(url_for("profile_bp.profile"))
 
-    save_data(data)
     flash("Votre vidéothèque a été mise à jour.", "success")
     return redirect(url_for("profile_bp.profile"))
 
@@ -275,26 +287,22 @@ def update_library_item(film_id):
 @login_required
 def delete_library_item(film_id):
     """Supprime un film de la vidéothèque de l'utilisateur."""
-    data = load_data()
     user_id = session["user_id"]
 
-    # 1) Supprimer dans user_owns
-    owns_before = len(data.get("user_owns", []))
-    data["user_owns"] = [
-        own
-        for own in data.get("user_owns", [])
-        if not (own.get("user_id") == user_id and own.get("movie_id") == film_id)
-    ]
-    owns_after = len(data.get("user_owns", []))
+    def delete(data):
+        # 1) Supprimer dans user_owns
+        own = find_ownership(data, user_id, film_id)
+        if own is not None:
+            data["user_owns"].remove(own)
 
-    uid_str = str(user_id)
-    lib = data.get("library", {}).get(uid_str)
-    if isinstance(lib, list) and film_id in lib:
-        lib.remove(film_id)
+        uid_str = str(user_id)
+        lib = data.get("library", {}).get(uid_str)
+        if isinstance(lib, list) and film_id in lib:
+            lib.remove(film_id)
 
-    save_data(data)
+        return own is not None or (isinstance(lib, list) and film_id not in lib)
 
-    if owns_after < owns_before or (isinstance(lib, list) and film_id not in lib):
+    if update_data(delete):
         flash("Film supprimé de votre vidéothèque.", "success")
     else:
         flash("Ce film n'était pas dans votre vidéothèque.", "warning")
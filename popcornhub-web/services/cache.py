@@ -0,0 +1,211 @@
+"""Caches mémoire (LRU + TTL) et disque (SQLite) pour les réponses externes."""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class TTLCache:
+    """Cache LRU borné dont chaque entrée expire après son propre TTL.
+
+    Une entrée expirée reste encore `max_stale` secondes : `get` l'ignore,
+    mais `get_stale` peut la servir le temps qu'elle soit rafraîchie.
+    """
+
+    def __init__(self, maxsize=1024, max_stale=0):
+        self.maxsize = maxsize
+        self.max_stale = max_stale
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _lookup(self, key, now):
+        # Appelé sous le verrou ; retire l'entrée trop ancienne pour être servie.
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at + self.max_stale <= now:
+            del self._data[key]
+            self.expirations += 1
+            return None
+        return expires_at, value
+
+    def get(self, key, default=None, count_miss=True):
+        """Valeur de `key`, ou `default` si absente ou expirée.
+
+        `count_miss=False` sert aux simples sondages suivis d'un vrai `get` :
+        le défaut n'est alors compté qu'une fois.
+        """
+        now = time.monotonic()
+        with self._lock:
+            found = self._lookup(key, now)
+            if found is None or found[0] <= now:
+                self.misses += count_miss
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return found[1]
+
+    def get_stale(self, key):
+        """`(valeur, fraîche)` si `key` est en cache, même expirée depuis
+        moins de `max_stale` secondes ; None sinon."""
+        now = time.monotonic()
+        with self._lock:
+            found = self._lookup(key, now)
+            if found is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            fresh = found[0] > now
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return found[1], fresh
+
+    def expires_in(self, key):
+        """Secondes avant l'expiration de `key` (négatif si elle est périmée
+        mais encore servable), None si absente. Ne compte ni succès ni échec."""
+        now = time.monotonic()
+        with self._lock:
+            found = self._lookup(key, now)
+            return None if found is None else found[0] - now
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SingleFlight:
+    """Un seul appel en cours par clé : les appelants suivants attendent
+    son résultat (ou son exception) au lieu de relancer le même travail."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def _join(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared += 1
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def do(self, key, fn):
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._done(key, future)
+
+    def stats(self):
+        return {"in_flight": len(self._calls), "shared": self.shared}
+
+
+class SQLiteCache:
+    """Cache persistant partagé entre processus (valeurs JSON, TTL en secondes).
+
+    Chaque thread ouvre sa propre connexion ; la base est en mode WAL pour
+    que plusieurs workers puissent lire pendant qu'un autre écrit.
+    """
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Renvoie `(valeur, ttl restant)` ou None."""
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        if row is None or row[1] <= now:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0]), row[1] - now
+
+    def set(self, key, value, ttl):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time() + ttl),
+            )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.purge()
+
+    def purge(self):
+        with self._conn() as conn:
+            cur = conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        self.evictions += cur.rowcount
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
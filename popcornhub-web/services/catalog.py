@@ -0,0 +1,211 @@
+"""Catalogue local des films et recherche plein texte.
+
+La collection `catalog` du document conserve une fiche compacte (au format
+des résultats de recherche TMDb) pour chaque film consulté ou utilisé
+(vidéothèque, favoris, locations, avis). Un index inversé sur les titres
+français et originaux, insensible aux accents et à la casse, permet de
+répondre aux recherches sans appeler TMDb.
+
+Les ajouts sont regroupés et écrits en tâche de fond pour ne pas ralentir
+les pages.
+"""
+
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from services.data import update_data
+from services.indexes import build_index
+from services.tmdb import tmdb_get
+
+log = logging.getLogger(__name__)
+
+# Délai de regroupement des ajouts au catalogue (secondes).
+FLUSH_DELAY = 1.0
+
+_TOKEN_RE = re.compile(r"\w+")
+_LIGATURES = str.maketrans({"œ": "oe", "æ": "ae", "ß": "ss"})
+
+# (version, tokens triés, {token: [positions]})
+_search_index = None
+_index_lock = threading.Lock()
+
+_queue = {}
+_queue_lock = threading.Lock()
+_wakeup = threading.Event()
+_worker = None
+
+
+def fold(text):
+    """Minuscules sans accents ni ligatures : "Amélie Œuvre" -> "amelie oeuvre"."""
+    text = unicodedata.normalize("NFKD", (text or "").casefold().translate(_LIGATURES))
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(fold(text))
+
+
+def catalog_entry(movie):
+    """Fiche compacte (champs d'un résultat de recherche TMDb)."""
+    genre_ids = movie.get("genre_ids")
+    if genre_ids is None:
+        genre_ids = [g["id"] for g in movie.get("genres", []) if "id" in g]
+    return {
+        "id": movie["id"],
+        "title": movie.get("title") or movie.get("name") or "",
+        "original_title": movie.get("original_title") or "",
+        "release_date": movie.get("release_date") or "",
+        "overview": movie.get("overview") or "",
+        "poster_path": movie.get("poster_path"),
+        "genre_ids": genre_ids,
+        "popularity": movie.get("popularity") or 0,
+    }
+
+
+def _build_search_index(rows):
+    postings = {}
+    for pos, row in enumerate(rows):
+        words = set(tokenize(row.get("title"))) | set(tokenize(row.get("original_title")))
+        for word in words:
+            postings.setdefault(word, []).append(pos)
+    return sorted(postings), postings
+
+
+def _get_search_index(data):
+    global _search_index
+    rows = data.get("catalog", [])
+    version = data.versions.get("catalog", 0)
+    with _index_lock:
+        current = _search_index
+    if current and current[0] == version:
+        return rows, current[1], current[2]
+    tokens, postings = _build_search_index(rows)
+    with _index_lock:
+        if _search_index is None or _search_index[0] <= version:
+            _search_index = (version, tokens, postings)
+    return rows, tokens, postings
+
+
+def _prefix_matches(tokens, postings, prefix):
+    """Positions des fiches dont un mot commence par `prefix`, et celles
+    dont un mot vaut exactement `prefix`."""
+    matches = set()
+    exact = set(postings.get(prefix, ()))
+    i = bisect_left(tokens, prefix)
+    while i < len(tokens) and tokens[i].startswith(prefix):
+        matches.update(postings[tokens[i]])
+        i += 1
+    return matches, exact
+
+
+def search(data, query, page=1, page_size=20):
+    """Recherche dans le catalogue local.
+
+    Chaque mot de la requête doit préfixer un mot du titre (français ou
+    original). Renvoie une page au format de `/search/movie` de TMDb
+    (`results`, `total_results`, `total_pages`) ; `results` est vide si
+    rien ne correspond.
+    """
+    words = tokenize(query)
+    if not words:
+        return {"results": [], "total_results": 0, "total_pages": 0}
+
+    rows, tokens, postings = _get_search_index(data)
+
+    found = None
+    score = {}
+    for word in words:
+        matches, exact = _prefix_matches(tokens, postings, word)
+        found = matches if found is None else found & matches
+        if not found:
+            return {"results": [], "total_results": 0, "total_pages": 0}
+        for pos in exact:
+            score[pos] = score.get(pos, 0) + 1
+
+    ranked = sorted(
+        found,
+        key=lambda pos: (-score.get(pos, 0), -(rows[pos].get("popularity") or 0)),
+    )
+    start = (page - 1) * page_size
+    return {
+        "results": [rows[pos] for pos in ranked[start:start + page_size]],
+        "total_results": len(ranked),
+        "total_pages": math.ceil(len(ranked) / page_size),
+    }
+
+
+def remember(movie, known=None):
+    """Ajoute (ou met à jour) un film TMDb dans le catalogue, en différé.
+
+    `known` : fiches du catalogue déjà lues pour ce film ; si la même fiche
+    s'y trouve, rien n'est écrit.
+    """
+    entry = catalog_entry(movie)
+    if known is not None and entry in known:
+        return
+    _enqueue(entry["id"], entry)
+
+
+def remember_id(film_id):
+    """Comme `remember`, la fiche étant récupérée sur TMDb en tâche de fond."""
+    _enqueue(film_id, None)
+
+
+def _enqueue(film_id, entry):
+    global _worker
+    with _queue_lock:
+        if entry is not None or film_id not in _queue:
+            _queue[film_id] = entry
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name="catalog-writer", daemon=True)
+            _worker.start()
+    _wakeup.set()
+
+
+def _run():
+    while True:
+        _wakeup.wait()
+        # Laisse le temps aux ajouts voisins de s'accumuler.
+        _wakeup.clear()
+        time.sleep(FLUSH_DELAY)
+        try:
+            flush()
+        except Exception:
+            log.exception("écriture du catalogue impossible")
+
+
+def flush():
+    """Écrit d'un seul patch toutes les fiches en attente."""
+    global _queue
+    with _queue_lock:
+        batch, _queue = _queue, {}
+    if not batch:
+        return
+
+    entries = []
+    for film_id, entry in batch.items():
+        if entry is None:
+            try:
+                entry = catalog_entry(tmdb_get(f"/movie/{film_id}"))
+            except Exception:
+                continue
+        entries.append(entry)
+
+    def add(data):
+        catalog = data.setdefault("catalog", [])
+        # Copie privée : un seul index pour tout le lot.
+        positions = build_index("catalog", "id", catalog)
+        for entry in entries:
+            found = positions.get(entry["id"])
+            if not found:
+                positions[entry["id"]] = [len(catalog)]
+                catalog.append(entry)
+            elif catalog[found[0]] != entry:
+                catalog[found[0]].update(entry)
+
+    update_data(add)
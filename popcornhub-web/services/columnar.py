@@ -0,0 +1,149 @@
+"""Locations en colonnes NumPy.
+
+Une liste de dictionnaires aux dates ISO coûte environ 1 Ko par location et
+oblige à reconvertir les dates à chaque parcours. `RentalColumns` range les
+mêmes locations en tableaux typés (≈ 40 octets par ligne) :
+
+- `id`, `user_id`, `owner_id`, `movie_id` : entiers ;
+- `rented_at`, `expires_at` : secondes depuis l'epoch (UTC naïf, comme le
+  reste du document) ;
+- `fmt` : code de format (indice dans `FORMATS`, -1 si inconnu) ;
+- `price_cents` : prix payé.
+
+Les filtres (« en cours à t », « locations de tel utilisateur ») renvoient
+des masques booléens combinables avec `&` et `|`. La ligne `i` des colonnes
+est la location `i` de la liste d'origine.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+FORMATS = ("bluray", "digital")
+
+# Date absente ou illisible : avant toute autre.
+NO_DATE = np.iinfo(np.int64).min
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch(moment):
+    return int((moment - _EPOCH).total_seconds())
+
+
+def from_epoch(seconds):
+    return datetime.utcfromtimestamp(int(seconds))
+
+
+def _epochs(values):
+    """Dates ISO -> secondes, converties en un seul appel NumPy ; ligne à
+    ligne seulement si l'une d'elles est illisible."""
+    raw = [v if isinstance(v, str) else "NaT" for v in values]
+    try:
+        parsed = np.array(raw, dtype="datetime64[s]")
+    except ValueError:
+        parsed = np.empty(len(raw), dtype="datetime64[s]")
+        for pos, value in enumerate(raw):
+            try:
+                parsed[pos] = np.datetime64(datetime.fromisoformat(value), "s")
+            except ValueError:
+                parsed[pos] = np.datetime64("NaT")
+    # NaT devient le plus petit int64 : une date absente n'est jamais future.
+    return parsed.astype(np.int64)
+
+
+class RentalColumns:
+    def __init__(self, id, user_id, owner_id, movie_id, rented_at, expires_at, fmt, price_cents):
+        self.id = id
+        self.user_id = user_id
+        self.owner_id = owner_id
+        self.movie_id = movie_id
+        self.rented_at = rented_at
+        self.expires_at = expires_at
+        self.fmt = fmt
+        self.price_cents = price_cents
+
+    @classmethod
+    def from_rows(cls, rows):
+        # Une ligne illisible reste à sa place : jamais en cours, format inconnu.
+        rows = [r if isinstance(r, dict) else {} for r in rows]
+        count = len(rows)
+
+        def ints(field, dtype):
+            return np.fromiter((r.get(field) or 0 for r in rows), dtype=dtype, count=count)
+
+        codes = {name: code for code, name in enumerate(FORMATS)}
+        return cls(
+            id=ints("id", np.int64),
+            user_id=ints("user_id", np.int32),
+            owner_id=ints("owner_id", np.int32),
+            movie_id=ints("movie_id", np.int32),
+            rented_at=_epochs([r.get("rented_at") for r in rows]),
+            expires_at=_epochs([r.get("expires_at") for r in rows]),
+            fmt=np.fromiter((codes.get(r.get("format"), -1) for r in rows), dtype=np.int8, count=count),
+            price_cents=ints("price_cents", np.int32),
+        )
+
+    def __len__(self):
+        return len(self.id)
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in vars(self).values())
+
+    def take(self, mask):
+        """Sous-ensemble des lignes sélectionnées par `mask` (ou des positions)."""
+        return RentalColumns(**{name: column[mask] for name, column in vars(self).items()})
+
+    def active_at(self, moment=None):
+        """Masque des locations en cours à `moment` (maintenant par défaut)."""
+        return self.expires_at > to_epoch(moment or datetime.utcnow())
+
+    def by_user(self, user_id):
+        return self.user_id == user_id
+
+    def by_owner(self, owner_id):
+        return self.owner_id == owner_id
+
+    def by_movie(self, movie_id):
+        return self.movie_id == movie_id
+
+    def busy_until(self, moment=None, movie_id=None):
+        """Fin de la location en cours la plus tardive de chaque exemplaire :
+        `{(owner_id, movie_id, format): datetime}` (un film seulement si
+        `movie_id` est donné)."""
+        mask = self.active_at(moment) & (self.fmt >= 0)
+        if movie_id is not None:
+            mask &= self.by_movie(movie_id)
+        if not mask.any():
+            return {}
+        owners, movies = self.owner_id[mask], self.movie_id[mask]
+        fmts, expires = self.fmt[mask], self.expires_at[mask]
+        # Tri par exemplaire puis par échéance : la dernière ligne de chaque
+        # groupe porte la fin la plus tardive.
+        order = np.lexsort((expires, fmts, movies, owners))
+        owners, movies, fmts, expires = owners[order], movies[order], fmts[order], expires[order]
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = (
+            (owners[1:] != owners[:-1]) | (movies[1:] != movies[:-1]) | (fmts[1:] != fmts[:-1])
+        )
+        return {
+            (int(o), int(m), FORMATS[f]): from_epoch(e)
+            for o, m, f, e in zip(owners[last], movies[last], fmts[last], expires[last])
+        }
+
+    def revenue_cents(self, mask=None):
+        """Somme des prix des lignes de `mask` (toutes par défaut)."""
+        prices = self.price_cents if mask is None else self.price_cents[mask]
+        return int(prices.sum(dtype=np.int64))
+
+    def revenue_by(self, field, mask=None):
+        """Recettes par valeur de `field` (`owner_id`, `movie_id`...) :
+        `{valeur: centimes}`."""
+        keys, prices = getattr(self, field), self.price_cents
+        if mask is not None:
+            keys, prices = keys[mask], prices[mask]
+        values, groups = np.unique(keys, return_inverse=True)
+        sums = np.bincount(groups, weights=prices, minlength=len(values))
+        return {int(v): int(s) for v, s in zip(values, sums)}
+
@@ -1,46 +1,467 @@
+import copy
+from datetime import datetime
+from functools import wraps
+import gzip
+import json
 import os
-import requests
+from concurrent.futures import ThreadPoolExecutor
+import random
+import threading
+import time
+
+from services import http_client
+from services.indexes import build_index, sequence_start, shared_index
+from services.json_patch import escape, make_patch
+from services.metrics import registry
+
+try:
+    import msgpack
+except ImportError:  # optionnel : JSON sinon
+    msgpack = None
+
+from urllib3.util.request import ACCEPT_ENCODING
 
 API_URL = os.getenv("API_URL", "http://api:5000")
 
-def load_data():
-    r = requests.get(f"{API_URL}/data", timeout=5)
+# Nombre de tentatives de `update_data` en cas d'écriture concurrente.
+MAX_RETRIES = 8
+
+_MISSING = object()
+
+# Dernière version connue de chaque collection : {nom: (version, valeur)}.
+# Les valeurs sont partagées entre requêtes et ne doivent jamais être modifiées.
+_cache = {}
+_cache_lock = threading.Lock()
+
+_prefetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="data-prefetch")
+
+
+MSGPACK = "application/msgpack"
+
+# Corps demandés à l'API : MessagePack si disponible ici (l'API retombe sur
+# JSON sinon), compressés dans un format que urllib3 sait décoder seul.
+_ACCEPT = f"{MSGPACK}, application/json;q=0.9" if msgpack else "application/json"
+READ_HEADERS = {"Accept": _ACCEPT, "Accept-Encoding": ACCEPT_ENCODING}
+
+# Patchs plus gros que ce seuil envoyés compressés en gzip.
+COMPRESS_MIN_BYTES = 1024
+
+
+API_IO_SECONDS = registry.histogram(
+    "popcornhub_web_api_io_seconds",
+    "Durée des échanges avec l'API, décodage compris (load, query, save...).",
+    ("op",),
+)
+API_IO_BYTES = registry.counter(
+    "popcornhub_web_api_io_bytes_total",
+    "Octets échangés avec l'API (tels que transmis, compression comprise).",
+    ("op", "direction"),
+)
+
+
+def _timed_io(op):
+    """Mesure la durée de la fonction d'échange décorée dans `API_IO_SECONDS`."""
+
+    def decorate(fn):
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                API_IO_SECONDS.observe(time.perf_counter() - start, op)
+
+        return timed
+
+    return decorate
+
+
+def _count_bytes(op, response, sent=0):
+    received = int(response.headers.get("Content-Length") or 0)
+    if received:
+        API_IO_BYTES.inc(op, "received", amount=received)
+    if sent:
+        API_IO_BYTES.inc(op, "sent", amount=sent)
+
+
+class DataConflict(Exception):
+    """Une collection lue a été modifiée par une autre requête entre-temps."""
+
+
+def _parse_etag(value):
+    return int(value.strip().removeprefix("W/").strip('"')) if value else 0
+
+
+def _decode(r):
+    """Corps d'une réponse de l'API, JSON ou MessagePack."""
+    if r.headers.get("Content-Type", "").startswith(MSGPACK):
+        return msgpack.unpackb(r.content, raw=False)
+    return r.json()
+
+
+def _encode(value):
+    """Corps et en-têtes d'envoi d'une valeur à l'API."""
+    if msgpack:
+        body, headers = msgpack.packb(value, use_bin_type=True), {"Content-Type": MSGPACK}
+    else:
+        body = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+def _remember(name, version, value):
+    with _cache_lock:
+        cached = _cache.get(name)
+        if cached is None or cached[0] <= version:
+            _cache[name] = (version, value)
+
+
+@_timed_io("load")
+def fetch_collection(name):
+    """Récupère une seule collection du document.
+
+    La dernière version reçue est gardée en mémoire et revalidée par
+    `If-None-Match` : tant qu'elle n'a pas changé, l'API répond 304 sans
+    corps et l'objet déjà décodé est réutilisé tel quel.
+
+    Renvoie `(valeur, version)` ; la valeur vaut `_MISSING` si la collection
+    n'existe pas (version 0).
+    """
+    cached = _cache.get(name)
+    headers = dict(READ_HEADERS)
+    if cached:
+        headers["If-None-Match"] = f'"{cached[0]}"'
+    r = http_client.get("api", f"{API_URL}/data/{name}", headers=headers)
+    _count_bytes("load", r)
+    if r.status_code == 304 and cached:
+        return cached[1], cached[0]
+    if r.status_code == 404:
+        with _cache_lock:
+            _cache.pop(name, None)
+        return _MISSING, 0
+    r.raise_for_status()
+    value, version = _decode(r), _parse_etag(r.headers.get("ETag"))
+    _remember(name, version, value)
+    return value, version
+
+
+def _query_params(filters):
+    params = {}
+    for field, value in filters.items():
+        if isinstance(value, (list, tuple, set)):
+            value = list(value)
+        elif isinstance(value, bool):
+            value = "true" if value else "false"
+        params[field] = value
+    return params
+
+
+def _nothing_to_match(filters):
+    """Un filtre par liste vide ne peut rien trouver (et sans lui l'API
+    renverrait toute la collection)."""
+    return any(isinstance(v, (list, tuple, set)) and not v for v in filters.values())
+
+
+def _no_rows(filters):
+    return {"items": {} if "key" in filters else [], "total": 0}
+
+
+@_timed_io("query")
+def query(name, **filters):
+    """Lignes de la collection `name` correspondant à `filters`, filtrées
+    côté API (`GET /query/<name>`) : seules elles transitent.
+
+    Une liste de valeurs signifie « l'une d'elles ». Paramètres spéciaux :
+    `active`, `sort`, `page`, `page_size` et `key` (collections objets).
+    Renvoie `{"items", "total"}` (+ `page`, `page_size`) ; une collection
+    absente ne contient aucune ligne.
+    """
+    if _nothing_to_match(filters):
+        return _no_rows(filters)
+    r = http_client.get(
+        "api", f"{API_URL}/query/{name}", params=_query_params(filters), headers=READ_HEADERS
+    )
+    _count_bytes("query", r)
+    if r.status_code == 404:
+        return _no_rows(filters)
+    r.raise_for_status()
+    return _decode(r)
+
+
+@_timed_io("versions")
+def collection_versions(*names):
+    """Version courante de chaque collection, `{nom: version}` (0 si absente)."""
+    r = http_client.get("api", f"{API_URL}/versions", params={"name": list(names)})
     r.raise_for_status()
     return r.json()
 
 
+@_timed_io("archive")
+def fetch_archived_rentals(**filters):
+    """Locations archivées par l'API (terminées, hors du document), filtrées
+    par `user_id`, `owner_id` et/ou `movie_id`."""
+    r = http_client.get("api", f"{API_URL}/archive/rentals", params=filters)
+    _count_bytes("archive", r)
+    r.raise_for_status()
+    return r.json()
+
+
+@_timed_io("availability")
+def fetch_busy_copies(movie_id):
+    """Exemplaires du film loués en ce moment, d'après l'index des locations
+    en cours de l'API : `{(owner_id, format): fin}`."""
+    r = http_client.get("api", f"{API_URL}/availability/{movie_id}")
+    _count_bytes("availability", r)
+    r.raise_for_status()
+    return {
+        (b["owner_id"], b["format"]): datetime.fromisoformat(b["until"])
+        for b in r.json()["busy"]
+    }
+
+
+@_timed_io("rent")
+def create_rental(user_id, owner_id, movie_id, fmt, duration_days=None):
+    """Demande à l'API de créer une location (vérifications et insertion
+    atomiques côté API).
+
+    Renvoie `(201, location)` ou `(409, {"error", "busy_until"})`."""
+    r = http_client.post(
+        "api",
+        f"{API_URL}/rentals",
+        json={
+            "user_id": user_id,
+            "owner_id": owner_id,
+            "movie_id": movie_id,
+            "format": fmt,
+            "duration_days": duration_days,
+        },
+    )
+    _count_bytes("rent", r)
+    if r.status_code not in (201, 409):
+        r.raise_for_status()
+    return r.status_code, r.json()
+
+
+def patch_data(ops, base_versions=None):
+    """Envoie un JSON Patch. `base_versions` ({collection: version}) rend
+    l'écriture conditionnelle : l'API répond 412 si l'une d'elles a changé.
+
+    Renvoie la nouvelle version du document (None si rien à envoyer)."""
+    if not ops:
+        return None
+    body, headers = _encode(ops)
+    if base_versions:
+        headers["X-Base-Versions"] = ",".join(
+            f"{name}={version}" for name, version in base_versions.items()
+        )
+    r = http_client.patch("api", f"{API_URL}/data", data=body, headers=headers)
+    _count_bytes("save", r, sent=len(body))
+    if r.status_code == 412:
+        raise DataConflict(r.json().get("collection"))
+    r.raise_for_status()
+    return int(r.headers["X-Data-Version"])
+
+
+class DataStore:
+    """Vue paresseuse et indexée du document de l'API.
+
+    Chaque collection (`users`, `rentals`, ...) n'est téléchargée qu'au
+    premier accès.
+
+    En lecture seule (par défaut), les valeurs sont celles du cache partagé :
+    aucune copie, mais elles ne doivent pas être modifiées. Avec
+    `for_update=True`, la route reçoit des copies privées et `save_data`
+    n'envoie que le différentiel des collections modifiées, conditionné aux
+    versions de toutes les collections lues.
+
+    `find` / `find_one` / `next_id` s'appuient sur les index et séquences de
+    `services.indexes`, construits une fois par version de collection.
+    """
+
+    def __init__(self, for_update=False):
+        self.for_update = for_update
+        self._values = {}
+        self._originals = {}
+        self._dirty = set()
+        self._replaced = set()
+        # Collections remises en copie privée (for_update) : la route peut
+        # les modifier, les index partagés de la version lue ne valent plus.
+        self._writable = set()
+        self._sequences = {}
+        self._pending = {}
+        self.versions = {}
+
+    def prefetch(self, *names):
+        """Lance en parallèle le téléchargement des collections `names` ;
+        les accès suivants attendent simplement leur résultat."""
+        for name in names:
+            if name not in self._values and name not in self._pending:
+                self._pending[name] = _prefetch_pool.submit(fetch_collection, name)
+        return self
+
+    def _load(self, key):
+        if key not in self._values:
+            pending = self._pending.pop(key, None)
+            if pending is not None:
+                self._loaded(key, *pending.result())
+            else:
+                self._loaded(key, *fetch_collection(key))
+        return self._values[key]
+
+    def _loaded(self, key, value, version):
+        self.versions[key] = version
+        self._originals[key] = value
+        if self.for_update and value is not _MISSING:
+            value = copy.deepcopy(value)
+            self._writable.add(key)
+        self._values[key] = value
+
+    def __getitem__(self, key):
+        value = self._load(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._load(key)
+        self._values[key] = value
+        self._replaced.add(key)
+
+    def __contains__(self, key):
+        return self._load(key) is not _MISSING
+
+    def get(self, key, default=None):
+        value = self._load(key)
+        return default if value is _MISSING else value
+
+    def setdefault(self, key, default=None):
+        value = self._load(key)
+        if value is _MISSING:
+            self._values[key] = value = default
+            self._replaced.add(key)
+        return value
+
+    def _private(self, name):
+        return name in self._writable or name in self._replaced
+
+    def find(self, name, index, key):
+        """Lignes de `name` dont la clé d'index `index` vaut `key`."""
+        rows = self.get(name, [])
+        original = self._originals[name]
+        if self._private(name) or original is _MISSING:
+            # Collection modifiable localement : index privé, non mémorisé.
+            positions = build_index(name, index, rows)
+        else:
+            positions = shared_index(name, index, self.versions[name], original)
+        return [rows[pos] for pos in positions.get(key, ())]
+
+    def find_one(self, name, index, key):
+        found = self.find(name, index, key)
+        return found[0] if found else None
+
+    def next_id(self, name):
+        """Prochain id de la collection `name` (séquence mémorisée par version,
+        puis incrémentée localement pour les insertions de cette requête)."""
+        if name not in self._sequences:
+            original = self._originals.get(name, _MISSING)
+            if original is _MISSING:
+                self._load(name)
+                original = self._originals[name]
+            if original is _MISSING or name in self._replaced:
+                start = get_next_id(self.get(name, []))
+            else:
+                start = sequence_start(name, self.versions[name], original)
+            # Ids de lignes sorties du document (locations archivées).
+            retired = self.get("sequences", {}).get(name, 0)
+            self._sequences[name] = max(start, retired + 1)
+        value = self._sequences[name]
+        self._sequences[name] = value + 1
+        return value
+
+    def diff(self):
+        """Opérations JSON Patch correspondant aux modifications locales."""
+        ops = []
+        self._dirty = set()
+        for key, value in self._values.items():
+            original = self._originals[key]
+            if value is _MISSING:
+                continue
+            path = f"/{escape(key)}"
+            if original is _MISSING:
+                changes = [{"op": "add", "path": path, "value": value}]
+            else:
+                changes = make_patch(original, value, path)
+            if changes:
+                self._dirty.add(key)
+                ops.extend(changes)
+        return ops
+
+    def mark_saved(self, version):
+        """Après une écriture acceptée, l'état local est exactement celui de
+        l'API : il devient la nouvelle référence et alimente le cache."""
+        for key in self._dirty:
+            saved = copy.deepcopy(self._values[key])
+            self._originals[key] = saved
+            self.versions[key] = version
+            _remember(key, version, saved)
+
+
+def load_data(for_update=False):
+    return DataStore(for_update=for_update)
+
+
 def save_data(data):
-    r = requests.put(f"{API_URL}/data", json=data, timeout=5)
+    """Enregistre les modifications ; lève `DataConflict` si une collection
+    lue a changé depuis `load_data()`."""
+    if isinstance(data, DataStore):
+        version = patch_data(data.diff(), data.versions)
+        if version is not None:
+            data.mark_saved(version)
+        return
+    r = http_client.put("api", f"{API_URL}/data", json=data)
     r.raise_for_status()
 
 
+def update_data(mutate, retries=MAX_RETRIES):
+    """Exécute `mutate(data)` puis enregistre, en recommençant sur un
+    document frais tant que l'écriture entre en conflit.
+
+    `mutate` peut donc être appelée plusieurs fois : elle ne doit pas avoir
+    d'effet de bord hors de `data` (pas de `flash`, par exemple) et renvoie
+    une valeur que l'appelant exploite une fois l'écriture réussie.
+    """
+    for attempt in range(retries):
+        data = load_data(for_update=True)
+        result = mutate(data)
+        try:
+            save_data(data)
+        except DataConflict:
+            if attempt == retries - 1:
+                raise
+            # Petit délai aléatoire pour désynchroniser les requêtes rivales.
+            time.sleep(random.uniform(0, 0.005 * (attempt + 1)))
+            continue
+        return result
+
+
 def get_next_id(items):
     return (max((obj["id"] for obj in items), default=0) + 1) if items else 1
 
 
 def find_user_by_username(data, username):
-    for u in data["users"]:
-        if u["username"].lower() == username.lower():
-            return u
-    return None
+    return data.find_one("users", "username", username.casefold())
 
 
 def find_user_by_email(data, email):
-    for u in data["users"]:
-        if u["email"].lower() == email.lower():
-            return u
-    return None
+    return data.find_one("users", "email", email.casefold())
 
 
 def get_user_by_id(data, user_id):
-    for u in data["users"]:
-        if u["id"] == user_id:
-            return u
-    return None
+    return data.find_one("users", "id", user_id)
 
 
 def find_ownership(data, user_id, movie_id):
-    for own in data.get("user_owns", []):
-        if own["user_id"] == user_id and own["movie_id"] == movie_id:
-            return own
-    return None
\ No newline at end of file
+    return data.find_one("user_owns", "user_movie", (user_id, movie_id))
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""Client HTTP partagé pour les services amont (TMDb, popcornhub-api).
+
+Chaque amont dispose de sa propre `requests.Session` : les connexions
+TCP/TLS sont conservées (keep-alive) dans un pool borné au lieu d'être
+rouvertes à chaque appel. Les requêtes idempotentes sont rejouées avec un
+délai exponentiel aléatoire, et un disjoncteur coupe court aux appels tant
+qu'un amont est en panne.
+"""
+
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import HTTP_UPSTREAMS
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """L'amont est considéré en panne : l'appel n'est pas tenté."""
+
+
+class CircuitBreaker:
+    """Ouvert après `failures` échecs consécutifs, puis laisse passer un
+    seul appel d'essai après `cooldown` secondes (demi-ouvert)."""
+
+    def __init__(self, failures=5, cooldown=30.0):
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.max_failures:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class Upstream:
+    def __init__(
+        self,
+        name,
+        pool_size=32,
+        timeout=(3.05, 5),
+        retries=2,
+        backoff=0.1,
+        breaker_failures=5,
+        breaker_cooldown=30.0,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(breaker_failures, breaker_cooldown)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        method = method.upper()
+        kwargs.setdefault("timeout", self.timeout)
+        attempts = 1 + (self.retries if method in IDEMPOTENT_METHODS else 0)
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"{self.name} indisponible (disjoncteur ouvert)")
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.breaker.record_failure()
+                if attempt == attempts - 1:
+                    raise
+            except BaseException:
+                # Réponse tronquée, trop de redirections... : pas de nouvelle
+                # tentative, mais l'appel (d'essai ou non) est bien conclu.
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code >= 500 or response.status_code == 429:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if response.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                    return response
+            # Délai exponentiel avec gigue complète.
+            time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+
+_upstreams = {name: Upstream(name, **options) for name, options in HTTP_UPSTREAMS.items()}
+
+
+def upstream(name):
+    return _upstreams[name]
+
+
+def get(name, url, **kwargs):
+    return _upstreams[name].request("GET", url, **kwargs)
+
+
+def put(name, url, **kwargs):
+    return _upstreams[name].request("PUT", url, **kwargs)
+
+
+def patch(name, url, **kwargs):
+    return _upstreams[name].request("PATCH", url, **kwargs)
+
+
+def post(name, url, **kwargs):
+    return _upstreams[name].request("POST", url, **kwargs)
@@ -0,0 +1,248 @@
+"""Proxy local des images TMDb (affiches, photos d'acteurs).
+
+`GET /img/<type>/<taille>/<fichier>` : l'image source est téléchargée une
+seule fois depuis TMDb (`IMAGE_SOURCE_SIZE`), puis chaque variante (largeurs
+`IMAGE_SIZES`) est redimensionnée par Pillow (requirements.txt) et gardée sur
+disque, en WebP si le navigateur l'accepte. Sans Pillow (avertissement au
+démarrage), chaque variante est demandée à TMDb à sa largeur (`w185`...) :
+jamais l'image source sous le nom d'une variante.
+
+Le cache disque (`IMAGE_CACHE_DIR`) est borné à `IMAGE_CACHE_MAX_BYTES` : les
+fichiers les moins récemment servis sont supprimés en premier.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+
+import requests
+
+from config import (
+    IMAGE_CACHE_DIR,
+    IMAGE_CACHE_MAX_BYTES,
+    IMAGE_QUALITY,
+    IMAGE_RETRY_AFTER,
+    IMAGE_SIZES,
+    IMAGE_SOURCE_SIZE,
+    TMDB_IMG_BASE,
+)
+from services import http_client
+from services.cache import SingleFlight, TTLCache
+from services.metrics import registry
+
+try:
+    from PIL import Image, features
+except ImportError:  # optionnel : pas de redimensionnement local
+    Image = None
+
+log = logging.getLogger(__name__)
+
+if Image is None:
+    log.warning(
+        "Pillow absent : images servies aux tailles TMDb, sans redimensionnement ni WebP"
+    )
+
+WEBP = Image is not None and features.check("webp")
+
+URL_PREFIX = "/img"
+
+# Type d'image -> image par défaut (dans static/).
+KINDS = {"poster": "default_poster.png", "person": "actors/default_actor.png"}
+
+# Noms de fichiers TMDb (`/kqjL17yufvn9OVLyXYpvtyrFfak.jpg`) : rien d'autre
+# n'est demandé à l'amont.
+FILENAME = re.compile(r"^[A-Za-z0-9_-]+\.(?:jpg|jpeg|png)$")
+
+MIMETYPES = {"jpg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+PIL_FORMATS = {"jpg": "JPEG", "png": "PNG", "webp": "WEBP"}
+
+IMAGE_REQUESTS = registry.counter(
+    "popcornhub_web_image_requests_total",
+    "Images servies par taille et origine (hit, miss, fallback).",
+    ("size", "cache"),
+)
+
+_flights = SingleFlight()
+# Images introuvables ou amont en échec : pas de nouvel essai avant
+# IMAGE_RETRY_AFTER secondes.
+_failures = TTLCache(maxsize=4096)
+
+
+def image_url(kind, size, path):
+    """URL locale de l'image TMDb `path` (`/abc.jpg`), None sans image."""
+    if not path:
+        return None
+    return f"{URL_PREFIX}/{kind}/{size}{path}"
+
+
+class DiskCache:
+    """Fichiers sur disque bornés en taille totale.
+
+    Chaque lecture rafraîchit la date de modification du fichier : au-delà de
+    `max_bytes`, les plus anciens sont supprimés jusqu'à revenir à 90 % de la
+    limite. Plusieurs workers peuvent partager le même dossier.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._size = None  # calculée au premier ajout
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _path(self, name):
+        return self.directory / name[:2] / name
+
+    def has(self, name):
+        return self._path(name).exists()
+
+    def get(self, name):
+        path = self._path(name)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def set(self, name, data):
+        path = self._path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{name}.{os.getpid()}.{threading.get_ident()}")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._files())
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _files(self):
+        for path in self.directory.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            yield stat.st_mtime, stat.st_size, path
+
+    def _evict(self):
+        # Appelé sous le verrou ; relit les tailles réelles (autres workers).
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            self.evictions += 1
+        self._size = total
+
+
+disk = DiskCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES)
+
+
+def _name(path, suffix):
+    digest = hashlib.blake2b(path.encode(), digest_size=16).hexdigest()
+    return f"{digest}-{suffix}"
+
+
+def _extension(path):
+    return "png" if path.endswith(".png") else "jpg"
+
+
+def _download(tmdb_size, path, name):
+    if _failures.get(name, count_miss=False):
+        return None
+    try:
+        r = http_client.get("tmdb_img", f"{TMDB_IMG_BASE}/{tmdb_size}{path}")
+    except requests.RequestException:
+        r = None
+    if r is None or r.status_code != 200 or not r.headers.get("Content-Type", "").startswith("image/"):
+        _failures.set(name, True, IMAGE_RETRY_AFTER)
+        return None
+    disk.set(name, r.content)
+    return r.content
+
+
+def _fetch(tmdb_size, path, name):
+    data = disk.get(name)
+    if data is None:
+        data = _flights.do(name, lambda: disk.get(name) or _download(tmdb_size, path, name))
+    return data
+
+
+def _resize(path, width, ext, name):
+    source = _fetch(IMAGE_SOURCE_SIZE, path, _name(path, "source"))
+    if source is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(source)) as image:
+            if image.width > width:
+                height = round(image.height * width / image.width)
+                image = image.resize((width, height), Image.LANCZOS)
+            if ext == "jpg" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            out = io.BytesIO()
+            image.save(out, PIL_FORMATS[ext], quality=IMAGE_QUALITY, optimize=True)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        _failures.set(name, True, IMAGE_RETRY_AFTER)
+        return None
+    data = out.getvalue()
+    disk.set(name, data)
+    return data
+
+
+def prefetch(path, sizes, wait=None):
+    """Télécharge à l'avance ce qu'il faut pour servir `path` aux tailles
+    `sizes` sans attendre TMDb : l'image source (Pillow) ou chaque taille.
+    `wait()` est appelé avant chaque téléchargement ; renvoie leur nombre."""
+    if Image is None:
+        ext = _extension(path)
+        wanted = [(f"w{IMAGE_SIZES[s]}", _name(path, f"w{IMAGE_SIZES[s]}.{ext}")) for s in sizes]
+    else:
+        wanted = [(IMAGE_SOURCE_SIZE, _name(path, "source"))]
+
+    downloads = 0
+    for tmdb_size, name in wanted:
+        if disk.has(name) or _failures.get(name, count_miss=False):
+            continue
+        if wait is not None:
+            wait()
+        _fetch(tmdb_size, path, name)
+        downloads += 1
+    return downloads
+
+
+def variant(size, path, webp=False):
+    """`(octets, type MIME)` de l'image TMDb `path` à la taille `size`, ou
+    None si elle est indisponible."""
+    width = IMAGE_SIZES[size]
+    if Image is None:
+        ext = _extension(path)
+        name = _name(path, f"w{width}.{ext}")
+        data = disk.get(name)
+        hit = data is not None
+        if not hit:
+            data = _fetch(f"w{width}", path, name)
+    else:
+        ext = "webp" if webp and WEBP else _extension(path)
+        name = _name(path, f"{width}.{ext}")
+        data = disk.get(name)
+        hit = data is not None
+        if not hit and not _failures.get(name, count_miss=False):
+            data = _flights.do(name, lambda: disk.get(name) or _resize(path, width, ext, name))
+
+    IMAGE_REQUESTS.inc(size, "hit" if hit else "miss" if data else "fallback")
+    if data is None:
+        return None
+    return data, MIMETYPES[ext]
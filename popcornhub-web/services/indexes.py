@@ -0,0 +1,87 @@
+"""Index de hachage sur les collections du document.
+
+Un index associe une clé (id, nom d'utilisateur, couple user/film...) à la
+liste des positions des lignes correspondantes dans la collection. Les
+collections lues étant partagées via le cache de `services.data`, chaque
+index est construit une seule fois par version de collection puis réutilisé
+par toutes les requêtes.
+"""
+
+import threading
+
+
+def _casefold(value):
+    return (value or "").casefold()
+
+
+INDEXES = {
+    "users": {
+        "id": lambda u: u["id"],
+        "username": lambda u: _casefold(u["username"]),
+        "email": lambda u: _casefold(u.get("email")),
+    },
+    "user_owns": {
+        "user": lambda o: o["user_id"],
+        "movie": lambda o: o["movie_id"],
+        "user_movie": lambda o: (o["user_id"], o["movie_id"]),
+    },
+    "rentals": {
+        "renter": lambda r: r["user_id"],
+        "movie": lambda r: r["movie_id"],
+        "copy": lambda r: (r["owner_id"], r["movie_id"], r["format"]),
+    },
+    "reviews": {
+        "movie": lambda r: r["movie_id"],
+        "user_movie": lambda r: (r["user_id"], r["movie_id"]),
+    },
+    "catalog": {
+        "id": lambda m: m["id"],
+    },
+}
+
+# {(collection, index): (version, index)}
+_built = {}
+# {collection: (version, prochain id)}
+_sequences = {}
+_lock = threading.Lock()
+
+
+def build_index(name, index, rows):
+    key_of = INDEXES[name][index]
+    positions = {}
+    for pos, row in enumerate(rows):
+        try:
+            key = key_of(row)
+        except (KeyError, TypeError):
+            continue
+        positions.setdefault(key, []).append(pos)
+    return positions
+
+
+def shared_index(name, index, version, rows):
+    """Index de `rows` (la collection `name` telle qu'en `version`),
+    construit au premier appel puis mémorisé jusqu'à la version suivante."""
+    with _lock:
+        built = _built.get((name, index))
+    if built and built[0] == version:
+        return built[1]
+    positions = build_index(name, index, rows)
+    with _lock:
+        current = _built.get((name, index))
+        if current is None or current[0] <= version:
+            _built[(name, index)] = (version, positions)
+    return positions
+
+
+def sequence_start(name, version, rows):
+    """Premier id libre de la collection `name` en `version`."""
+    with _lock:
+        known = _sequences.get(name)
+    if known and known[0] == version:
+        return known[1]
+    start = max((row["id"] for row in rows), default=0) + 1
+    with _lock:
+        current = _sequences.get(name)
+        if current is None or current[0] <= version:
+            _sequences[name] = (version, start)
+    return start
@@ -0,0 +1,59 @@
+"""Génération d'opérations JSON Patch (RFC 6902) par comparaison de deux états."""
+
+
+def escape(key):
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _is_subsequence(short, long):
+    """Renvoie les index de `long` absents de `short`, ou None si `short`
+    n'est pas une sous-suite de `long`."""
+    missing = []
+    i = 0
+    for j, item in enumerate(long):
+        if i < len(short) and short[i] == item:
+            i += 1
+        else:
+            missing.append(j)
+    return missing if i == len(short) else None
+
+
+def make_patch(old, new, path=""):
+    """Liste d'opérations transformant `old` en `new`."""
+    if old == new:
+        return []
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{escape(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{escape(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                ops.extend(make_patch(old[key], value, child))
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        if len(new) < len(old):
+            missing = _is_subsequence(new, old)
+            if missing is not None:
+                # Suppressions en partant de la fin pour garder les index valides.
+                return [
+                    {"op": "remove", "path": f"{path}/{i}"}
+                    for i in reversed(missing)
+                ]
+
+        ops = []
+        common = min(len(old), len(new))
+        for i in range(common):
+            ops.extend(make_patch(old[i], new[i], f"{path}/{i}"))
+        for i in range(len(old) - 1, common - 1, -1):
+            ops.append({"op": "remove", "path": f"{path}/{i}"})
+        for item in new[common:]:
+            ops.append({"op": "add", "path": f"{path}/-", "value": item})
+        return ops
+
+    return [{"op": "replace", "path": path, "value": new}]
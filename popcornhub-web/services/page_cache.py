@@ -0,0 +1,122 @@
+"""Cache des pages anonymes et des fragments de page partagés.
+
+Une page servie à un visiteur non connecté est gardée en mémoire (clé : route
+et paramètres de l'URL) avec la version des collections dont elle dépend.
+Tant qu'aucune n'a changé et que `PAGE_CACHE_TTL` n'est pas écoulé, elle est
+renvoyée telle quelle, sans appel TMDb ni rendu Jinja. `ETag` et
+`Last-Modified` permettent au navigateur de revalider (réponse 304).
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, make_response, request, session
+
+from config import FRAGMENT_CACHE_TTL, PAGE_CACHE_SIZE, PAGE_CACHE_TTL
+from services.cache import TTLCache
+from services.data import collection_versions
+from services.metrics import registry
+
+_pages = TTLCache(maxsize=PAGE_CACHE_SIZE)
+_fragments = TTLCache(maxsize=PAGE_CACHE_SIZE)
+
+PAGE_CACHE = registry.counter(
+    "popcornhub_web_page_cache_total",
+    "Pages par route et passage par le cache (hit, miss, bypass).",
+    ("endpoint", "result"),
+)
+
+
+def _key():
+    """Clé de la page, ou None si elle ne doit pas passer par le cache
+    (utilisateur connecté, messages flash en attente)."""
+    if request.method not in ("GET", "HEAD") or "user_id" in session or "_flashes" in session:
+        return None
+    return request.path, tuple(sorted(request.args.items(multi=True)))
+
+
+def _names(depends):
+    return tuple(depends() if callable(depends) else depends)
+
+
+def _respond(entry):
+    response = Response(entry["body"], content_type=entry["content_type"])
+    response.set_etag(entry["etag"])
+    response.last_modified = entry["last_modified"]
+    # Revalidation à chaque visite ; la page diffère pour un utilisateur connecté.
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add("Cookie")
+    return response.make_conditional(request)
+
+
+def _cached(key, versions):
+    entry = _pages.get(key)
+    if entry is None or entry["versions"] != versions:
+        return None
+    PAGE_CACHE.inc(request.endpoint, "hit")
+    return _respond(entry)
+
+
+def _store(key, versions, rv):
+    PAGE_CACHE.inc(request.endpoint, "miss")
+    response = make_response(rv)
+    if response.status_code != 200 or session.modified or "Set-Cookie" in response.headers:
+        return response
+    body = response.get_data()
+    entry = {
+        "body": body,
+        "content_type": response.content_type,
+        "etag": hashlib.blake2b(body, digest_size=16).hexdigest(),
+        "last_modified": datetime.now(timezone.utc).replace(microsecond=0),
+        "versions": versions,
+    }
+    _pages.set(key, entry, PAGE_CACHE_TTL)
+    return _respond(entry)
+
+
+def cache_anonymous(depends=()):
+    """Met la page en cache pour les visiteurs anonymes.
+
+    `depends` : collections dont la page dépend (ou fonction qui les renvoie
+    selon la requête) ; la page est recalculée dès que l'une d'elles change.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            key = _key()
+            if key is None:
+                PAGE_CACHE.inc(request.endpoint, "bypass")
+                return view(*args, **kwargs)
+            names = _names(depends)
+            versions = collection_versions(*names) if names else {}
+            hit = _cached(key, versions)
+            if hit is not None:
+                return hit
+            return _store(key, versions, view(*args, **kwargs))
+
+        return wrapped
+
+    return decorator
+
+
+def fragment(key, render):
+    """HTML d'un fragment partagé entre tous les utilisateurs : `render()`
+    n'est appelé que si `key` est absente ou plus vieille que
+    `FRAGMENT_CACHE_TTL` secondes."""
+    html = _fragments.get(key)
+    if html is None:
+        html = render()
+        _fragments.set(key, html, FRAGMENT_CACHE_TTL)
+    return html
+
+
+def page_cache_stats():
+    return {
+        "pages": len(_pages),
+        "fragments": len(_fragments),
+        "hits": _pages.hits,
+        "misses": _pages.misses,
+    }
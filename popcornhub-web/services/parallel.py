@@ -0,0 +1,35 @@
+"""Appels amont d'une vue lancés en parallèle.
+
+Une page qui a besoin de plusieurs réponses TMDb ou API indépendantes les
+demande en même temps sur un pool de threads partagé : elle attend la plus
+lente plutôt que leur somme. Les fonctions soumises ne doivent pas elles-mêmes
+attendre d'autres appels du pool.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from config import PARALLEL_WORKERS
+from services.profiler import follow
+
+_pool = ThreadPoolExecutor(max_workers=PARALLEL_WORKERS, thread_name_prefix="parallel")
+
+
+def submit(fn, *args, **kwargs):
+    """Lance `fn(*args, **kwargs)` ; renvoie sa `Future`."""
+    return _pool.submit(follow(fn), *args, **kwargs)
+
+
+def gather(*calls, return_exceptions=False):
+    """Appelle en parallèle chaque fonction sans argument de `calls` et
+    renvoie leurs résultats dans l'ordre. Avec `return_exceptions`, une
+    exception est renvoyée à la place du résultat au lieu d'être levée."""
+    futures = [submit(call) for call in calls]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results.append(e)
+    return results
@@ -0,0 +1,215 @@
+"""Profilage à la demande d'une requête du site.
+
+Activé par `PROFILE_ENABLED=1`, il profile une requête si elle porte l'en-tête
+`X-Profile` (égal à `PROFILE_TOKEN` si celui-ci est défini) ou si elle est
+tirée au sort (`PROFILE_SAMPLE_RATE`, entre 0 et 1). Deux modes :
+
+- `sample` (par défaut) : un thread relève la pile de la requête toutes les
+  `PROFILE_INTERVAL_MS` ms et écrit des piles repliées (`.folded`), lisibles
+  par flamegraph.pl, speedscope ou inferno ;
+- `cprofile` : profil déterministe (`cProfile`), écrit au format pstats
+  (`.prof`, pour snakeviz ou flameprof).
+
+Les appels lancés en parallèle par la vue (`services.parallel`) sont suivis
+dans leurs threads. Le nom du fichier est renvoyé dans `X-Profile-File`.
+
+Désactivé, le module n'installe aucun hook : les requêtes ne paient rien.
+"""
+
+import cProfile
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from flask import g, has_request_context, request
+
+from config import (
+    PROFILE_DIR,
+    PROFILE_ENABLED,
+    PROFILE_INTERVAL_MS,
+    PROFILE_KEEP,
+    PROFILE_MODE,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_TOKEN,
+)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingSession:
+    """Échantillonne les piles des threads de la requête."""
+
+    suffix = ".folded"
+
+    @classmethod
+    def start(cls, interval):
+        return cls(interval)
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._owner = threading.get_ident()
+        self.threads = {self._owner}
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def enter_thread(self):
+        self.threads.add(threading.get_ident())
+
+    def leave_thread(self):
+        if threading.get_ident() != self._owner:
+            self.threads.discard(threading.get_ident())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    # Racine : thread de la requête ou appel lancé en parallèle.
+                    stack.append("request" if ident == self._owner else "parallel")
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with path.open("w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class CProfileSession:
+    """Profil déterministe, une requête à la fois dans le processus.
+
+    Avant Python 3.12, cProfile ne voit que le thread qui l'active : un
+    profil par thread, fusionnés à l'écriture. Depuis 3.12 (sys.monitoring),
+    un seul profil couvre tous les threads et un second ne peut pas être
+    activé en même temps.
+    """
+
+    suffix = ".prof"
+    PER_THREAD = sys.version_info < (3, 12)
+    _busy = threading.Lock()
+
+    @classmethod
+    def start(cls, interval=None):
+        if not cls._busy.acquire(blocking=False):
+            return None  # une autre requête est déjà profilée
+        return cls()
+
+    def __init__(self):
+        self.profiles = []
+        self._local = threading.local()
+        self._enable()
+
+    def _enable(self):
+        profile = cProfile.Profile()
+        self.profiles.append(profile)
+        self._local.profile = profile
+        profile.enable()
+
+    def enter_thread(self):
+        if self.PER_THREAD:
+            self._enable()
+
+    def leave_thread(self):
+        profile = getattr(self._local, "profile", None)
+        if profile is not None:
+            profile.disable()
+            self._local.profile = None
+
+    def stop(self):
+        self.leave_thread()
+        self._busy.release()
+
+    def write(self, path):
+        stats = pstats.Stats(self.profiles[0])
+        for profile in self.profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(str(path))
+
+
+SESSIONS = {"sample": SamplingSession, "cprofile": CProfileSession}
+
+
+def _wanted():
+    header = request.headers.get("X-Profile")
+    if header:
+        return PROFILE_TOKEN is None or header == PROFILE_TOKEN
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _prune(directory):
+    files = sorted(directory.glob("*.*"), key=lambda p: p.stat().st_mtime)
+    for old in files[:-PROFILE_KEEP] if PROFILE_KEEP else []:
+        old.unlink(missing_ok=True)
+
+
+def follow(fn):
+    """`fn`, suivie par le profil de la requête en cours (s'il y en a un)
+    quand elle s'exécute dans un autre thread."""
+    started = g.get("_profile") if has_request_context() else None
+    if started is None:
+        return fn
+    session = started[0]
+
+    def profiled(*args, **kwargs):
+        session.enter_thread()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            session.leave_thread()
+
+    return profiled
+
+
+def init_profiler(app):
+    if not PROFILE_ENABLED:
+        return
+    directory = Path(PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    session_class = SESSIONS[PROFILE_MODE]
+
+    @app.before_request
+    def _start_profile():
+        if _wanted():
+            session = session_class.start(PROFILE_INTERVAL_MS / 1000)
+            if session is not None:
+                g._profile = (session, time.perf_counter())
+
+    @app.after_request
+    def _stop_profile(response):
+        started = g.pop("_profile", None)
+        if started is None:
+            return response
+        session, start = started
+        session.stop()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.endpoint or 'unknown'}-{elapsed_ms:.0f}ms"
+        path = directory / (name + session.suffix)
+        session.write(path)
+        _prune(directory)
+        response.headers["X-Profile-File"] = path.name
+        return response
+
+    @app.teardown_request
+    def _abort_profile(exc):
+        # Requête interrompue avant `after_request` : profil abandonné.
+        started = g.pop("_profile", None)
+        if started is not None:
+            started[0].stop()
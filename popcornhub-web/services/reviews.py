@@ -0,0 +1,65 @@
+"""Avis : agrégats de notes par film et pagination.
+
+La collection `review_stats` associe à chaque film (clé = id en chaîne,
+comme `library` et `favorites`) `{"count", "sum", "hist"}`, `hist` étant le
+nombre de notes 1 à 5. Elle est tenue à jour par `record_rating` à chaque
+avis ajouté ou modifié, ce qui évite de relire tous les avis du film.
+"""
+
+import math
+
+from services.data import query
+
+
+def stats_from(reviews):
+    stats = {"count": 0, "sum": 0, "hist": [0] * 5}
+    for r in reviews:
+        record_rating(stats, None, r["rating"])
+    return stats
+
+
+def record_rating(stats, old, new):
+    """Met à jour `stats` quand une note passe de `old` (None si nouvel
+    avis) à `new`."""
+    if old is not None:
+        stats["count"] -= 1
+        stats["sum"] -= old
+        stats["hist"][old - 1] -= 1
+    stats["count"] += 1
+    stats["sum"] += new
+    stats["hist"][new - 1] += 1
+
+
+def movie_stats(film_id):
+    """Agrégats du film ; recalculés depuis les avis s'ils n'existent pas
+    encore (avis antérieurs à `review_stats`)."""
+    key = str(film_id)
+    stats = query("review_stats", key=key)["items"].get(key)
+    if stats is None:
+        stats = stats_from(query("reviews", movie_id=film_id)["items"])
+    return stats
+
+
+def average(stats):
+    return round(stats["sum"] / stats["count"], 1) if stats["count"] else None
+
+
+def paginate(film_id, page=1, page_size=10):
+    """Avis du film, du plus récent au plus ancien, page `page`.
+
+    Seuls les avis de la page et leurs auteurs sont demandés à l'API.
+    Renvoie `(avis, nombre de pages)`.
+    """
+    found = query(
+        "reviews",
+        movie_id=film_id,
+        sort="-created_at,-id",
+        page=page,
+        page_size=page_size,
+    )
+    reviews = found["items"]
+    user_ids = sorted({r["user_id"] for r in reviews})
+    users = query("users", id=user_ids)["items"]
+    names = {u["id"]: u["username"] for u in users}
+    visible = [{**r, "username": names.get(r["user_id"], "?")} for r in reviews]
+    return visible, math.ceil(found["total"] / page_size)
@@ -1,25 +1,215 @@
-import requests
-from config import TMDB_API_KEY, TMDB_BASE_URL, TMDB_IMG_BASE
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+from config import (
+    TMDB_API_KEY,
+    TMDB_BASE_URL,
+    TMDB_CACHE_SIZE,
+    TMDB_CACHE_PATH,
+    TMDB_CACHE_TTLS,
+    TMDB_CACHE_DEFAULT_TTL,
+    TMDB_CACHE_MAX_STALE,
+    TMDB_MAX_CONCURRENCY,
+)
+from services import http_client
+from services.cache import SingleFlight, TTLCache, SQLiteCache
+from services.images import image_url
+from services.metrics import registry
 
-def tmdb_get(path, params=None):
-    """Appel générique à l'API TMDb."""
+tmdb_cache = TTLCache(maxsize=TMDB_CACHE_SIZE, max_stale=TMDB_CACHE_MAX_STALE)
+tmdb_disk_cache = SQLiteCache(TMDB_CACHE_PATH) if TMDB_CACHE_PATH else None
+
+# Un seul appel TMDb en cours par clé de cache, rafraîchissements compris.
+_flights = SingleFlight()
+
+_pool = ThreadPoolExecutor(max_workers=TMDB_MAX_CONCURRENCY, thread_name_prefix="tmdb")
+_refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tmdb-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+TMDB_GETS = registry.counter(
+    "popcornhub_web_tmdb_get_total",
+    "Appels à tmdb_get par chemin et origine de la réponse (hit, stale, disk, miss).",
+    ("path", "cache"),
+)
+TMDB_FETCH_SECONDS = registry.histogram(
+    "popcornhub_web_tmdb_fetch_seconds",
+    "Durée des appels HTTP à TMDb par chemin.",
+    ("path", "status"),
+)
+registry.gauge(
+    "popcornhub_web_tmdb_cache_entries",
+    "Entrées du cache mémoire TMDb.",
+    lambda: {(): len(tmdb_cache)},
+)
+
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def _path_label(path):
+    """`/movie/550/videos` -> `/movie/{id}/videos` (cardinalité bornée)."""
+    return _ID_SEGMENT.sub("/{id}", path)
+
+
+def tmdb_ttl(path):
+    best = None
+    for prefix in TMDB_CACHE_TTLS:
+        if path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return TMDB_CACHE_TTLS[best] if best else TMDB_CACHE_DEFAULT_TTL
+
+
+def tmdb_cache_key(path, params):
+    """Clé de cache : chemin + paramètres triés (langue comprise, sans la clé d'API)."""
+    items = sorted((k, str(v)) for k, v in params.items() if k != "api_key")
+    return path + "?" + "&".join(f"{k}={v}" for k, v in items)
+
+
+def tmdb_cache_stats():
+    stats = {"memory": tmdb_cache.stats(), "flights": _flights.stats()}
+    if tmdb_disk_cache is not None:
+        stats["disk"] = tmdb_disk_cache.stats()
+    return stats
+
+
+def tmdb_fetch(path, params):
+    """Appel HTTP à TMDb, sans cache."""
     url = f"{TMDB_BASE_URL}{path}"
-    params = params or {}
-    params["api_key"] = TMDB_API_KEY
-    params.setdefault("language", "fr-FR")
-    r = requests.get(url, params=params, timeout=5)
+    params = dict(params, api_key=TMDB_API_KEY)
+    start = time.perf_counter()
+    status = "error"
+    try:
+        r = http_client.get("tmdb", url, params=params)
+        status = r.status_code
+    finally:
+        TMDB_FETCH_SECONDS.observe(time.perf_counter() - start, _path_label(path), status)
     r.raise_for_status()
     return r.json()
 
 
+def tmdb_peek(path, params=None):
+    """Réponse en cache mémoire pour `path`, sans appel réseau (None sinon)."""
+    params = dict(params or {})
+    params.setdefault("language", "fr-FR")
+    return tmdb_cache.get(tmdb_cache_key(path, params), count_miss=False)
+
+
+def _tmdb_params(params):
+    params = dict(params or {})
+    params.setdefault("language", "fr-FR")
+    return params
+
+
+def _tmdb_cached(path, params, key):
+    """Réponse en cache (mémoire, puis disque), ou None.
+
+    Une réponse mémoire expirée mais encore servable est renvoyée telle
+    quelle et rafraîchie en arrière-plan.
+    """
+    label = _path_label(path)
+    found = tmdb_cache.get_stale(key)
+    if found is not None:
+        payload, fresh = found
+        if not fresh:
+            _refresh_later(path, params, key)
+        TMDB_GETS.inc(label, "hit" if fresh else "stale")
+        return payload
+
+    if tmdb_disk_cache is not None:
+        found = tmdb_disk_cache.get(key)
+        if found is not None:
+            payload, remaining = found
+            tmdb_cache.set(key, payload, remaining)
+            TMDB_GETS.inc(label, "disk")
+            return payload
+    TMDB_GETS.inc(label, "miss")
+    return None
+
+
+def _tmdb_store(path, key, payload):
+    ttl = tmdb_ttl(path)
+    tmdb_cache.set(key, payload, ttl)
+    if tmdb_disk_cache is not None:
+        tmdb_disk_cache.set(key, payload, ttl)
+
+
+def _fetch_and_store(path, params, key):
+    payload = tmdb_fetch(path, params)
+    _tmdb_store(path, key, payload)
+    return payload
+
+
+def _refresh(path, params, key):
+    try:
+        _flights.do(key, lambda: _fetch_and_store(path, params, key))
+    except Exception:
+        pass  # la réponse périmée reste servie jusqu'à `max_stale`
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+
+def _refresh_later(path, params, key):
+    """Programme un rafraîchissement de `key`, sauf s'il y en a déjà un."""
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    _refresh_pool.submit(_refresh, path, params, key)
+
+
+def tmdb_get(path, params=None):
+    """Appel générique à l'API TMDb.
+
+    Les réponses sont mises en cache (mémoire, puis SQLite si configuré)
+    avec une durée de vie dépendant du chemin. Le résultat est partagé
+    entre requêtes : ne pas le modifier.
+
+    Les appels simultanés pour une même clé absente du cache n'en font
+    qu'un seul à TMDb ; les autres attendent son résultat.
+    """
+    params = _tmdb_params(params)
+    key = tmdb_cache_key(path, params)
+
+    payload = _tmdb_cached(path, params, key)
+    if payload is None:
+        payload = _flights.do(key, lambda: _fetch_and_store(path, params, key))
+    return payload
+
+
+def tmdb_warm(path, params=None, ahead=0, wait=None):
+    """Met `path` en cache s'il en est absent ou expire dans moins de `ahead`
+    secondes ; `wait()` est appelé juste avant l'appel à TMDb.
+
+    Renvoie True si TMDb a été appelé.
+    """
+    params = _tmdb_params(params)
+    key = tmdb_cache_key(path, params)
+
+    remaining = tmdb_cache.expires_in(key)
+    if remaining is None and tmdb_disk_cache is not None:
+        found = tmdb_disk_cache.get(key)
+        if found is not None:
+            payload, remaining = found
+            tmdb_cache.set(key, payload, remaining)
+    if remaining is not None and remaining > ahead:
+        return False
+
+    if wait is not None:
+        wait()
+    _flights.do(key, lambda: _fetch_and_store(path, params, key))
+    return True
+
+
 def tmdb_movie_to_film(movie, credits=None):
     titre = movie.get("title") or movie.get("name")
     release_date = movie.get("release_date") or movie.get("first_air_date") or ""
     annee = int(release_date[:4]) if len(release_date) >= 4 else None
     resume = movie.get("overview") or ""
     poster_path = movie.get("poster_path")
-    affiche_url = f"{TMDB_IMG_BASE}/w500{poster_path}" if poster_path else None
 
     genres = []
     if "genres" in movie:
@@ -43,11 +233,56 @@ def tmdb_movie_to_film(movie, credits=None):
         "annee": annee,
         "realisateur": realisateur,
         "resume": resume,
-        "affiche_url": affiche_url,
+        "affiche_url": image_url("poster", "thumb", poster_path),
+        "affiche_detail_url": image_url("poster", "detail", poster_path),
         "genres": genres,
     }
 
 
+def tmdb_fallback_film(film_id):
+    """Fiche minimale affichée quand TMDb ne répond pas pour ce film."""
+    return {
+        "id": film_id,
+        "titre": f"Film #{film_id}",
+        "annee": None,
+        "realisateur": "",
+        "resume": "",
+        "affiche_url": None,
+        "affiche_detail_url": None,
+        "genres": [],
+    }
+
+
+def get_movies(ids):
+    """Fiches (format `tmdb_movie_to_film`) des films `ids`, dans l'ordre.
+
+    Les doublons ne sont demandés qu'une fois, les films en cache sont servis
+    directement et les autres récupérés en parallèle (au plus
+    `TMDB_MAX_CONCURRENCY` appels simultanés). Un film en échec est remplacé
+    par `tmdb_fallback_film`.
+    """
+    movies = {}
+    pending = {}
+    for film_id in dict.fromkeys(ids):
+        movie = tmdb_peek(f"/movie/{film_id}")
+        if movie is not None:
+            movies[film_id] = movie
+        else:
+            pending[film_id] = _pool.submit(tmdb_get, f"/movie/{film_id}")
+
+    for film_id, future in pending.items():
+        try:
+            movies[film_id] = future.result()
+        except Exception:
+            pass
+
+    return [
+        tmdb_movie_to_film(movies[film_id]) if film_id in movies
+        else tmdb_fallback_film(film_id)
+        for film_id in ids
+    ]
+
+
 def tmdb_search_person(name: str):
     if not name:
         return None
@@ -68,26 +303,11 @@ def tmdb_person_image_url(person):
     if not path:
         return url_for("static", filename="actors/default_actor.png")
 
-    return f"{TMDB_IMG_BASE}/w185{path}"
+    return image_url("person", "face", path)
 
 
-def tmdb_movie_trailer_key(title: str, year: int | None):
-    if not title:
-        return None
-    params = {"query": title}
-    if year:
-        params["year"] = year
-    data = tmdb_get("/search/movie", params)
-    results = data.get("results", [])
-    if not results:
-        return None
-    movie_id = results[0].get("id")
-    if not movie_id:
-        return None
-
-    data = tmdb_get(f"/movie/{movie_id}/videos", {"language": "fr-FR"})
-    videos = data.get("results", [])
-
+def tmdb_pick_trailer(videos):
+    """Clé YouTube de la bande-annonce, en privilégiant la version française."""
     for v in videos:
         if (
             v.get("site") == "YouTube"
@@ -100,4 +320,26 @@ def tmdb_movie_trailer_key(title: str, year: int | None):
         if v.get("site") == "YouTube" and v.get("type") == "Trailer":
             return v.get("key")
 
-    return None
\ No newline at end of file
+    return None
+
+
+_DETAILS_PARAMS = {
+    "append_to_response": "credits,videos",
+    "include_video_language": "fr,en,null",
+}
+
+
+def tmdb_movie_requests(film_id):
+    """Appels TMDb faits par les pages pour un film : `{nom: (chemin, paramètres)}`.
+
+    `movie` : fiche courte des listes (`get_movies`) ; `details` : fiche
+    complète de la page du film (`tmdb_movie_details`).
+    """
+    path = f"/movie/{film_id}"
+    return {"movie": (path, None), "details": (path, _DETAILS_PARAMS)}
+
+
+def tmdb_movie_details(film_id):
+    """Fiche complète d'un film en un seul appel : crédits et vidéos inclus
+    (bandes-annonces françaises, anglaises et sans langue)."""
+    return tmdb_get(f"/movie/{film_id}", _DETAILS_PARAMS)
@@ -0,0 +1,106 @@
+"""Préchargement en tâche de fond des films connus de l'application.
+
+Toutes les `WARM_INTERVAL` secondes, les films cités dans `user_owns`,
+`library`, `favorites`, `rentals` et `reviews` (les plus cités d'abord,
+`WARM_MAX_FILMS` au plus) sont passés en revue : fiche courte des listes,
+fiche complète de la page du film (crédits, vidéos) et affiche. Ce qui
+manque au cache ou expire avant le passage suivant est redemandé à TMDb, à
+`WARM_RATE` appels par seconde au plus : le profil, les favoris et les
+locations ne tombent pas sur un cache froid.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+
+from services import images
+from services.data import load_data
+from services.metrics import registry
+from services.tmdb import tmdb_movie_requests, tmdb_peek, tmdb_warm
+
+log = logging.getLogger(__name__)
+
+# Tailles d'affiche servies par les pages (grilles, fiche du film).
+POSTER_SIZES = ("thumb", "detail")
+
+WARMED = registry.counter(
+    "popcornhub_web_warmer_total",
+    "Ressources passées en revue par le préchargement (fresh : déjà en cache).",
+    ("what", "result"),
+)
+
+
+class RateLimiter:
+    """Espace les appels d'au moins `1 / rate` seconde (un seul thread)."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval
+
+
+def referenced_ids():
+    """Identifiants des films cités dans le document, du plus au moins cité."""
+    data = load_data().prefetch("user_owns", "rentals", "reviews", "library", "favorites")
+    counts = Counter()
+    for name in ("user_owns", "rentals", "reviews"):
+        counts.update(row["movie_id"] for row in data.get(name, []) if row.get("movie_id"))
+    for name in ("library", "favorites"):
+        for ids in data.get(name, {}).values():
+            counts.update(ids)
+    return [film_id for film_id, _ in counts.most_common()]
+
+
+def warm(ahead, wait=None, max_films=None):
+    """Un passage sur les films cités ; renvoie le nombre d'appels à TMDb.
+
+    Une réponse est redemandée si elle expire dans moins de `ahead` secondes.
+    """
+    calls = 0
+    for film_id in referenced_ids()[:max_films]:
+        for what, (path, params) in tmdb_movie_requests(film_id).items():
+            try:
+                fetched = tmdb_warm(path, params, ahead=ahead, wait=wait)
+            except Exception:
+                WARMED.inc(what, "error")
+                continue
+            WARMED.inc(what, "fetched" if fetched else "fresh")
+            calls += fetched
+
+        movie = tmdb_peek(f"/movie/{film_id}")
+        poster_path = movie.get("poster_path") if movie else None
+        if poster_path:
+            downloads = images.prefetch(poster_path, POSTER_SIZES, wait=wait)
+            WARMED.inc("poster", "fetched" if downloads else "fresh")
+            calls += downloads
+    return calls
+
+
+def start_warmer(interval, rate, max_films):
+    """Passage immédiat puis toutes les `interval` secondes, en tâche de fond."""
+    limiter = RateLimiter(rate)
+
+    def run():
+        while True:
+            start = time.monotonic()
+            try:
+                # Assez d'avance pour couvrir le passage suivant.
+                calls = warm(2 * interval, wait=limiter.wait, max_films=max_films)
+            except Exception:
+                log.exception("préchargement des films impossible")
+                time.sleep(min(interval, 60))
+                continue
+            if calls:
+                log.info("%d réponses TMDb préchargées en %.0f s", calls, time.monotonic() - start)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="tmdb-warmer", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Le site importe ses modules depuis popcornhub-web/ (config, services...).
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
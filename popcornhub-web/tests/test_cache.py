@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from services import cache, tmdb
+from services.cache import SingleFlight, TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_ttl_cache_serves_stale_entries_until_max_stale(clock):
+    c = TTLCache(maxsize=2, max_stale=10)
+    c.set("a", 1, ttl=5)
+    assert c.get("a") == 1
+
+    clock[0] += 6
+    assert c.get("a") is None
+    assert c.get_stale("a") == (1, False)
+    assert c.expires_in("a") == -1
+
+    clock[0] += 10
+    assert c.get_stale("a") is None
+    assert c.stats()["expirations"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    c = TTLCache(maxsize=2)
+    c.set("a", 1, ttl=60)
+    c.set("b", 2, ttl=60)
+    c.get("a")
+    c.set("c", 3, ttl=60)
+    assert (c.get("a"), c.get("b"), c.get("c")) == (1, None, 3)
+    assert c.evictions == 1
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "ok"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+    follower.start()
+    for _ in range(5000):
+        if flight.shared:
+            break
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert results == ["ok", "ok"] and len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "shared": 1}
+
+
+def test_single_flight_raises_for_every_waiter():
+    flight = SingleFlight()
+
+    def boom():
+        raise ValueError("tmdb")
+
+    with pytest.raises(ValueError):
+        flight.do("k", boom)
+    assert flight.do("k", lambda: "retry") == "retry"
+
+
+def test_tmdb_get_serves_stale_while_one_refresh_runs(monkeypatch, clock):
+    monkeypatch.setattr(tmdb, "tmdb_cache", TTLCache(max_stale=3600))
+    monkeypatch.setattr(tmdb, "tmdb_disk_cache", None)
+    refreshed = threading.Event()
+    fetched = []
+    store = tmdb._tmdb_store
+
+    def fetch(path, params):
+        fetched.append(path)
+        return {"version": len(fetched)}
+
+    def stored(path, key, payload):
+        store(path, key, payload)
+        if payload["version"] > 1:
+            refreshed.set()
+
+    monkeypatch.setattr(tmdb, "tmdb_fetch", fetch)
+    monkeypatch.setattr(tmdb, "_tmdb_store", stored)
+
+    assert tmdb.tmdb_get("/movie/1") == {"version": 1}
+    clock[0] += tmdb.tmdb_ttl("/movie/1") + 1
+    # Périmée : servie telle quelle, un seul rafraîchissement en arrière-plan.
+    assert tmdb.tmdb_get("/movie/1") == {"version": 1}
+    assert refreshed.wait(5)
+    assert tmdb.tmdb_get("/movie/1") == {"version": 2}
+    assert fetched == ["/movie/1", "/movie/1"]
@@ -0,0 +1,51 @@
+from services import catalog
+
+
+def _entry(id, title):
+    return catalog.catalog_entry({"id": id, "title": title})
+
+
+def test_flush_updates_existing_entries_and_appends_new_ones(monkeypatch):
+    doc = {"catalog": [_entry(1, "Ancien titre"), _entry(2, "Inchangé")]}
+    monkeypatch.setattr(catalog, "update_data", lambda fn: fn(doc))
+    monkeypatch.setattr(catalog, "_queue", {1: _entry(1, "Nouveau titre"), 3: _entry(3, "Ajouté")})
+
+    catalog.flush()
+    assert [e["title"] for e in doc["catalog"]] == ["Nouveau titre", "Inchangé", "Ajouté"]
+
+
+class FakeData:
+    def __init__(self, rows, version):
+        self.rows, self.versions = rows, {"catalog": version}
+
+    def get(self, name, default=None):
+        return self.rows if name == "catalog" else default
+
+
+def test_fold_drops_accents_case_and_ligatures():
+    assert catalog.fold("Amélie ŒUVRE Straße") == "amelie oeuvre strasse"
+    assert catalog.tokenize("L'Été, à Noël !") == ["l", "ete", "a", "noel"]
+
+
+def test_search_matches_word_prefixes_without_accents():
+    rows = [
+        dict(_entry(1, "Le Fabuleux Destin d'Amélie Poulain"), popularity=5),
+        dict(_entry(2, "Amer"), popularity=50),
+        dict(_entry(3, "Am"), original_title="Amelie", popularity=1),
+    ]
+    data = FakeData(rows, version=101)
+
+    found = catalog.search(data, "AME")
+    assert [r["id"] for r in found["results"]] == [2, 1, 3]
+    # Un mot exact passe devant la popularité.
+    assert [r["id"] for r in catalog.search(data, "am")["results"]] == [3, 2, 1]
+    assert [r["id"] for r in catalog.search(data, "destin amél")["results"]] == [1]
+    assert catalog.search(data, "destin amer")["total_results"] == 0
+
+    page = catalog.search(data, "am", page=2, page_size=2)
+    assert (len(page["results"]), page["total_results"], page["total_pages"]) == (1, 3, 2)
+
+
+def test_search_index_is_rebuilt_for_a_new_version():
+    catalog.search(FakeData([_entry(1, "Alien")], version=201), "alien")
+    assert catalog.search(FakeData([_entry(2, "Aliens")], version=202), "alien")["results"][0]["id"] == 2
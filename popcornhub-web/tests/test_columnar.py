@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from services.columnar import RentalColumns
+
+NOW = datetime(2024, 3, 10, 12, 0)
+
+
+def _rental(id, owner_id, movie_id, fmt, expires_at, price_cents=100, user_id=1):
+    return {"id": id, "user_id": user_id, "owner_id": owner_id, "movie_id": movie_id,
+            "format": fmt, "expires_at": expires_at, "price_cents": price_cents}
+
+
+def test_active_at_ignores_ended_and_unreadable_rows():
+    columns = RentalColumns.from_rows([
+        _rental(1, 9, 10, "bluray", "2024-03-11T00:00:00"),
+        _rental(2, 9, 10, "bluray", "2024-03-09T00:00:00"),
+        _rental(3, 9, 10, "bluray", "pas une date"),
+        "ligne illisible",
+    ])
+    assert columns.active_at(NOW).tolist() == [True, False, False, False]
+    assert columns.revenue_cents() == 300
+
+
+def test_busy_until_keeps_latest_end_per_copy():
+    columns = RentalColumns.from_rows([
+        _rental(1, 9, 10, "bluray", "2024-03-11T00:00:00"),
+        _rental(2, 9, 10, "bluray", "2024-03-12T00:00:00"),
+        _rental(3, 9, 10, "digital", "2024-03-09T00:00:00"),
+        _rental(4, 8, 11, "digital", "2024-03-15T00:00:00"),
+        _rental(5, 8, 11, "vhs", "2024-03-15T00:00:00"),
+    ])
+    assert columns.busy_until(NOW) == {
+        (9, 10, "bluray"): datetime(2024, 3, 12),
+        (8, 11, "digital"): datetime(2024, 3, 15),
+    }
+    assert columns.busy_until(NOW, movie_id=11) == {(8, 11, "digital"): datetime(2024, 3, 15)}
+    assert columns.busy_until(NOW, movie_id=12) == {}
@@ -0,0 +1,66 @@
+import pytest
+
+from services import data
+from services.json_patch import make_patch
+
+
+def test_make_patch_removes_from_the_end_and_appends():
+    old = {"rentals": [{"id": 1}, {"id": 2}, {"id": 3}], "gone": 1}
+    new = {"rentals": [{"id": 1}, {"id": 3}], "users": []}
+    assert make_patch(old, new) == [
+        {"op": "remove", "path": "/gone"},
+        {"op": "remove", "path": "/rentals/1"},
+        {"op": "add", "path": "/users", "value": []},
+    ]
+    assert make_patch([1], [2, 3], "/a") == [
+        {"op": "replace", "path": "/a/0", "value": 2},
+        {"op": "add", "path": "/a/-", "value": 3},
+    ]
+    assert make_patch({"a/b": 1}, {"a/b": 2}) == [{"op": "replace", "path": "/a~1b", "value": 2}]
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Faux document de l'API : `users` en version 1, une écriture rivale
+    arrivant avant la première sauvegarde."""
+    state = {"users": ([{"id": 1}], 1), "conflicts": 1, "patches": []}
+
+    def fetch_collection(name):
+        return state.get(name, (data._MISSING, 0))
+
+    def patch_data(ops, base_versions=None):
+        if state["conflicts"]:
+            state["conflicts"] -= 1
+            state["users"] = ([{"id": 1}, {"id": 2}], 2)
+            raise data.DataConflict("users")
+        state["patches"].append((ops, dict(base_versions)))
+        return 3
+
+    monkeypatch.setattr(data, "fetch_collection", fetch_collection)
+    monkeypatch.setattr(data, "patch_data", patch_data)
+    monkeypatch.setattr(data, "_remember", lambda name, version, value: None)
+    return state
+
+
+def test_update_data_replays_mutation_on_fresh_data(api):
+    seen = []
+
+    def add_user(store):
+        users = store["users"]
+        seen.append(len(users))
+        user = {"id": store.next_id("users")}
+        users.append(user)
+        return user
+
+    assert data.update_data(add_user) == {"id": 3}
+    assert seen == [1, 2]
+    assert api["patches"] == [
+        # Collections lues, même absentes, conditionnent l'écriture.
+        ([{"op": "add", "path": "/users/-", "value": {"id": 3}}], {"users": 2, "sequences": 0}),
+    ]
+
+
+def test_update_data_gives_up_after_retries(api):
+    api["conflicts"] = 2
+    with pytest.raises(data.DataConflict):
+        data.update_data(lambda store: store["users"].append({"id": 9}), retries=2)
@@ -0,0 +1,57 @@
+import pytest
+import requests
+
+from services.http_client import CircuitBreaker, CircuitOpenError, Upstream
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def _upstream(monkeypatch, outcomes):
+    up = Upstream("test", retries=0, breaker_failures=1, breaker_cooldown=0)
+
+    def request(method, url, **kwargs):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+    monkeypatch.setattr(up.session, "request", request)
+    return up
+
+
+def test_breaker_opens_then_lets_one_trial_through():
+    breaker = CircuitBreaker(failures=2, cooldown=0)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()  # un seul essai à la fois
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_with_unexpected_error_reopens(monkeypatch):
+    up = _upstream(
+        monkeypatch,
+        [requests.ConnectionError(), requests.exceptions.ChunkedEncodingError(), 200],
+    )
+    with pytest.raises(requests.ConnectionError):
+        up.request("GET", "http://x")
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        up.request("GET", "http://x")
+    # L'essai a échoué mais s'est conclu : un nouvel essai est permis.
+    assert up.request("GET", "http://x").status_code == 200
+    assert up.breaker.state == "closed"
+
+
+def test_open_breaker_refuses_calls(monkeypatch):
+    up = _upstream(monkeypatch, [requests.Timeout()])
+    up.breaker.cooldown = 60
+    with pytest.raises(requests.Timeout):
+        up.request("GET", "http://x")
+    with pytest.raises(CircuitOpenError):
+        up.request("GET", "http://x")
@@ -0,0 +1,47 @@
+import io
+
+import pytest
+
+from services import images
+
+Image = pytest.importorskip("PIL.Image")
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {"Content-Type": "image/jpeg"}
+
+    def __init__(self, content):
+        self.content = content
+
+
+@pytest.fixture
+def source(monkeypatch, tmp_path):
+    out = io.BytesIO()
+    Image.new("RGB", (500, 750), "red").save(out, "JPEG")
+    calls = []
+
+    def get(name, url, **kwargs):
+        calls.append(url)
+        return FakeResponse(out.getvalue())
+
+    monkeypatch.setattr(images.http_client, "get", get)
+    monkeypatch.setattr(images, "disk", images.DiskCache(tmp_path, 10 * 1024 * 1024))
+    return calls
+
+
+def test_variants_are_resized_from_one_download(source):
+    data, mimetype = images.variant("thumb", "/abc.jpg")
+    assert mimetype == "image/jpeg"
+    assert Image.open(io.BytesIO(data)).size == (342, 513)
+
+    images.variant("face", "/abc.jpg")
+    assert len(source) == 1  # source téléchargée une fois
+
+
+def test_webp_variant_when_accepted(source):
+    if not images.WEBP:
+        pytest.skip("Pillow sans WebP")
+    data, mimetype = images.variant("detail", "/abc.jpg", webp=True)
+    assert mimetype == "image/webp"
+    assert Image.open(io.BytesIO(data)).format == "WEBP"
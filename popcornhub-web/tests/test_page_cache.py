@@ -0,0 +1,56 @@
+import pytest
+from flask import Flask, session
+
+from services import page_cache
+from services.cache import TTLCache
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(page_cache, "_pages", TTLCache())
+    monkeypatch.setattr(page_cache, "_fragments", TTLCache())
+    versions = {"reviews": 1}
+    monkeypatch.setattr(page_cache, "collection_versions", lambda *names: {n: versions[n] for n in names})
+
+    app = Flask(__name__)
+    app.secret_key = "test"
+    renders = []
+
+    @app.get("/film")
+    @page_cache.cache_anonymous(depends=("reviews",))
+    def film():
+        renders.append(1)
+        meta = page_cache.fragment("meta", lambda: f"meta {len(renders)}")
+        return f"{meta} / page {len(renders)}"
+
+    @app.get("/login")
+    def login():
+        session["user_id"] = 1
+        return "ok"
+
+    client = app.test_client()
+    client.versions, client.renders = versions, renders
+    return client
+
+
+def test_page_is_reused_until_a_collection_version_changes(client):
+    first = client.get("/film")
+    assert first.get_data(as_text=True) == "meta 1 / page 1"
+    assert client.get("/film").get_data(as_text=True) == "meta 1 / page 1"
+    assert client.get("/film", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    client.versions["reviews"] = 2
+    # Page recalculée ; le fragment partagé n'a pas expiré.
+    assert client.get("/film").get_data(as_text=True) == "meta 1 / page 2"
+    assert len(client.renders) == 2
+
+
+def test_query_string_and_logged_in_users_get_their_own_pages(client):
+    client.get("/film")
+    client.get("/film?page=2")
+    assert len(client.renders) == 2
+
+    client.get("/login")
+    client.get("/film")
+    client.get("/film")
+    assert len(client.renders) == 4